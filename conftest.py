@@ -0,0 +1,2 @@
+# The add-ons are imported as packages from the root of the repository (e.g. reschedule_deck.reschedule_core, which
+# does not need Anki)
@@ -1 +1,9 @@
-from . import reschedule_deck
\ No newline at end of file
+# The rescheduling logic (reschedule_core) can be imported without a running Anki (e.g. by worker processes),
+# the dialog is only loaded when the main window exists
+try:
+    from aqt import mw
+except ImportError:
+    mw = None
+
+if mw is not None:
+    from . import reschedule_deck
@@ -0,0 +1,242 @@
+# Headless benchmark suite of the rescheduling algorithm (no Anki needed) :
+#     python -m reschedule_deck.benchmark --sizes 1000 10000 --max-intervals 30 300 --output results.json
+# Synthetic decks are generated for each distribution, size and range of intervals, then each algorithm mode is run on
+# them. The wall time, the number of iterations, the peak memory and the total displacement of every run are saved
+# in a JSON file, which can be compared to the one of a previous run (--compare)
+# How the duration grows with the range of intervals (same number of cards by interval for growing ranges) :
+#     python -m reschedule_deck.benchmark --range-scaling --distributions skewed --modes algorithm_1
+# Note: algorithm 1 needs many iterations on skewed decks (heavy overdue, over-scheduled), so the decks of 1M cards are
+# not run by default (--sizes 1000000)
+import argparse
+import json
+import platform
+import random
+import time
+import tracemalloc
+from typing import (
+    List, Dict, Any, Callable, Optional, Tuple, )
+
+from . import reschedule_core
+from .reschedule_core import (
+    CardColumns, RescheduleDeck, DeckDict, range1, )
+
+# --- EXTERNAL VARIABLES ---#
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_MAX_INTERVALS = (30, 100, 300)
+DEFAULT_OUTPUT_FILE = "benchmark_results.json"
+DAY_OF_TODAY = 1000
+RANDOM_SEED = 0
+IS_RESCHEDULE_OVERDUE_CARDS = True
+
+# Distributions of the synthetic decks
+NUMBER_OF_CLUSTERS_BY_INTERVAL = 3
+PROPORTION_OF_OVERDUE_CARDS = 0.5
+MAX_OVERDUE_DAYS = 30
+PROPORTION_OF_OVER_SCHEDULED_CARDS = 0.3
+
+# Range scaling (--range-scaling) : the size of each deck is given by its range of intervals instead of --sizes
+RANGE_SCALING_MAX_INTERVALS = (50, 100, 150, 200, 250, 300)
+RANGE_SCALING_NB_OF_CARDS_BY_INTERVAL = 20
+
+# Algorithm modes : values given to the constants of reschedule_core during the run (each mode only gives the values
+# which differ from the base mode, so that every mode sets all the constants)
+BASE_MODE: Dict[str, Any] = dict(USE_ALGORITHM_4_BY_GLOBAL_DAILY_LOAD=False, USE_ALGORITHM_3_BY_EXACT_QUOTAS=False,
+                                 USE_ALGORITHM_1_BY_HIGHEST_DIFFERENCE=True, USE_TWO_PHASE_BALANCING=True,
+                                 USE_NUMPY_ENGINE_IF_AVAILABLE=True, PARALLEL_BALANCING_MODE=None)
+ALGORITHM_MODES: Dict[str, Dict[str, Any]] = {
+    "algorithm_1": {**BASE_MODE},
+    # Algorithm 1 moving the cards themselves at each iteration (instead of only their numbers, then the cards once)
+    "algorithm_1_moving_cards": {**BASE_MODE, "USE_TWO_PHASE_BALANCING": False},
+    "algorithm_1_without_numpy": {**BASE_MODE, "USE_NUMPY_ENGINE_IF_AVAILABLE": False},
+    # Note: the worker processes are not measured by the peak memory
+    "algorithm_1_in_processes": {**BASE_MODE, "PARALLEL_BALANCING_MODE": "process"},
+    "algorithm_3": {**BASE_MODE, "USE_ALGORITHM_3_BY_EXACT_QUOTAS": True},
+    # The highest daily load of all intervals summed is minimal, but each interval is not balanced separately
+    "algorithm_4": {**BASE_MODE, "USE_ALGORITHM_4_BY_GLOBAL_DAILY_LOAD": True},
+}
+
+
+# --- SYNTHETIC DECKS ---#
+
+
+# Each function gives the due day (relative to today) of a review card of the given interval
+
+def get_uniform_due_day(random_generator: random.Random, interval: int) -> int:
+    return random_generator.randint(1, interval)
+
+
+# Most cards are due on a few days of the interval (e.g. after adding many cards at once)
+def get_clustered_due_day(random_generator: random.Random, interval: int) -> int:
+    cluster = random_generator.randrange(NUMBER_OF_CLUSTERS_BY_INTERVAL)
+    center = interval * (cluster + 1) / (NUMBER_OF_CLUSTERS_BY_INTERVAL + 1)
+    due_day = round(random_generator.gauss(center, max(1.0, interval / 20)))
+    return min(max(due_day, 1), interval)
+
+
+# Due days clustered towards the beginning of the interval (= unbalanced deck)
+def get_skewed_due_day(random_generator: random.Random, interval: int) -> int:
+    return min(interval, int(random_generator.triangular(1, interval + 1, 1)))
+
+
+# After some days without reviewing
+def get_heavy_overdue_due_day(random_generator: random.Random, interval: int) -> int:
+    if random_generator.random() < PROPORTION_OF_OVERDUE_CARDS:
+        return -random_generator.randrange(MAX_OVERDUE_DAYS)
+    return get_uniform_due_day(random_generator, interval)
+
+
+# Due later than their interval (e.g. after a previous rescheduling with another add-on)
+def get_over_scheduled_due_day(random_generator: random.Random, interval: int) -> int:
+    if random_generator.random() < PROPORTION_OF_OVER_SCHEDULED_CARDS:
+        return random_generator.randint(interval + 1, 2 * interval)
+    return get_uniform_due_day(random_generator, interval)
+
+
+DISTRIBUTIONS: Dict[str, Callable[[random.Random, int], int]] = {
+    "uniform": get_uniform_due_day,
+    "clustered": get_clustered_due_day,
+    "skewed": get_skewed_due_day,
+    "heavy_overdue": get_heavy_overdue_due_day,
+    "over_scheduled": get_over_scheduled_due_day,
+}
+
+
+# Review cards (queue = 2 and type = 2) spread over the intervals 1..max_interval
+def new_synthetic_deck(distribution: str, nb_of_cards: int, max_interval: int, seed: int = RANDOM_SEED) \
+        -> CardColumns:
+    random_generator = random.Random(f"{seed}-{distribution}-{nb_of_cards}-{max_interval}")
+    get_due_day = DISTRIBUTIONS[distribution]
+    cards = CardColumns()
+    for card_index in range(nb_of_cards):
+        interval = random_generator.randint(1, max_interval)
+        cards.ids.append(card_index + 1)
+        cards.ivls.append(interval)
+        cards.dues.append(DAY_OF_TODAY + get_due_day(random_generator, interval))
+        cards.queues.append(2)
+        cards.types.append(2)
+    return cards
+
+
+# --- RUNS ---#
+
+
+# Runs the algorithm once, with the constants of the given mode
+def run_algorithm(mode: str, cards: CardColumns, max_interval: int) -> RescheduleDeck:
+    deck: DeckDict = {"name": "Benchmark", "timeToday": [DAY_OF_TODAY, 0]}
+    previous_values = {name: getattr(reschedule_core, name) for name in ALGORITHM_MODES[mode]}
+    try:
+        for name, value in ALGORITHM_MODES[mode].items():
+            setattr(reschedule_core, name, value)
+        reschedule_deck = RescheduleDeck(deck, cards, range1(1, max_interval), IS_RESCHEDULE_OVERDUE_CARDS)
+        reschedule_deck.run()
+        return reschedule_deck
+    finally:
+        for name, value in previous_values.items():
+            setattr(reschedule_core, name, value)
+
+
+# The wall time is measured on a first run, the peak memory on a second one (tracemalloc slows the run down)
+def benchmark_one_run(distribution: str, nb_of_cards: int, max_interval: int, mode: str,
+                      is_measure_memory: bool) -> Dict[str, Any]:
+    cards = new_synthetic_deck(distribution, nb_of_cards, max_interval)
+    start_time = time.perf_counter()
+    reschedule_deck = run_algorithm(mode, cards, max_interval)
+    wall_time = time.perf_counter() - start_time
+
+    peak_memory: Optional[int] = None
+    if is_measure_memory:
+        del reschedule_deck
+        tracemalloc.start()
+        reschedule_deck = run_algorithm(mode, cards, max_interval)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "distribution": distribution,
+        "nb_of_cards": nb_of_cards,
+        "max_interval": max_interval,
+        "mode": mode,
+        "wall_time_in_seconds": round(wall_time, 4),
+        "wall_time_by_card_in_microseconds": round(wall_time / max(nb_of_cards, 1) * 1_000_000, 1),
+        "nb_of_iterations": sum(reschedule_deck.number_of_iterations_of_main_algorithm.values()),
+        "peak_memory_in_bytes": peak_memory,
+        "nb_of_cards_rescheduled": len(reschedule_deck.cards_with_only_different_new_due_day),
+        "total_displacement_in_days": reschedule_deck.get_total_displacement(),
+    }
+
+
+def get_environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": None if reschedule_core.numpy is None else reschedule_core.numpy.__version__,
+    }
+
+
+# --- COMPARISON ---#
+
+
+def get_key_of_result(result: Dict[str, Any]) -> Tuple[str, int, int, str]:
+    return result["distribution"], result["nb_of_cards"], result["max_interval"], result["mode"]
+
+
+# Text comparing the results to the ones of a previous benchmark (only the runs present in both)
+def compare_results(results: List[Dict[str, Any]], previous_results: List[Dict[str, Any]]) -> str:
+    previous_result_by_key = {get_key_of_result(result): result for result in previous_results}
+    text = "Comparison to the previous benchmark (time ratio, difference of displacement)"
+    for result in results:
+        previous_result = previous_result_by_key.get(get_key_of_result(result))
+        if previous_result is None:
+            continue
+        time_ratio = result["wall_time_in_seconds"] / max(previous_result["wall_time_in_seconds"], 1e-9)
+        displacement_difference = result["total_displacement_in_days"] - previous_result["total_displacement_in_days"]
+        text += f"\n {get_key_of_result(result)} : time x {time_ratio:.2f}"
+        text += f", displacement {displacement_difference:+d} days"
+    return text
+
+
+# --- MAIN ---#
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the rescheduling algorithm on synthetic decks")
+    parser.add_argument("--distributions", nargs="+", choices=list(DISTRIBUTIONS), default=list(DISTRIBUTIONS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--max-intervals", nargs="+", type=int)
+    parser.add_argument("--range-scaling", action="store_true",
+                        help=f"{RANGE_SCALING_NB_OF_CARDS_BY_INTERVAL} cards by interval (on average) for each max"
+                             f" interval, instead of the sizes (default max intervals {RANGE_SCALING_MAX_INTERVALS})")
+    parser.add_argument("--modes", nargs="+", choices=list(ALGORITHM_MODES), default=list(ALGORITHM_MODES))
+    parser.add_argument("--no-memory", action="store_true", help="do not measure the peak memory (twice faster)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_FILE)
+    parser.add_argument("--compare", help="JSON file of a previous benchmark")
+    parsed_arguments = parser.parse_args(arguments)
+    max_intervals: List[int] = parsed_arguments.max_intervals or list(
+        RANGE_SCALING_MAX_INTERVALS if parsed_arguments.range_scaling else DEFAULT_MAX_INTERVALS)
+
+    def get_sizes(max_interval: int) -> List[int]:
+        if parsed_arguments.range_scaling:
+            return [RANGE_SCALING_NB_OF_CARDS_BY_INTERVAL * max_interval]
+        return parsed_arguments.sizes
+
+    results: List[Dict[str, Any]] = list()
+    for distribution in parsed_arguments.distributions:
+        for max_interval in max_intervals:
+            for nb_of_cards in get_sizes(max_interval):
+                for mode in parsed_arguments.modes:
+                    result = benchmark_one_run(distribution, nb_of_cards, max_interval, mode,
+                                               is_measure_memory=not parsed_arguments.no_memory)
+                    results.append(result)
+                    print(json.dumps(result))
+
+    with open(parsed_arguments.output, "w") as output_file:
+        json.dump({"environment": get_environment(), "results": results}, output_file, indent=1)
+    print(f"Results saved in {parsed_arguments.output}")
+
+    if parsed_arguments.compare is not None:
+        with open(parsed_arguments.compare) as previous_file:
+            print(compare_results(results, json.load(previous_file)["results"]))
+
+
+if __name__ == "__main__":
+    main()
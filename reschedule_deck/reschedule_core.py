@@ -0,0 +1,2289 @@
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from statistics import median
+from typing import (
+    List, Dict, Sequence, Union, NewType, Any, Iterator, Tuple, Callable, NamedTuple, Optional, FrozenSet, )
+
+# Optional dependency: the NumPy engine is only used if NumPy is available (it is not shipped with Anki)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# This module only contains the logic of the rescheduling, and must stay importable without Anki (no aqt, no mw) :
+# it is also imported by the worker processes of the parallel mode
+
+# --- INTERNAL VARIABLES ---#
+# Custom Classes (the first four ones are the same as in Anki, which is not imported here)
+CardId = NewType("CardId", int)
+CardQueue = NewType("CardQueue", int)
+CardType = NewType("CardType", int)
+DeckDict = Dict[str, Any]
+IntFloat = Union[int, float]
+Average = NewType("IntFloat", IntFloat)
+Difference = NewType("Difference", IntFloat)
+Interval = NewType("Interval", int)
+Due_Day = NewType("Due_Day", int)
+Due_Day_With_Origin = NewType("Due_Day_With_Origin", int)
+Nb_of_Cards = NewType("Nb_of_Cards", int)
+Diff_in_Due_Day = NewType("Diff_in_Due_Day", int)
+Iteration = NewType("NewType", int)
+
+# ??
+MINIMUM_DUE_ATTRIBUTE_OF_CARD_WHEN_DUE_IS_TIMESTAMP_OR_RANDOM_ID = 1_000_000_000
+MAX_POSSIBLE_VALUE_IN_RANGE = 3650
+
+# Long intervals are balanced by bands (see get_band_of_interval) : each band has a single histogram of due days
+# instead of one histogram for each interval, so the memory and the duration depend on the number of bands
+# The bands are always balanced by exact quotas (algorithm 3), whatever the algorithm chosen for the other intervals
+MAX_INTERVAL_BALANCED_ALONE = 300
+RELATIVE_WIDTH_OF_BANDS = 0.05
+
+# Parallel balancing of the intervals : None (serial), "thread" or "process" (worker processes only receive plain
+# arrays of card ids and due days, and must be able to import this module). "process" runs threads in a frozen build
+PARALLEL_BALANCING_MODE: Optional[str] = None
+MAX_NUMBER_OF_PARALLEL_WORKERS: Optional[int] = None
+
+# Stuff to simplify Testing
+USE_ALGORITHM_1_BY_HIGHEST_DIFFERENCE = True
+USE_ALGORITHM_3_BY_EXACT_QUOTAS = False
+# Balances the total number of cards due each day (all intervals summed) instead of each interval separately
+USE_ALGORITHM_4_BY_GLOBAL_DAILY_LOAD = False
+# Algorithm 1 only moves numbers of cards between due days, then the cards of each interval are assigned once to those
+# numbers of cards (sorted by original due day) : no card is moved between the due days during the iterations
+USE_TWO_PHASE_BALANCING = True
+# Estimated review time of the cards without a known answer time, when there is no known answer time at all in their
+# interval (else the median of the known ones of the interval is used)
+DEFAULT_ESTIMATED_REVIEW_TIME_IN_SECONDS = 10.0
+USE_NUMPY_ENGINE_IF_AVAILABLE = True
+SHOW_EVERY_ITERATION = False
+MULTIPLIER_FOR_MAX_NB_OF_ITERATION = 1
+
+# Fictive Deck to test the performance of the algorithm
+# TODO: test "interval + 1" for "over-scheduled cards"
+USE_FICTIVE_DECK = False
+FICTIVE_INTERVAL = 21
+FICTIVE_DUE_DAY = 1
+FICTIVE_NUMBER_OF_CARDS = 500
+
+# Instrumentation of the runs (see Instrumentation)
+PHASE_NAME_OF_MAIN_ALGORITHM = "main algorithm"
+NUMBER_OF_SLOWEST_INTERVALS_SHOWN = 3
+
+# Persistent cache of the results (see PersistentResultCache) : to be increased when the content of an entry changes
+VERSION_OF_RESULT_CACHE = 1
+
+# Journal of the rescheduled cards (see UndoJournal) : the oldest runs are forgotten
+MAX_NUMBER_OF_RUNS_IN_UNDO_JOURNAL = 10
+
+
+# --- MESSAGES ---#
+# Messages are printed when running without Anki, the add-on sets aqt.utils.showInfo as handler when it is loaded
+message_handler: Callable[[str], None] = print
+
+
+def set_message_handler(handler: Callable[[str], None]) -> None:
+    global message_handler
+    message_handler = handler
+
+
+# Same name as aqt.utils.showInfo, which is used as handler inside Anki
+def showInfo(text: str) -> None:
+    message_handler(text)
+
+
+# --- BEGINNING of CardRecord Class --- #
+
+
+# Lightweight read-only copy of the only columns of a card used by the rescheduling logic
+# Full Card objects are only built (from the card id) for the cards which are actually written to the database
+class CardRecord:
+    __slots__ = ("id", "ivl", "due", "queue", "type")
+    id: CardId
+    ivl: int
+    due: int
+    queue: CardQueue
+    type: CardType
+
+    def __init__(self, id: CardId, ivl: int, due: int, queue: CardQueue, type: CardType) -> None:
+        self.id = id
+        self.ivl = ivl
+        self.due = due
+        self.queue = queue
+        self.type = type
+
+
+# --- END of CardRecord Class --- #
+
+
+# --- BEGINNING of CardColumns Class --- #
+
+
+# Compact storage of the cards of a whole deck : one array by column instead of one object by card (22 bytes by card
+# instead of more than 100 for a CardRecord with its integers in a list). The records are only built while iterating,
+# so RescheduleDeck only keeps the records of the cards it actually reschedules
+class CardColumns:
+    __slots__ = ("ids", "ivls", "dues", "queues", "types")
+    ids: "array[int]"
+    ivls: "array[int]"
+    dues: "array[int]"
+    queues: "array[int]"
+    types: "array[int]"
+
+    # Rows of (id, ivl, due, queue, type), as returned by the database
+    def __init__(self, rows: Sequence[Sequence[int]] = ()) -> None:
+        self.ids = array("q", (row[0] for row in rows))
+        self.ivls = array("i", (row[1] for row in rows))
+        self.dues = array("q", (row[2] for row in rows))
+        self.queues = array("b", (row[3] for row in rows))
+        self.types = array("b", (row[4] for row in rows))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[CardRecord]:
+        for id_, ivl, due, queue, type_ in zip(self.ids, self.ivls, self.dues, self.queues, self.types):
+            yield CardRecord(CardId(id_), ivl, due, CardQueue(queue), CardType(type_))
+
+
+# --- END of CardColumns Class --- #
+
+
+# --- BEGINNING of DueDayBucket Class --- #
+
+
+# Cards of a single due day of a single interval, grouped by original due day
+# Adding or removing a card is O(1), and moving k cards to a target day costs O(k) (+ the number of original due days
+# skipped), as the original due days are kept sorted : the cards closest to the target day are found around it
+# Each card gets an increasing sequence number when added, so that cards at the same distance from the target day are
+# selected in the order in which they were added to the bucket (= same order as a list of cards)
+class DueDayBucket:
+    __slots__ = ("cards_by_original_due_day", "sorted_original_due_days", "number_of_cards")
+    cards_by_original_due_day: Dict[Due_Day, Dict[CardRecord, int]]
+    sorted_original_due_days: List[Due_Day]
+    number_of_cards: Nb_of_Cards
+
+    sequence_numbers: Iterator[int] = itertools.count()
+
+    def __init__(self) -> None:
+        self.cards_by_original_due_day = dict()
+        self.sorted_original_due_days = list()
+        self.number_of_cards = Nb_of_Cards(0)
+
+    def __len__(self) -> int:
+        return self.number_of_cards
+
+    # Note: the cards are iterated by original due day, not in the order in which they were added
+    def __iter__(self) -> Iterator[CardRecord]:
+        for cards in self.cards_by_original_due_day.values():
+            yield from cards
+
+    def add(self, card: CardRecord, original_due_day: Due_Day) -> None:
+        if original_due_day not in self.cards_by_original_due_day:
+            self.cards_by_original_due_day[original_due_day] = dict()
+            insort(self.sorted_original_due_days, original_due_day)
+        self.cards_by_original_due_day[original_due_day][card] = next(DueDayBucket.sequence_numbers)
+        self.number_of_cards += 1
+
+    # Removes and returns (at most) "amount" cards whose original due day is the closest to "target_day"
+    def pop_cards_closest_to_target_day(self, target_day: Due_Day, amount: Nb_of_Cards) -> List[CardRecord]:
+        selected_cards_with_original_due_day: List[Tuple[CardRecord, Due_Day]] = list()
+        original_due_days = self.sorted_original_due_days
+        index_after = bisect_left(original_due_days, target_day)
+        index_before = index_after - 1
+        while len(selected_cards_with_original_due_day) < amount \
+                and (index_before >= 0 or index_after < len(original_due_days)):
+            distance_before = target_day - original_due_days[index_before] if index_before >= 0 else None
+            distance_after = original_due_days[index_after] - target_day if index_after < len(original_due_days) \
+                else None
+            closest_original_due_days: List[Due_Day] = list()
+            if distance_before is not None and (distance_after is None or distance_before <= distance_after):
+                closest_original_due_days.append(original_due_days[index_before])
+                index_before -= 1
+            if distance_after is not None and (distance_before is None or distance_after <= distance_before):
+                closest_original_due_days.append(original_due_days[index_after])
+                index_after += 1
+            # Cards at the same distance are taken by order of addition
+            candidates = heapq.merge(*[self.iterate_cards_by_order_of_addition(original_due_day)
+                                       for original_due_day in closest_original_due_days])
+            number_of_missing_cards = amount - len(selected_cards_with_original_due_day)
+            for _, original_due_day, card in itertools.islice(candidates, number_of_missing_cards):
+                selected_cards_with_original_due_day.append((card, original_due_day))
+        for card, original_due_day in selected_cards_with_original_due_day:
+            self.remove(card, original_due_day)
+        return [card for card, _ in selected_cards_with_original_due_day]
+
+    def iterate_cards_by_order_of_addition(self, original_due_day: Due_Day) \
+            -> Iterator[Tuple[int, Due_Day, CardRecord]]:
+        for card, sequence_number in self.cards_by_original_due_day[original_due_day].items():
+            yield sequence_number, original_due_day, card
+
+    def remove(self, card: CardRecord, original_due_day: Due_Day) -> None:
+        cards: Dict[CardRecord, int] = self.cards_by_original_due_day[original_due_day]
+        del cards[card]
+        self.number_of_cards -= 1
+        if len(cards) == 0:
+            del self.cards_by_original_due_day[original_due_day]
+            del self.sorted_original_due_days[bisect_left(self.sorted_original_due_days, original_due_day)]
+
+
+# --- END of DueDayBucket Class --- #
+
+
+# --- BEGINNING of DueDayCountTree Class --- #
+
+
+# Segment tree over the number of cards of each due day (1 to interval) of a single interval
+# Gives the highest/lowest number of cards closest to a given due day in O(log n), and is updated in O(log n)
+# Note: the number of cards is used instead of the difference, as the average is the same for all due days
+class DueDayCountTree:
+    number_of_due_days: int
+    size: int
+    maximums: List[IntFloat]
+    minimums: List[IntFloat]
+
+    def __init__(self, numbers_of_cards: Sequence[int]) -> None:
+        self.number_of_due_days = len(numbers_of_cards)
+        self.size = 1
+        while self.size < self.number_of_due_days:
+            self.size *= 2
+        # Leaves are stored from index "size" (due day 1) and unused leaves can never be the highest or the lowest
+        self.maximums = [float("-inf")] * (2 * self.size)
+        self.minimums = [float("inf")] * (2 * self.size)
+        for index, number_of_cards in enumerate(numbers_of_cards):
+            self.maximums[self.size + index] = number_of_cards
+            self.minimums[self.size + index] = number_of_cards
+        for node in range(self.size - 1, 0, -1):
+            self.maximums[node] = max(self.maximums[2 * node], self.maximums[2 * node + 1])
+            self.minimums[node] = min(self.minimums[2 * node], self.minimums[2 * node + 1])
+
+    def update(self, due_day: Due_Day, number_of_cards: int) -> None:
+        node = self.size + due_day - 1
+        self.maximums[node] = number_of_cards
+        self.minimums[node] = number_of_cards
+        node //= 2
+        while node >= 1:
+            self.maximums[node] = max(self.maximums[2 * node], self.maximums[2 * node + 1])
+            self.minimums[node] = min(self.minimums[2 * node], self.minimums[2 * node + 1])
+            node //= 2
+
+    # Returns the due day with the highest (or lowest) number of cards which is the closest to "given_due_day"
+    # In case of equal distance, the earliest due day is chosen (same result as a scan by increasing due day)
+    def find_extremum_closest_to_given_due_day(self, highest: bool, given_due_day: Due_Day) -> Due_Day:
+        extremum = self.maximums[1] if highest else self.minimums[1]
+        due_day_before: Due_Day = self.find_last_due_day_reaching(extremum, highest,
+                                                                  Due_Day(min(given_due_day, self.number_of_due_days)))
+        due_day_after: Due_Day = self.find_first_due_day_reaching(extremum, highest, Due_Day(max(given_due_day, 1)))
+        if due_day_before == 0:
+            return due_day_after
+        if due_day_after == 0 or given_due_day - due_day_before <= due_day_after - given_due_day:
+            return due_day_before
+        return due_day_after
+
+    def is_node_reaching(self, node: int, value: IntFloat, highest: bool) -> bool:
+        return self.maximums[node] >= value if highest else self.minimums[node] <= value
+
+    # First due day >= "start" whose number of cards is >= value (if highest) or <= value (if lowest), else 0
+    def find_first_due_day_reaching(self, value: IntFloat, highest: bool, start: Due_Day) -> Due_Day:
+        def descend(node: int, node_start: int, node_end: int) -> int:
+            if node_end < start or not self.is_node_reaching(node, value, highest):
+                return 0
+            if node >= self.size:
+                return node_start
+            middle = (node_start + node_end) // 2
+            return descend(2 * node, node_start, middle) or descend(2 * node + 1, middle + 1, node_end)
+
+        return Due_Day(descend(1, 1, self.size))
+
+    # Last due day <= "end" whose number of cards is >= value (if highest) or <= value (if lowest), else 0
+    def find_last_due_day_reaching(self, value: IntFloat, highest: bool, end: Due_Day) -> Due_Day:
+        def descend(node: int, node_start: int, node_end: int) -> int:
+            if node_start > end or not self.is_node_reaching(node, value, highest):
+                return 0
+            if node >= self.size:
+                return node_start
+            middle = (node_start + node_end) // 2
+            return descend(2 * node + 1, middle + 1, node_end) or descend(2 * node, node_start, middle)
+
+        return Due_Day(descend(1, 1, self.size))
+
+
+# --- END of DueDayCountTree Class --- #
+
+
+# --- BEGINNING of FreeDayFinder Class --- #
+
+
+# Due days (1 to max_due_day) which still have places left, with the free due day closest to a given one in almost O(1)
+# Once a due day is full, it stays full : each due day points to the next (and previous) due day which may still be
+# free, as in a union-find with path compression (0 and max_due_day + 1 are the ends, returned if nothing is free)
+class FreeDayFinder:
+    max_due_day: int
+    places_left: List[int]
+    next_free_due_day: List[int]
+    previous_free_due_day: List[int]
+
+    # places_left[due_day] for due days 0 to max_due_day (due day 0 is not used)
+    def __init__(self, places_left: List[int]) -> None:
+        self.max_due_day = len(places_left) - 1
+        self.places_left = places_left
+        self.next_free_due_day = list(range(self.max_due_day + 2))
+        self.previous_free_due_day = list(range(self.max_due_day + 2))
+        for due_day in range1(1, self.max_due_day):
+            if places_left[due_day] <= 0:
+                self.mark_as_full(due_day)
+
+    def mark_as_full(self, due_day: int) -> None:
+        self.next_free_due_day[due_day] = due_day + 1
+        self.previous_free_due_day[due_day] = due_day - 1
+
+    @staticmethod
+    def find(links: List[int], due_day: int) -> int:
+        root = due_day
+        while links[root] != root:
+            root = links[root]
+        while links[due_day] != root:
+            links[due_day], due_day = root, links[due_day]
+        return root
+
+    # Free due day between 1 and "last_due_day" closest to "given_due_day" (the earliest in case of equal distance),
+    # else 0
+    def find_free_due_day_closest_to(self, given_due_day: int, last_due_day: int) -> int:
+        given_due_day = min(max(given_due_day, 1), last_due_day)
+        due_day_before = self.find(self.previous_free_due_day, given_due_day)
+        due_day_after = self.find(self.next_free_due_day, given_due_day)
+        if due_day_after > last_due_day:
+            return due_day_before
+        if due_day_before == 0 or given_due_day - due_day_before > due_day_after - given_due_day:
+            return due_day_after
+        return due_day_before
+
+    def take_place(self, due_day: int) -> None:
+        self.places_left[due_day] -= 1
+        if self.places_left[due_day] == 0:
+            self.mark_as_full(due_day)
+
+
+# --- END of FreeDayFinder Class --- #
+
+
+# --- BEGINNING of NumpyDueDayHistogram Class --- #
+
+
+# Optional engine (only used when NumPy is available) computing with array operations the number of cards for each
+# interval and each due day, the averages and the differences, instead of nested loops over dicts of lists
+# The numbers of cards are stored in a 2-D array : one row for each interval, one column for each due day
+class NumpyDueDayHistogram:
+    sequence_of_intervals: Sequence[Interval]
+    row_by_card: "numpy.ndarray"
+    due_day_by_card: "numpy.ndarray"
+    due_day_original_by_card: "numpy.ndarray"
+    number_of_columns: int
+    numbers_of_cards: "numpy.ndarray"
+
+    def __init__(self, cards: Sequence[CardRecord], sequence_of_intervals: Sequence[Interval],
+                 day_of_today: Due_Day_With_Origin) -> None:
+        self.sequence_of_intervals = sequence_of_intervals
+        intervals = numpy.fromiter((card.ivl for card in cards), dtype=numpy.int64, count=len(cards))
+        due_days = numpy.fromiter((card.due for card in cards), dtype=numpy.int64, count=len(cards)) - day_of_today
+        queues = numpy.fromiter((card.queue for card in cards), dtype=numpy.int64, count=len(cards))
+
+        # Row of the band of each interval (see get_band_of_interval)
+        row_by_interval = numpy.zeros(max(intervals, default=0) + 1, dtype=numpy.int64)
+        row_by_band = {band: row for row, band in enumerate(sequence_of_intervals)}
+        for interval in numpy.unique(intervals).tolist():
+            row_by_interval[interval] = row_by_band[get_band_of_interval(interval)]
+        self.row_by_card = row_by_interval[intervals]
+        bands = numpy.array(sequence_of_intervals, dtype=numpy.int64)[self.row_by_card]
+
+        # Same rules as RescheduleDeck.get_cards_by_due_day_and_original_due_day (overdue, then over-scheduled)
+        is_overdue = ((queues == 2) & (due_days <= 0)) | (queues == -3) | (queues == 1)
+        is_over_scheduled = ~is_overdue & (due_days > intervals)
+        self.due_day_by_card = numpy.where(is_overdue, 1, numpy.where(is_over_scheduled, bands,
+                                                                      numpy.minimum(due_days, bands)))
+        self.due_day_original_by_card = numpy.where(is_overdue, 0,
+                                                    numpy.where(is_over_scheduled, intervals + 1, due_days))
+        self.number_of_columns = max(sequence_of_intervals) + 1
+        self.numbers_of_cards = numpy.bincount(self.row_by_card * self.number_of_columns + self.due_day_by_card,
+                                               minlength=len(sequence_of_intervals) * self.number_of_columns) \
+            .reshape(len(sequence_of_intervals), self.number_of_columns)
+
+    # The cards keep their relative order inside each due day (stable sort), as with the pure-Python path
+    def get_cards_by_due_day(self, cards: Sequence[CardRecord]) -> Dict[Interval, Dict[Due_Day, DueDayBucket]]:
+        cell_by_card = self.row_by_card * self.number_of_columns + self.due_day_by_card
+        sorted_indexes: List[int] = numpy.argsort(cell_by_card, kind="stable").tolist()
+        original_due_days: List[int] = self.due_day_original_by_card.tolist()
+        ends_of_cells: List[int] = numpy.cumsum(self.numbers_of_cards).tolist()
+        cards_all_sorted: Dict[Interval, Dict[Due_Day, DueDayBucket]] = dict()
+        for row, interval in enumerate(self.sequence_of_intervals):
+            cards_all_sorted[interval] = dict()
+            for due_day in range1(1, interval):  # type: Due_Day
+                end_of_cell = ends_of_cells[row * self.number_of_columns + due_day]
+                start_of_cell = end_of_cell - int(self.numbers_of_cards[row, due_day])
+                bucket = DueDayBucket()
+                for index in sorted_indexes[start_of_cell:end_of_cell]:
+                    bucket.add(cards[index], Due_Day(original_due_days[index]))
+                cards_all_sorted[interval][due_day] = bucket
+        return cards_all_sorted
+
+    def get_due_day_original_by_card(self, cards: Sequence[CardRecord]) -> Dict[CardId, Due_Day]:
+        return dict(zip((card.id for card in cards), self.due_day_original_by_card.tolist()))
+
+    # Same layout as RescheduleDeck.get_number_of_cards_by_due_day (index 0 = no card)
+    def get_number_of_cards_by_due_day(self) -> Dict[Interval, List[Nb_of_Cards]]:
+        return {interval: self.numbers_of_cards[row, :interval + 1].tolist()
+                for row, interval in enumerate(self.sequence_of_intervals)}
+
+    def get_average_number_by_interval(self) -> Dict[Interval, Average]:
+        totals: List[int] = self.numbers_of_cards.sum(axis=1).tolist()
+        return {interval: RescheduleDeck.get_average_from_total(Nb_of_Cards(totals[row]), interval)
+                for row, interval in enumerate(self.sequence_of_intervals)}
+
+    def get_difference_to_average(self, average_by_interval: Dict[Interval, Average]) \
+            -> Dict[Interval, Dict[Due_Day, Difference]]:
+        averages = numpy.array([average_by_interval[interval] for interval in self.sequence_of_intervals],
+                               dtype=numpy.float64)
+        differences: List[List[float]] = (self.numbers_of_cards - averages[:, None]).tolist()
+        return {interval: {due_day: differences[row][due_day] for due_day in range1(1, interval)}
+                for row, interval in enumerate(self.sequence_of_intervals)}
+
+
+# --- END of NumpyDueDayHistogram Class --- #
+
+
+# --- BEGINNING of Parallel Balancing --- #
+
+
+# Modes chosen by the global variables above, sent to the workers with their work : the worker processes re-import this
+# module (with the default values), so each RescheduleDeck uses its own copy of the modes instead of the globals
+class BalancingModes(NamedTuple):
+    use_algorithm_1_by_highest_difference: bool
+    use_algorithm_3_by_exact_quotas: bool
+    use_algorithm_4_by_global_daily_load: bool
+    use_two_phase_balancing: bool
+    use_numpy_engine_if_available: bool
+    parallel_balancing_mode: Optional[str]
+
+
+def get_balancing_modes() -> BalancingModes:
+    return BalancingModes(USE_ALGORITHM_1_BY_HIGHEST_DIFFERENCE, USE_ALGORITHM_3_BY_EXACT_QUOTAS,
+                          USE_ALGORITHM_4_BY_GLOBAL_DAILY_LOAD, USE_TWO_PHASE_BALANCING, USE_NUMPY_ENGINE_IF_AVAILABLE,
+                          PARALLEL_BALANCING_MODE)
+
+
+# Everything needed to balance a single interval in a worker : only plain arrays, no Anki object
+# Note: all the cards sent are in review (queue = 2, type = 2), as the others were excluded before
+class IntervalWorkUnit(NamedTuple):
+    interval: Interval
+    day_of_today: Due_Day_With_Origin
+    is_reschedule_overdue_cards: bool
+    card_ids: "array[int]"
+    card_ivls: "array[int]"
+    card_dues: "array[int]"
+    balancing_modes: BalancingModes
+
+
+# Final due day of every card of a single interval, in the same order as the cards of its work unit
+# The moves are those of the worker (see PhaseMeasure), added to the measures of the caller
+class IntervalResult(NamedTuple):
+    interval: Interval
+    number_of_iterations: int
+    card_ids: "array[int]"
+    due_days: "array[int]"
+    number_of_moves: int = 0
+    number_of_move_calls: int = 0
+
+
+def new_work_unit_of_interval(interval: Interval, cards: Sequence[CardRecord], day_of_today: Due_Day_With_Origin,
+                              is_reschedule_overdue_cards: bool, balancing_modes: BalancingModes) -> IntervalWorkUnit:
+    return IntervalWorkUnit(interval, day_of_today, is_reschedule_overdue_cards,
+                            array("q", [card.id for card in cards]), array("q", [card.ivl for card in cards]),
+                            array("q", [card.due for card in cards]), balancing_modes)
+
+
+# Executed by the workers : balances a single interval with the same algorithm as the serial run
+def balance_work_unit_of_interval(work_unit: IntervalWorkUnit) -> IntervalResult:
+    interval = work_unit.interval
+    cards: List[CardRecord] = [CardRecord(CardId(card_id), ivl, due, CardQueue(2), CardType(2))
+                               for card_id, ivl, due
+                               in zip(work_unit.card_ids, work_unit.card_ivls, work_unit.card_dues)]
+    fictive_deck: DeckDict = {"timeToday": [work_unit.day_of_today, 0]}
+    # "interval" is a band : all the intervals of its cards are given (they all have the same band)
+    reschedule_deck = RescheduleDeck(fictive_deck, cards, sorted(set(work_unit.card_ivls)) or [interval],
+                                     work_unit.is_reschedule_overdue_cards, balancing_modes=work_unit.balancing_modes)
+    reschedule_deck.run()
+    return reschedule_deck.get_result_of_interval(interval)
+
+
+# Worker processes are started with "spawn" (forking a process running Qt is not safe), which runs sys.executable :
+# in a frozen build (e.g. packaged Anki), it is the application itself and not a Python interpreter, so the workers
+# are threads there
+def new_executor_for_parallel_balancing(parallel_balancing_mode: Optional[str]) -> Executor:
+    if parallel_balancing_mode == "process" and not getattr(sys, "frozen", False):
+        return ProcessPoolExecutor(max_workers=MAX_NUMBER_OF_PARALLEL_WORKERS, mp_context=get_context("spawn"))
+    else:
+        return ThreadPoolExecutor(max_workers=MAX_NUMBER_OF_PARALLEL_WORKERS)
+
+
+# --- END of Parallel Balancing --- #
+
+
+# --- BEGINNING of Instrumentation Classes --- #
+
+
+# Measures of a single phase of a run
+# "cards touched" = cards read or written by the phase, "moves" = cards moved from a due day to another one
+# (a card can be moved several times), "move calls" = calls of RescheduleDeck.move_cards_from_original_to_target_day
+class PhaseMeasure:
+    __slots__ = ("name", "wall_time_in_seconds", "number_of_cards_touched", "number_of_moves", "number_of_move_calls")
+    name: str
+    wall_time_in_seconds: float
+    number_of_cards_touched: int
+    number_of_moves: int
+    number_of_move_calls: int
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall_time_in_seconds = 0.0
+        self.number_of_cards_touched = 0
+        self.number_of_moves = 0
+        self.number_of_move_calls = 0
+
+    def add(self, other: "PhaseMeasure") -> None:
+        self.wall_time_in_seconds += other.wall_time_in_seconds
+        self.number_of_cards_touched += other.number_of_cards_touched
+        self.number_of_moves += other.number_of_moves
+        self.number_of_move_calls += other.number_of_move_calls
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in PhaseMeasure.__slots__}
+
+    def print_measure(self) -> str:
+        text = f"{self.name} : {self.wall_time_in_seconds * 1000:.1f} ms, {self.number_of_cards_touched} cards touched"
+        text += f", {self.number_of_moves} moves ({self.number_of_move_calls} move calls)"
+        return text
+
+
+# Measures of all the phases of a run (card loading, preparation, main algorithm, result, database write)
+# The main algorithm is measured step by step (one step for each interval), its phase is the sum of its steps
+class Instrumentation:
+    phases: Dict[str, PhaseMeasure]
+    steps_of_main_algorithm: Dict[Interval, PhaseMeasure]
+    current_phase: Optional[PhaseMeasure]
+    start_time_of_current_step: float
+
+    def __init__(self) -> None:
+        self.phases = dict()
+        self.steps_of_main_algorithm = dict()
+        self.current_phase = None
+        self.start_time_of_current_step = 0.0
+
+    # Measuring the same phase twice adds up the measures
+    @contextmanager
+    def measure(self, name: str, number_of_cards_touched: int = 0) -> Iterator[PhaseMeasure]:
+        phase = self.phases.setdefault(name, PhaseMeasure(name))
+        phase.number_of_cards_touched += number_of_cards_touched
+        previous_phase, self.current_phase = self.current_phase, phase
+        start_time = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase.wall_time_in_seconds += time.perf_counter() - start_time
+            self.current_phase = previous_phase
+
+    # The interval balanced by a step of the main algorithm is only known once the step is finished
+    def start_step_of_main_algorithm(self) -> None:
+        self.current_phase = PhaseMeasure(PHASE_NAME_OF_MAIN_ALGORITHM)
+        self.start_time_of_current_step = time.perf_counter()
+
+    def stop_step_of_main_algorithm(self, interval: Interval, number_of_cards_touched: int) -> None:
+        step = self.current_phase
+        step.wall_time_in_seconds = time.perf_counter() - self.start_time_of_current_step
+        step.number_of_cards_touched = number_of_cards_touched
+        step.name = f"{PHASE_NAME_OF_MAIN_ALGORITHM} (interval {interval})"
+        self.steps_of_main_algorithm[interval] = step
+        self.phases.setdefault(PHASE_NAME_OF_MAIN_ALGORITHM, PhaseMeasure(PHASE_NAME_OF_MAIN_ALGORITHM)).add(step)
+        self.current_phase = None
+
+    # Called at each move of cards, counted in the phase being measured
+    def count_move(self, number_of_moved_cards: int) -> None:
+        self.count_moves_of_worker(number_of_moved_cards, 1)
+
+    # Moves done by a worker of the parallel mode (measured by its own instrumentation), counted in the phase being
+    # measured
+    def count_moves_of_worker(self, number_of_moves: int, number_of_move_calls: int) -> None:
+        if self.current_phase is not None:
+            self.current_phase.number_of_moves += number_of_moves
+            self.current_phase.number_of_move_calls += number_of_move_calls
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "phases": [phase.to_dict() for phase in self.phases.values()],
+            "main_algorithm_by_interval": [step.to_dict() for step in self.steps_of_main_algorithm.values()],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=1)
+
+    # Only the slowest steps of the main algorithm are shown
+    def print_phases(self) -> str:
+        text = "Performance details :"
+        for phase in self.phases.values():
+            text += f"\n {phase.print_measure()}"
+            if phase.name == PHASE_NAME_OF_MAIN_ALGORITHM:
+                slowest_steps = sorted(self.steps_of_main_algorithm.values(),
+                                       key=lambda step_: step_.wall_time_in_seconds, reverse=True)
+                for step in slowest_steps[:NUMBER_OF_SLOWEST_INTERVALS_SHOWN]:
+                    text += f"\n    {step.print_measure()}"
+        return text
+
+
+# --- END of Instrumentation Classes --- #
+
+
+# --- BEGINNING of ReschedulingStatistics Class --- #
+
+
+# Summary of a run, computed in a single pass over the moved cards only (integer counts, no list of cards), so that it
+# is cheap enough to be computed at each preview. "print_statistics" renders the report shown to the user
+class ReschedulingStatistics(NamedTuple):
+    day_of_today: Due_Day_With_Origin
+    number_of_cards_overdue: Nb_of_Cards
+    number_of_cards_over_scheduled: Nb_of_Cards
+    number_of_cards_in_range: Nb_of_Cards
+    number_of_cards_to_reschedule: Nb_of_Cards
+    # Sums of the absolute and algebraic differences between the new and original due days of the rescheduled cards
+    total_amount_of_rescheduling: int
+    total_amount_of_push_forward: int
+    # Number of rescheduled cards for each absolute difference (at the index of the difference)
+    number_of_cards_by_absolute_difference: List[Nb_of_Cards]
+    highest_daily_load_original: Nb_of_Cards
+    highest_daily_load_target: Nb_of_Cards
+    number_of_iterations_by_interval: Dict[Interval, int]
+    # Only when balancing by estimated review time (in seconds, all intervals summed)
+    highest_daily_review_time_original: Optional[float] = None
+    highest_daily_review_time_target: Optional[float] = None
+
+    @staticmethod
+    def round_to_hundredth(value: float) -> float:
+        return round(value * 100) / 100
+
+    # JSON keys can only be strings : the iterations are saved as pairs (interval, nb of iterations)
+    def to_dict(self) -> Dict[str, Any]:
+        statistics = self._asdict()
+        statistics["number_of_iterations_by_interval"] = list(self.number_of_iterations_by_interval.items())
+        return statistics
+
+    @staticmethod
+    def from_dict(statistics: Dict[str, Any]) -> "ReschedulingStatistics":
+        number_of_iterations_by_interval = {Interval(interval): nb_of_iterations for interval, nb_of_iterations
+                                            in statistics["number_of_iterations_by_interval"]}
+        return ReschedulingStatistics(**{**statistics,
+                                         "number_of_iterations_by_interval": number_of_iterations_by_interval})
+
+    # TODO: DIFFERENTIATE TEXT IF RESCHEDULING PAST OVERDUE CARDS OR NOT
+    def print_statistics(self) -> str:
+        if self.number_of_cards_to_reschedule == 0:
+            return "Your deck doesn't need to be rescheduled. \n"
+
+        percentage_of_card_rescheduled = self.round_to_hundredth(
+            self.number_of_cards_to_reschedule / self.number_of_cards_in_range * 100)
+        average_amount_of_rescheduling = self.round_to_hundredth(
+            self.total_amount_of_rescheduling / self.number_of_cards_to_reschedule)
+        average_amount_of_push_forward = self.round_to_hundredth(
+            self.total_amount_of_push_forward / self.number_of_cards_to_reschedule)
+        average_amount_of_all_push_forward = self.round_to_hundredth(
+            self.total_amount_of_push_forward / self.number_of_cards_in_range)
+
+        lines: List[str] = [
+            "Distribution of cards to reschedule : ",
+            f" Today's date for current deck = {self.day_of_today}",
+            f"    Nb of cards overdue (in review status / queue = 2 and type = 2) = {self.number_of_cards_overdue}",
+            f"    Nb of cards over-scheduled (in review status with due date > interval)"
+            f" = {self.number_of_cards_over_scheduled}",
+            f" Nb of cards in deck in review status and in the required interval range"
+            f" = {self.number_of_cards_in_range}",
+            f" Nb of cards to reschedule = {self.number_of_cards_to_reschedule}",
+            f"    Percentage of cards to reschedule = {percentage_of_card_rescheduled}%",
+            f"    Total amount by which cards are rescheduled (sum of absolute differences)"
+            f" = {self.total_amount_of_rescheduling} days",
+            f"    Average amount by which cards are rescheduled (absolute difference among rescheduled cards)"
+            f" = {average_amount_of_rescheduling} days",
+            f"    Average amount by which cards are pushed forward (algebraic difference among rescheduled cards)"
+            f" = {average_amount_of_push_forward} days",
+            f"    Average amount by which all cards are pushed forward (algebraic difference among all cards)"
+            f" = {average_amount_of_all_push_forward} days",
+            f" Highest number of cards due on a single day (all intervals summed)"
+            f" = {self.highest_daily_load_original} before, {self.highest_daily_load_target} after rescheduling",
+        ]
+        if self.highest_daily_review_time_original is not None:
+            lines.append(f" Highest estimated review time on a single day (all intervals summed)"
+                         f" = {self.round_to_hundredth(self.highest_daily_review_time_original / 60)} min before"
+                         f", {self.round_to_hundredth(self.highest_daily_review_time_target / 60)} min after"
+                         f" rescheduling")
+        for diff_in_due_day, nb_of_cards in enumerate(self.number_of_cards_by_absolute_difference):
+            if nb_of_cards > 0:
+                lines.append(f"       Amount of cards to reschedule by +- {diff_in_due_day} days : {nb_of_cards}")
+        lines.append("")
+        lines.append(" Iterations of main algorithm : ")
+        # TODO : Only keep the top 5 nbs of iterations
+        for interval, nb_of_iterations in self.number_of_iterations_by_interval.items():
+            if nb_of_iterations > 10:
+                lines.append(f"    For interval = {interval}, nb of iterations = {nb_of_iterations}")
+        lines.append(f" Total number of iterations of main algorithm : "
+                     f"{sum(self.number_of_iterations_by_interval.values())}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+# --- END of ReschedulingStatistics Class --- #
+
+
+# --- BEGINNING of ReorderDeck Class --- #
+
+
+# This class only contain the logic of the rescheduling.
+# It does NOT modify cards (only adds new fields for simplicity, but even that could be avoided) !
+# NO DATABASE ACCESS !
+
+
+class RescheduleDeck:
+    # --- "External" Variables (passed by arguments or by global variables) (not be modified once initialized) --- #
+    deck: DeckDict
+    cards: List[CardRecord]
+    # Intervals of the cards to reschedule, and bands of those intervals (one histogram of due days for each band)
+    intervals_in_range: FrozenSet[int]
+    sequence_of_intervals: Sequence[Interval]
+    is_reschedule_past_overdue_cards: bool
+    max_due: int
+    # Estimated review time (in seconds) of the cards, to balance the review time of each due day instead of the
+    # number of cards (None = balance the number of cards). The cards missing get the median of the others of their
+    # interval (or band), which does not depend on the range of intervals : the result of an interval stays the same
+    # whatever the other intervals in the range, so it can be reused (see reuse_results_of_intervals)
+    review_time_by_card: Optional[Dict[CardId, float]]
+    default_review_time_by_interval: Dict[Interval, float]
+    # Copy of the global modes when the deck is created (or the modes of the caller, in a worker)
+    balancing_modes: BalancingModes
+
+    # --- Internal Variables needed for the algorithm (not modified once initialized) --- #
+    number_of_cards_over_scheduled: Nb_of_Cards = 0
+    number_of_cards_overdue_only_for_reviews_queue_2: Nb_of_Cards = 0
+    number_of_cards_overdue_only_for_learning_queue_1: Nb_of_Cards = 0
+    number_of_cards_overdue_only_for_learning_queue_3: Nb_of_Cards = 0
+    number_of_cards_overdue_only_for_buried_queue_minus_3: Nb_of_Cards = 0
+    day_of_today: Due_Day_With_Origin
+    cards_by_interval: Dict[Interval, List[CardRecord]]
+    due_day_original_by_card: Dict[CardId, Due_Day] = dict()
+    average_number_of_cards_by_interval: Dict[Interval, Average]
+    # The following two "original" variables save the state at the beginning (only the number of cards of each due day
+    # is kept, at the index of the due day, as the original due day of each card is in "due_day_original_by_card")
+    number_of_cards_original: Dict[Interval, List[Nb_of_Cards]]
+    difference_to_average_original: Dict[Interval, Dict[Due_Day, Difference]]
+
+    # --- Internal Variables modified by the algorithm after their first initialization--- #
+    number_of_iterations_of_main_algorithm: Dict[Interval, int] = dict()
+    intervals_to_balance: List[Interval]
+    cards_target: Dict[Interval, Dict[Due_Day, DueDayBucket]]
+    # Number of cards of each due day (same layout as "number_of_cards_original"), ahead of "cards_target" during the
+    # first phase of the two-phase balancing of an interval
+    number_of_cards_target: Dict[Interval, List[Nb_of_Cards]]
+    difference_to_average_target: Dict[Interval, Dict[Due_Day, Difference]]
+    count_tree_target: Dict[Interval, DueDayCountTree]
+    # Only the cards which are not on their original due day, with their current due day in "cards_target" (kept up to
+    # date at each move, so that the result is found without going through all the cards)
+    due_day_target_by_moved_card: Dict[CardId, Due_Day]
+
+    # --- Internal Variables used after the algorithm as a result (not modified once initialized) --- #
+    cards_with_only_different_new_due_day: Dict[CardId, Due_Day_With_Origin]
+
+    def __init__(self, deck: DeckDict, cards: Union[Sequence[CardRecord], CardColumns],
+                 sequence_of_intervals: Sequence[int],
+                 is_reschedule_overdue_cards: bool,
+                 instrumentation: Optional[Instrumentation] = None,
+                 review_time_by_card: Optional[Dict[CardId, float]] = None,
+                 balancing_modes: Optional[BalancingModes] = None) -> None:
+
+        # Initialization of "External" Variables (passed by arguments or by global variables)
+        # (the instrumentation may already contain the measure of the card loading)
+        self.instrumentation = Instrumentation() if instrumentation is None else instrumentation
+        self.deck = deck
+        self.day_of_today = RescheduleDeck.retrieve_date_of_today(deck)
+        if not USE_FICTIVE_DECK:
+            # Only iterated once (replaced by the list of the relevant cards)
+            self.cards = cards
+            self.intervals_in_range = frozenset(sequence_of_intervals)
+        else:
+            self.cards = self.new_fictive_list_of_cards()
+            self.intervals_in_range = frozenset([FICTIVE_INTERVAL])
+        self.sequence_of_intervals = get_bands_of_intervals(self.intervals_in_range)
+        self.is_reschedule_past_overdue_cards = is_reschedule_overdue_cards
+        self.max_due = MINIMUM_DUE_ATTRIBUTE_OF_CARD_WHEN_DUE_IS_TIMESTAMP_OR_RANDOM_ID
+        self.review_time_by_card = review_time_by_card
+        self.balancing_modes = get_balancing_modes() if balancing_modes is None else balancing_modes
+
+        # Preparation of Internal Variables for later use by the rescheduling algorithm
+        with self.instrumentation.measure("exclusion of irrelevant cards", len(self.cards)):
+            self.exclude_irrelevant_cards_and_modify_others()
+        histogram: Optional[NumpyDueDayHistogram] = None
+        with self.instrumentation.measure("bucketing", len(self.cards)):
+            self.cards_by_interval = self.get_cards_by_interval()
+            if self.review_time_by_card is not None:
+                self.default_review_time_by_interval = self.get_median_of_known_review_times_by_interval()
+            if self.is_numpy_engine_used() and len(self.cards) > 0:
+                histogram = NumpyDueDayHistogram(self.cards, self.sequence_of_intervals, self.day_of_today)
+                self.cards_target = histogram.get_cards_by_due_day(self.cards)
+                self.due_day_original_by_card = histogram.get_due_day_original_by_card(self.cards)
+                self.number_of_cards_original = histogram.get_number_of_cards_by_due_day()
+            else:
+                self.cards_target, self.due_day_original_by_card = self.get_cards_by_due_day_and_original_due_day()
+                self.number_of_cards_original = self.get_number_of_cards_by_due_day(self.cards_target)
+        with self.instrumentation.measure("averaging"):
+            if histogram is not None:
+                self.average_number_of_cards_by_interval = histogram.get_average_number_by_interval()
+                self.difference_to_average_original = histogram.get_difference_to_average(
+                    self.average_number_of_cards_by_interval)
+            else:
+                self.average_number_of_cards_by_interval = self.get_average_number_by_due_day()
+                self.difference_to_average_original = self.get_difference_between_current_and_average_due_day()
+            # Same differences at the beginning : copied instead of computed twice
+            self.difference_to_average_target = {interval: dict(differences) for interval, differences
+                                                 in self.difference_to_average_original.items()}
+            self.number_of_cards_target = {interval: list(numbers_of_cards) for interval, numbers_of_cards
+                                           in self.number_of_cards_original.items()}
+            self.count_tree_target = self.get_count_tree_by_interval()
+            self.due_day_target_by_moved_card = self.get_due_day_target_of_cards_not_on_original_due_day()
+        # Note: instance attribute, as the workers of the parallel mode may run at the same time in threads
+        self.number_of_iterations_of_main_algorithm = dict()
+        self.intervals_to_balance = list(self.sequence_of_intervals)
+
+        # The algorithm itself is NOT run here, but by "run" (or step by step by "iterate_rescheduling_by_interval")
+
+        # self.print_cards_by_interval()
+        # self.print_cards_by_interval_by_due_day()
+        # self.print_average()
+        # self.print_difference()
+        # self.print_distribution_of_cards_rescheduled()
+
+    # Runs the whole algorithm at once
+    def run(self) -> None:
+        for _ in self.iterate_rescheduling_by_interval():
+            pass
+
+    # Runs the algorithm step by step : yields each interval once its cards are balanced (so that the caller can show
+    # the progress or stop between two intervals), then determines the result once all the intervals are balanced
+    def iterate_rescheduling_by_interval(self) -> Iterator[Interval]:
+        # The estimated review times are only given to this run (not to the workers), and replace the number of cards
+        if self.review_time_by_card is not None:
+            steps_of_main_algorithm = self.reschedule_cards_algorithm_5_by_estimated_review_time(
+                self.intervals_to_balance)
+        # The global daily load depends on all the intervals at once : they can't be balanced separately by workers
+        elif self.balancing_modes.use_algorithm_4_by_global_daily_load:
+            steps_of_main_algorithm = self.reschedule_cards_algorithm_4_by_global_daily_load()
+        elif self.balancing_modes.parallel_balancing_mode is not None and len(self.intervals_to_balance) > 1:
+            steps_of_main_algorithm = self.reschedule_cards_in_parallel_by_interval()
+        elif self.balancing_modes.use_algorithm_3_by_exact_quotas:
+            steps_of_main_algorithm = self.reschedule_cards_algorithm_3_by_exact_quotas(self.intervals_to_balance)
+        else:
+            # Algorithms 1 and 2 move the cards day by day, so their number of iterations grows with the interval : the
+            # bands of long intervals are balanced by exact quotas instead (single pass whatever the interval)
+            intervals_balanced_alone = [interval for interval in self.intervals_to_balance
+                                        if interval <= MAX_INTERVAL_BALANCED_ALONE]
+            bands_of_long_intervals = [interval for interval in self.intervals_to_balance
+                                       if interval > MAX_INTERVAL_BALANCED_ALONE]
+            if self.balancing_modes.use_algorithm_1_by_highest_difference:
+                steps_of_main_algorithm = self.reschedule_cards_algorithm_1_by_highest_difference(
+                    intervals_balanced_alone)
+            else:
+                steps_of_main_algorithm = self.reschedule_cards_algorithm_2_by_left_to_right(intervals_balanced_alone)
+            steps_of_main_algorithm = itertools.chain(
+                steps_of_main_algorithm, self.reschedule_cards_algorithm_3_by_exact_quotas(bands_of_long_intervals))
+
+        # Each step is measured without the time spent by the caller between two steps
+        self.instrumentation.start_step_of_main_algorithm()
+        for interval in steps_of_main_algorithm:
+            self.instrumentation.stop_step_of_main_algorithm(interval, len(self.cards_by_interval[interval]))
+            yield interval
+            self.instrumentation.start_step_of_main_algorithm()
+        self.instrumentation.current_phase = None
+
+        # After algorithm
+        with self.instrumentation.measure("result diff", len(self.due_day_target_by_moved_card)):
+            self.cards_with_only_different_new_due_day = self.determine_cards_with_only_different_new_due_day()
+
+    # --- Initialization Functions of ReorderDeck Class --- #
+
+    def is_numpy_engine_used(self) -> bool:
+        return self.balancing_modes.use_numpy_engine_if_available and numpy is not None
+
+    # 0 for an empty range of intervals (minimum interval above the maximum one : no card to reschedule)
+    @staticmethod
+    def get_maximum_interval(sequence_of_intervals: Sequence[Interval]) -> Interval:
+        max_interval = Interval(0)
+        for interval in sequence_of_intervals:
+            if interval >= max_interval:
+                max_interval = interval
+        return max_interval
+
+    # Median of the known review times of the cards of each interval (used for the cards of the interval without one)
+    def get_median_of_known_review_times_by_interval(self) -> Dict[Interval, float]:
+        median_by_interval: Dict[Interval, float] = dict()
+        for interval in self.sequence_of_intervals:
+            known_review_times = [self.review_time_by_card[card.id] for card in self.cards_by_interval[interval]
+                                  if card.id in self.review_time_by_card]
+            median_by_interval[interval] = median(known_review_times) if len(known_review_times) > 0 \
+                else DEFAULT_ESTIMATED_REVIEW_TIME_IN_SECONDS
+        return median_by_interval
+
+    def get_estimated_review_time(self, card: CardRecord) -> float:
+        default_review_time = self.default_review_time_by_interval[get_band_of_interval(card.ivl)]
+        return self.review_time_by_card.get(card.id, default_review_time)
+
+    @staticmethod
+    def retrieve_date_of_today(deck) -> Due_Day_With_Origin:
+        return deck.get("timeToday")[0]
+
+    @staticmethod
+    def get_interval(card: CardRecord) -> int:
+        return card.ivl
+
+    @staticmethod
+    def get_queue(card: CardRecord) -> CardQueue:
+        return card.queue
+
+    @staticmethod
+    def get_type(card: CardRecord) -> CardType:
+        return card.type
+
+    def get_due_day(self, card: CardRecord) -> Due_Day:
+        return Due_Day(card.due - self.day_of_today)
+
+    @staticmethod
+    def is_user_buried(card) -> bool:
+        return RescheduleDeck.get_queue(card) == -3
+
+    @staticmethod
+    def is_suspended(card: CardRecord) -> bool:
+        return RescheduleDeck.get_queue(card) == -1
+
+    @staticmethod
+    def is_new(card: CardRecord) -> bool:
+        return RescheduleDeck.get_type(card) == 0
+
+    @staticmethod
+    def is_learning_for_first_time(card: CardRecord) -> bool:
+        return RescheduleDeck.get_type(card) == 1
+
+    @staticmethod
+    def is_review(card: CardRecord) -> bool:
+        return RescheduleDeck.get_type(card) == 2
+
+    @staticmethod
+    def is_really_review(card: CardRecord) -> bool:
+        return RescheduleDeck.get_type(card) == 2 and RescheduleDeck.get_queue(card) == 2
+
+    @staticmethod
+    def is_relearning(card: CardRecord) -> bool:
+        return RescheduleDeck.get_type(card) == 3
+
+    def is_card_overdue(self, card: CardRecord) -> bool:
+        card_queue = self.get_queue(card)
+        card_due_day = self.get_due_day(card)
+        return (card_queue == 2 and card_due_day <= 0) or card_queue in (-3, 1)
+
+    @staticmethod
+    def init_dict_of_cards(range_of_integer_keys: Sequence[int]) -> Dict[Any, List[CardRecord]]:
+        dict_of_cards: Dict[Any, List[CardRecord]] = dict()
+        for interval in range_of_integer_keys:
+            dict_of_cards[interval]: List[CardRecord] = list()
+        return dict_of_cards
+
+    @staticmethod
+    def init_dict_of_buckets(range_of_integer_keys: Sequence[int]) -> Dict[Any, DueDayBucket]:
+        dict_of_buckets: Dict[Any, DueDayBucket] = dict()
+        for due_day in range_of_integer_keys:
+            dict_of_buckets[due_day] = DueDayBucket()
+        return dict_of_buckets
+
+    @staticmethod
+    def init_dict_of_dict_of_buckets(range_of_first_integer_keys: Sequence[Interval],
+                                     ) -> Dict[Interval, Dict[Due_Day, DueDayBucket]]:
+        dict_of_dict_of_buckets: Dict[Interval, Dict[Due_Day, DueDayBucket]] = dict()
+        for interval in range_of_first_integer_keys:  # type: Interval
+            dict_of_dict_of_buckets[interval] = RescheduleDeck.init_dict_of_buckets(range1(1, interval))
+        return dict_of_dict_of_buckets
+
+    def new_fictive_list_of_cards(self) -> List[CardRecord]:
+        fictive_interval = FICTIVE_INTERVAL
+        fictive_due_day = FICTIVE_DUE_DAY
+        fictive_number_of_cards = FICTIVE_NUMBER_OF_CARDS
+        cards: List[CardRecord] = list()
+        for fictive_id in range1(1, fictive_number_of_cards):
+            new_card = CardRecord(CardId(-fictive_id), ivl=fictive_interval, due=self.day_of_today + fictive_due_day,
+                                  queue=CardQueue(2), type=CardType(2))
+            cards.append(new_card)
+        return cards
+
+    # queue = integer
+    # -- -3=user buried(In scheduler 2),
+    # -- -2=sched buried (In scheduler 2),
+    # -- -2=buried(In scheduler 1),
+    # -- -1=suspended,
+    # -- 0=new, 1=learning, 2=review
+    # -- 3=in learning, next rev in at least a day after the previous review
+    # -- 4=preview
+
+    # type = integer
+    # -- 0 = new,
+    # -- 1 = learning,
+    # -- 2 = review,
+    # -- 3 = relearning
+
+    # TODO: look at the way the browser retrieves the due day, in case something was missed (which is most probable)
+    def exclude_irrelevant_cards_and_modify_others(self) -> None:
+        self.cards = list(self.iterate_relevant_cards())
+
+    # Single pass over the cards of the deck : each card is classified once (with a set for the intervals), the overdue
+    # counters are accumulated on the way, and only the cards needed by the algorithm are yielded
+    def iterate_relevant_cards(self) -> Iterator[CardRecord]:
+        set_of_intervals = self.intervals_in_range
+        for card in self.cards:
+            # If card not in the desired intervals, we don't keep it
+            # (This includes cards considered as new because they don't have an interval yet)
+            card_interval: int = RescheduleDeck.get_interval(card)
+            card_due_day: int = self.get_due_day(card)
+            card_queue: int = RescheduleDeck.get_queue(card)
+
+            self.check_consistency_of_card(card)
+
+            # Note: There seems to be cards still in learning status but which are neither type 1 nor 3
+            # if self.is_suspended(card) or self.is_new(card) or self.is_learning_for_first_time(card) or self.is_relearning(card):
+            if not self.is_really_review(card):
+                continue
+
+            if card_interval not in set_of_intervals:
+                continue
+
+            # Counting different type of overdue cards
+            if self.is_review(card) and card_due_day <= 0:
+                self.number_of_cards_overdue_only_for_reviews_queue_2 += 1
+
+            if self.is_user_buried(card):
+                self.number_of_cards_overdue_only_for_buried_queue_minus_3 += 1
+
+            if card_queue == 1:
+                self.number_of_cards_overdue_only_for_learning_queue_1 += 1
+
+            if card_queue == 3 and card_due_day <= 0:
+                self.number_of_cards_overdue_only_for_learning_queue_3 += 1
+
+            if not self.is_reschedule_past_overdue_cards:
+                if self.is_card_overdue(card):
+                    continue
+
+            yield card
+
+    # Make assertions on the state of the card for the algorithm to be able to work
+    # = (checking Anki's consistency first)
+    # Note : the state of cards in Anki seems to be a bit inconsistent (card with type "review" but queue "learn" for example)
+    def check_consistency_of_card(self, card: CardRecord) -> None:
+        card_due_day: int = self.get_due_day(card)
+        card_queue: int = RescheduleDeck.get_queue(card)
+        card_type: int = RescheduleDeck.get_type(card)
+        try:
+            if card_queue == -3:
+                assert card_due_day > self.max_due or card_due_day <= 0
+                pass
+            if card_queue == -2:
+                showInfo("Card with queue = -2 : scheduler buried")
+                assert False
+                # assert card_due_day > 0
+                # assert card_due_day <= card_interval
+            if card_queue == 0:
+                assert card_type == 0
+            if card_queue == 1:
+                assert card_type in (1, 3)
+                # bug with following commented assertion ???
+                # assert card_type == 1 and card_due_day > self.max_due
+            if card_queue == 2:
+                assert card_type == 2
+                assert card_due_day >= -self.day_of_today
+                assert card_due_day < self.max_due
+            if card_queue == 3:
+                assert card_type in (1, 3)
+                assert card_due_day < self.max_due
+            if card_queue == 4:
+                # ??
+                pass
+        except AssertionError as error:
+            showInfo(f"Unexpected {error=}")
+            self.show_card_and_note_info(card)
+            raise
+
+    def get_cards_by_interval(self) -> Dict[Interval, List[CardRecord]]:
+        cards_by_interval: Dict[Interval, List[CardRecord]] = self.init_dict_of_cards(self.sequence_of_intervals)
+        band_by_interval: Dict[int, Interval] = {interval: get_band_of_interval(interval)
+                                                 for interval in self.intervals_in_range}
+        for card in self.cards:
+            card_interval = RescheduleDeck.get_interval(card)
+            try:
+                cards_by_interval[band_by_interval[card_interval]].append(card)
+            except KeyError:
+                text = f"Trying to add a card with the wrong interval = {card_interval}"
+                text += f" into the desired sequence of intervals = {self.sequence_of_intervals}"
+                text += f"\n => Problem in the excluding of relevant cards at initialization"
+                showInfo(text)
+                self.show_card_and_note_info(card)
+                raise
+        return cards_by_interval
+
+    # TODO: if possible, split this method in two, one for updating and saving original_due_day, another for the sort
+    def get_cards_by_due_day_and_original_due_day(self) -> (Dict[Interval, Dict[Due_Day, DueDayBucket]],
+                                                            Dict[CardId, Due_Day]):
+        cards_all_sorted: Dict[Interval, Dict[Due_Day, DueDayBucket]] = self.init_dict_of_dict_of_buckets(
+            self.sequence_of_intervals)
+        due_day_original: Dict[CardId, Due_Day] = dict()
+        number_of_cards_over_scheduled: Nb_of_Cards = Nb_of_Cards(0)
+        for interval in self.sequence_of_intervals:
+            for card in self.cards_by_interval[interval]:
+
+                # If we don't define due_day before the try-except, the IDE whines
+                due_day: Due_Day = Due_Day(0)
+                try:
+                    due_day: Due_Day = self.get_due_day(card)
+
+                    # If card is past overdue, we set its original due_day to today and reschedule it to tomorrow
+                    if self.is_card_overdue(card):
+                        due_day_original[card.id] = Due_Day(0)
+                        cards_all_sorted[interval][Due_Day(1)].add(card, Due_Day(0))
+
+                    # If card is over-scheduled, we set its original due_day to "interval" and reschedule it to "interval" days
+                    elif due_day > RescheduleDeck.get_interval(card):
+                        due_day_original[card.id] = Due_Day(RescheduleDeck.get_interval(card) + 1)
+                        cards_all_sorted[interval][Due_Day(interval)].add(card, due_day_original[card.id])
+                        # TODO: save those cards somewhere and show them
+                        number_of_cards_over_scheduled += 1
+
+                    # The cards of a band due after the band start on its last due day (see get_band_of_interval)
+                    else:
+                        due_day_original[card.id] = due_day
+                        cards_all_sorted[interval][Due_Day(min(due_day, interval))].add(card, due_day)
+
+                except KeyError:
+                    showInfo(f"interval = {interval}, due_day = {due_day}, today = {self.day_of_today}")
+                    self.show_card_and_note_info(card)
+                    self.cards.remove(card)
+                    raise
+
+        return (cards_all_sorted, due_day_original)
+
+    # --- "Algorithm" Functions of ReorderDeck Class --- #
+
+    def get_average_number_by_due_day(self) -> Dict[Interval, Average]:
+        average_by_interval: Dict[Interval, Average] = dict()
+        for interval in self.sequence_of_intervals:
+            total_cards: Nb_of_Cards = Nb_of_Cards(sum(self.number_of_cards_original[interval]))
+            average_by_interval[interval] = RescheduleDeck.get_average_from_total(total_cards, interval)
+        return average_by_interval
+
+    @staticmethod
+    def get_average_from_total(total_cards: Nb_of_Cards, interval: Interval) -> Average:
+        if total_cards % interval == 0:
+            return Average(total_cards // interval)
+        else:
+            return Average(round(total_cards / interval, 2))
+
+    @staticmethod
+    def is_average_between_0_excluded_and_point_5_excluded(average_: Average) -> bool:
+        return not RescheduleDeck.is_integer(average_) and RescheduleDeck.is_between_0_included_and_point_5_excluded(
+            average_)
+
+    @staticmethod
+    def is_integer(average_: Average) -> bool:
+        return isinstance(average_, int)
+
+    @staticmethod
+    def is_between_0_included_and_point_5_excluded(average_: Average) -> bool:
+        return int(average_) == round(average_)
+
+    @staticmethod
+    def is_between_point5_included_and_one_excluded(average_: Average) -> bool:
+        return int(average_) != round(average_)
+
+    # TODO: redo comment
+    def get_difference_between_current_and_average_due_day(self) -> Dict[Interval, Dict[Due_Day, Difference]]:
+        differences_all: Dict[Interval, Dict[Due_Day, Difference]] = dict()
+        for interval in self.sequence_of_intervals:
+            differences_all[interval]: Dict[Due_Day, Difference] = dict()
+            cards_by_due_day: Dict[Due_Day, DueDayBucket] = self.cards_target[interval]
+            average: Average = self.average_number_of_cards_by_interval[interval]
+
+            for due_day in range1(1, interval):  # type: Due_Day
+                difference = len(cards_by_due_day[due_day]) - average
+                differences_all[interval][due_day] = Difference(difference)
+
+        return differences_all
+
+    # Number of cards of each due day, at the index of the due day (index 0 = no card, as due days start at 1)
+    def get_number_of_cards_by_due_day(self, cards: Dict[Interval, Dict[Due_Day, DueDayBucket]]) \
+            -> Dict[Interval, List[Nb_of_Cards]]:
+        number_of_cards_by_interval: Dict[Interval, List[Nb_of_Cards]] = dict()
+        for interval in self.sequence_of_intervals:
+            cards_by_due_day: Dict[Due_Day, DueDayBucket] = cards[interval]
+            number_of_cards_by_interval[interval] = [Nb_of_Cards(0)] + [Nb_of_Cards(len(cards_by_due_day[due_day]))
+                                                                        for due_day in range1(1, interval)]
+        return number_of_cards_by_interval
+
+    def get_count_tree_by_interval(self) -> Dict[Interval, DueDayCountTree]:
+        count_tree_by_interval: Dict[Interval, DueDayCountTree] = dict()
+        for interval in self.sequence_of_intervals:
+            cards_by_due_day: Dict[Due_Day, DueDayBucket] = self.cards_target[interval]
+            numbers_of_cards = [len(cards_by_due_day[due_day]) for due_day in range1(1, interval)]
+            count_tree_by_interval[interval] = DueDayCountTree(numbers_of_cards)
+        return count_tree_by_interval
+
+    # Before the algorithm, only the overdue cards (put on due day 1) and the over-scheduled ones (put on the last due
+    # day) are not on their original due day
+    def get_due_day_target_of_cards_not_on_original_due_day(self) -> Dict[CardId, Due_Day]:
+        due_day_target_by_moved_card: Dict[CardId, Due_Day] = dict()
+        for interval in self.sequence_of_intervals:
+            for due_day in {Due_Day(1), Due_Day(interval)}:
+                for card in self.cards_target[interval][due_day]:
+                    if self.due_day_original_by_card[card.id] != due_day:
+                        due_day_target_by_moved_card[card.id] = due_day
+        return due_day_target_by_moved_card
+
+    # Must be called each time a card gets a new due day in "cards_target"
+    def set_due_day_target_of_card(self, card_id: CardId, due_day: Due_Day) -> None:
+        if self.due_day_original_by_card[card_id] == due_day:
+            self.due_day_target_by_moved_card.pop(card_id, None)
+        else:
+            self.due_day_target_by_moved_card[card_id] = due_day
+
+    # Only recalculates the difference (and the count tree) of a single due day of a single interval
+    def update_difference_to_average_target(self, interval: Interval, due_day: Due_Day) -> None:
+        self.set_number_of_cards_target(interval, due_day, Nb_of_Cards(len(self.cards_target[interval][due_day])))
+
+    def set_number_of_cards_target(self, interval: Interval, due_day: Due_Day, number_of_cards: Nb_of_Cards) -> None:
+        average: Average = self.average_number_of_cards_by_interval[interval]
+        self.number_of_cards_target[interval][due_day] = number_of_cards
+        self.difference_to_average_target[interval][due_day] = Difference(number_of_cards - average)
+        self.count_tree_target[interval].update(due_day, number_of_cards)
+
+    # Stable sort : the cards with the same original due day stay in their order in "cards_target"
+    def get_cards_sorted_by_original_due_day(self, interval: Interval) -> List[CardRecord]:
+        cards_of_interval: List[CardRecord] = [card for due_day in range1(1, interval)
+                                               for card in self.cards_target[interval][due_day]]
+        cards_of_interval.sort(key=lambda card: self.due_day_original_by_card[card.id])
+        return cards_of_interval
+
+    # Second phase of the two-phase balancing (and last step of algorithms 3 and 5) : with the cards sorted by original
+    # due day, the n-th card gets the n-th place, which minimizes the amount of rescheduling
+    # "number_of_cards_by_due_day" = number of cards to reach, at the index of the due day
+    # "cards_of_interval" = the cards already sorted by the caller, if any
+    def assign_cards_sorted_by_original_due_day(self, interval: Interval,
+                                                number_of_cards_by_due_day: Union[Sequence[Nb_of_Cards],
+                                                                                  Dict[Due_Day, Nb_of_Cards]],
+                                                cards_of_interval: Optional[List[CardRecord]] = None) \
+            -> Dict[Due_Day, DueDayBucket]:
+        if cards_of_interval is None:
+            cards_of_interval = self.get_cards_sorted_by_original_due_day(interval)
+        new_cards_by_due_day: Dict[Due_Day, DueDayBucket] = self.init_dict_of_buckets(range1(1, interval))
+        index_of_first_card = 0
+        for due_day in range1(1, interval):  # type: Due_Day
+            index_of_next_card = index_of_first_card + number_of_cards_by_due_day[due_day]
+            for card in cards_of_interval[index_of_first_card:index_of_next_card]:
+                new_cards_by_due_day[due_day].add(card, self.due_day_original_by_card[card.id])
+                self.set_due_day_target_of_card(card.id, due_day)
+            index_of_first_card = index_of_next_card
+        return new_cards_by_due_day
+
+    # Last step of the algorithms balancing each interval in a single pass (3, 4 and 5) : counted as one iteration
+    def set_cards_target_of_interval_balanced_in_one_pass(self, interval: Interval,
+                                                          new_cards_by_due_day: Dict[Due_Day, DueDayBucket]) -> None:
+        self.cards_target[interval] = new_cards_by_due_day
+        for due_day in range1(1, interval):  # type: Due_Day
+            self.update_difference_to_average_target(interval, due_day)
+        self.number_of_iterations_of_main_algorithm[interval] = 1
+
+    # TODO: Make the 2nd Algorithm work
+    # Core function of the Algorithm number 2 (by sides) for rescheduling cards
+    def reschedule_cards_algorithm_2_by_left_to_right(self, intervals_to_balance: Sequence[Interval]) \
+            -> Iterator[Interval]:
+        for interval in intervals_to_balance:
+            difference_of_cards_by_due_day: Dict[Due_Day, Difference] = self.difference_to_average_target[
+                interval]
+            average: Average = self.average_number_of_cards_by_interval[interval]
+            is_average_floor = round(average) == int(average)
+            # If is_average_floor true, then break condition is difference = 0 or 1
+            # Else break condition is difference = -1 or 0
+            for due_day in range1(1, interval - 1):  # type: Due_Day
+                difference = difference_of_cards_by_due_day[due_day][1]
+
+                # We fine-tune "difference" so that we don't move cards with a difference closer to average than 1
+                if (difference > 0 and is_average_floor):
+                    difference -= 1
+                if (difference < 0 and not is_average_floor):
+                    difference += 1
+
+                if (difference > 0):
+                    # In this case, we only need to move cards from the current to the next due_day
+                    self.move_cards_from_original_to_target_day(interval, amount=difference,
+                                                                original_day=due_day,
+                                                                target_day=Due_Day(due_day + 1))
+                elif difference < 0:
+                    # In this case, we need to move cards from the superior due_days to the current due_day until enough have been moved
+                    difference = abs(difference)
+                    number_of_moved_cards = 0
+                    next_due_day = Due_Day(due_day + 1)
+                    while next_due_day < interval:
+                        next_difference = abs(difference_of_cards_by_due_day[due_day][1])
+                        next_number_of_moved_cards = number_of_moved_cards + next_difference
+                        if (next_number_of_moved_cards >= difference):
+                            number_of_cards_to_move = difference - number_of_moved_cards
+                            self.move_cards_from_original_to_target_day(interval,
+                                                                        amount=number_of_cards_to_move,
+                                                                        original_day=next_due_day,
+                                                                        target_day=due_day)
+                            break
+                        else:
+                            self.move_cards_from_original_to_target_day(interval, amount=next_difference,
+                                                                        original_day=next_due_day,
+                                                                        target_day=due_day)
+                            number_of_moved_cards = next_number_of_moved_cards
+                            next_due_day += 1
+                    if (next_due_day == interval):
+                        text = f"Error, we can't find enough cards in the following due_days to move to "
+                        text += f" the current due day {due_day} in interval {interval}"
+                        showInfo(text)
+                        self.show_both_original_and_target_cards_by_interval_by_due_day()
+                        raise
+            yield interval
+
+    # Core function of the Algorithm number 1 (by highest difference) for rescheduling cards
+    def reschedule_cards_algorithm_1_by_highest_difference(self, intervals_to_balance: Sequence[Interval]) \
+            -> Iterator[Interval]:
+
+        # --- Internal Methods of the Core Algorithm --- #
+
+        # Static
+        def get_max_iterations_from_interval_value(interval_: Interval):
+            max_iterations = interval_ * interval_ * interval_
+            max_iterations *= MULTIPLIER_FOR_MAX_NB_OF_ITERATION
+            max_iterations = round(max_iterations)
+            return max_iterations
+
+        def find_highest_positive_difference() -> (Due_Day, Difference):
+            return find_highest_positive_diff_closest_to_given_due_day(positive=True)
+
+        def find_highest_negative_difference() -> (Due_Day, Difference):
+            return find_highest_positive_diff_closest_to_given_due_day(positive=False)
+
+        # Needs to use "count_tree_target" which is modified at each iteration of the main algorithm
+        def find_highest_positive_diff_closest_to_given_due_day(positive: bool,
+                                                                minimum_due_day: Due_Day = 0) -> (Due_Day, Difference):
+            max_due_day_: Due_Day = self.count_tree_target[interval].find_extremum_closest_to_given_due_day(
+                highest=positive, given_due_day=minimum_due_day)
+            highest_difference: Difference = self.difference_to_average_target[interval][max_due_day_]
+            try:
+                assert max_due_day_ != minimum_due_day
+                return (max_due_day_, highest_difference)
+            except AssertionError:
+                text = f"Error in find_highest_positive_diff_closest_to_given_due_day"
+                text += f", found minimum_due_day = {minimum_due_day} and max_due_day_ = {max_due_day_}"
+                text += f" in interval {interval}"
+                showInfo(text)
+                self.show_both_original_and_target_difference()
+                raise
+
+        # Determine if moving from max_due_day to minimum_due_day is moving towards increasing due_days
+        def is_to_move_towards_increasing_due_day(max_due_day_, min_due_day_) -> bool:
+            assert max_due_day_ != min_due_day_
+            if max_due_day_ < min_due_day_:
+                return True
+            else:
+                return False
+
+        # First phase of the two-phase balancing : only the numbers of cards are moved (see USE_TWO_PHASE_BALANCING)
+        def move_cards_from_original_to_target_day(interval_: Interval, amount: Nb_of_Cards,
+                                                   original_day: Due_Day, target_day: Due_Day) -> None:
+            if self.balancing_modes.use_two_phase_balancing:
+                self.move_number_of_cards_from_original_to_target_day(interval_, amount, original_day, target_day)
+            else:
+                self.move_cards_from_original_to_target_day(interval_, amount, original_day, target_day)
+
+        # If only one card needs to be moved, we need to move it towards the highest negative difference
+        # First we need to find one of the highest negative difference (without rounding),
+        # then find the highest positive difference (without rounding) closest to it,
+        # then move the highest positive difference towards highest the negative one.
+        def move_one_card_from_highest_closest_positive_diff_towards_highest_negative_diff(min_due_day_: Due_Day):
+            new_max_due_day: Due_Day = find_highest_positive_diff_closest_to_given_due_day(
+                positive=True, minimum_due_day=min_due_day_)[0]
+            assert min_due_day_ != new_max_due_day
+
+            if is_to_move_towards_increasing_due_day(new_max_due_day, min_due_day_):
+                move_cards_from_original_to_target_day(interval, Nb_of_Cards(1),
+                                                       original_day=new_max_due_day,
+                                                       target_day=Due_Day(new_max_due_day + 1))
+            else:
+                move_cards_from_original_to_target_day(interval, Nb_of_Cards(1),
+                                                       original_day=new_max_due_day,
+                                                       target_day=Due_Day(new_max_due_day - 1))
+
+        # TODO: add comment
+        def move_several_cards_from_highest_diff_towards_neighbors(amount: Nb_of_Cards, original_due_day: Due_Day):
+
+            assert original_due_day >= 1
+            assert original_due_day <= interval
+            assert amount > 0
+
+            if amount == 1:
+                showInfo(f"Trying to move only 1 card : we shouldn't use the current method + {__name__}")
+                self.show_both_original_and_target_difference()
+                exit(1)
+
+            if original_due_day == 1:
+                move_cards_from_original_to_target_day(interval, amount,
+                                                       original_day=Due_Day(1), target_day=Due_Day(2))
+            elif original_due_day == interval:
+                move_cards_from_original_to_target_day(interval, amount,
+                                                       original_day=Due_Day(interval),
+                                                       target_day=Due_Day(interval - 1))
+            else:
+                absolute_half_of_amount = Nb_of_Cards(int(amount / 2))
+                move_cards_from_original_to_target_day(interval, absolute_half_of_amount,
+                                                       original_day=original_due_day,
+                                                       target_day=Due_Day(original_due_day - 1))
+                move_cards_from_original_to_target_day(interval, absolute_half_of_amount,
+                                                       original_day=original_due_day,
+                                                       target_day=Due_Day(original_due_day + 1))
+
+        def show_error_message_for_too_many_iterations_in_main_algorithm_and_exits():
+            text = "Problem in main algorithm : limit of expected maximum iterations broken through"
+            for interval_2 in self.sequence_of_intervals:
+                text += f"\n Number of iterations for interval {interval_2} : "
+                text += f"{self.number_of_iterations_of_main_algorithm.get(interval_2, 0)}"
+            showInfo(text)
+            self.show_both_original_and_target_difference()
+            exit(1)
+
+        # --- Core Algorithm --- #
+        # For each interval, reschedule cards so that there is the same number of cards on each possible due_date
+        # Works by some sort of dichotomy when moving several cards, or use specific logic when moving a single card
+        # TODO: check that no method called by this core algorithm loops over all the intervals !!!
+        def choose_and_move_cards_for_given_interval() -> int:
+            iteration = 0
+            while iteration < max_iteration_for_current_interval:
+                # Debug Feature
+                if SHOW_EVERY_ITERATION:
+                    showInfo(self.print_difference_target())
+                # Retrieve max positive and negative differences
+                (max_due_day, max_difference) = find_highest_positive_difference()
+                (min_due_day, min_difference) = find_highest_negative_difference()
+                # Determine if we need to stop the main algorithm (= rescheduling finished)
+                if max_difference < 1 and min_difference > -1:
+                    break
+                # Determine if we move only 1 card or more
+                if max_difference < 2:
+                    move_one_card_from_highest_closest_positive_diff_towards_highest_negative_diff(min_due_day)
+                else:
+                    move_several_cards_from_highest_diff_towards_neighbors(Nb_of_Cards(int(max_difference)),
+                                                                           original_due_day=max_due_day)
+                # Note: the differences of the modified due days are already updated by the move of the cards
+                iteration += 1
+            return iteration
+
+        # --- Actual Beginning of the Core Algorithm --- #
+
+        # TODO: Find a better way to initialize "self.number_of_iterations_of_main_algorithm"
+        # Initialization of nb_of_iterations
+        for interval in intervals_to_balance:
+            self.number_of_iterations_of_main_algorithm[interval] = 0
+
+        for interval in intervals_to_balance:
+            max_iteration_for_current_interval = get_max_iterations_from_interval_value(interval)
+            # Call to the Core Algorithm
+            nb_of_iterations = choose_and_move_cards_for_given_interval()
+            self.number_of_iterations_of_main_algorithm[interval] = nb_of_iterations
+            if nb_of_iterations == max_iteration_for_current_interval:
+                show_error_message_for_too_many_iterations_in_main_algorithm_and_exits()
+            # Second phase of the two-phase balancing : the cards are assigned once to the final numbers of cards
+            if self.balancing_modes.use_two_phase_balancing:
+                self.cards_target[interval] = self.assign_cards_sorted_by_original_due_day(
+                    interval, self.number_of_cards_target[interval])
+            yield interval
+
+    # Core function of the Algorithm number 3 (by exact quotas) for rescheduling cards
+    # For each interval, computes in one pass the final number of cards of each due day (floor or ceil of the average),
+    # then gives those due days to the cards sorted by original due day, which minimizes the amount of rescheduling
+    # No iteration (and thus no limit of iterations) : O(n log n) because of the sort
+    def reschedule_cards_algorithm_3_by_exact_quotas(self, intervals_to_balance: Sequence[Interval]) \
+            -> Iterator[Interval]:
+
+        # --- Internal Methods of the Core Algorithm --- #
+
+        # Each due day gets the floor of the average, and the remaining cards (total % interval) are given (at most one
+        # by due day) so that the total rescheduling is minimal. With "given(d)" the number of remaining cards given up to
+        # due day d, the total rescheduling is the sum over d of |number of cards originally due up to d - floor * d
+        # - given(d)|, which is minimized exactly by the "slope trick" (convex function stored by its breakpoints in
+        # two heaps) then backtracking from given(interval) = number of remaining cards, in O(interval log interval)
+        def get_number_of_cards_to_reach_by_due_day() -> Dict[Due_Day, Nb_of_Cards]:
+            number_of_cards_by_original_due_day: List[int] = [0] * (interval + 2)
+            for due_day in range1(1, interval):  # type: Due_Day
+                for card in self.cards_target[interval][due_day]:
+                    # The cards of a band may come from after "interval + 1" : they all want the last due day
+                    number_of_cards_by_original_due_day[min(self.due_day_original_by_card[card.id], interval + 1)] += 1
+            floor_average, number_of_remaining_cards = divmod(sum(number_of_cards_by_original_due_day), interval)
+
+            # given(0) = 0 is enforced by breakpoints with a slope higher than the sum of all the other slopes
+            left_breakpoints: List[int] = [0] * (interval + 1)  # max-heap (stored as negative values)
+            right_breakpoints: List[int] = [0] * (interval + 1)  # min-heap (with a lazy shift)
+            right_shift = 0
+            best_given_by_due_day: Dict[Due_Day, int] = dict()
+            cumulative_number_of_cards = number_of_cards_by_original_due_day[0]
+            for due_day in range1(1, interval - 1):  # type: Due_Day
+                # given(d) = given(d - 1) or given(d - 1) + 1 : the right part of the function is shifted by one
+                right_shift += 1
+                # Adds |cumulative_number_of_cards - floor * d - given(d)|
+                cumulative_number_of_cards += number_of_cards_by_original_due_day[due_day]
+                ideal_given = cumulative_number_of_cards - floor_average * due_day
+                heapq.heappush(left_breakpoints, -ideal_given)
+                heapq.heappush(right_breakpoints, -heapq.heappop(left_breakpoints) - right_shift)
+                heapq.heappush(right_breakpoints, ideal_given - right_shift)
+                heapq.heappush(left_breakpoints, -(heapq.heappop(right_breakpoints) + right_shift))
+                best_given_by_due_day[due_day] = -left_breakpoints[0]
+
+            # Backtracking : given(d - 1) is the allowed value (given(d) - 1 or given(d)) closest to the best one
+            number_of_cards_by_due_day: Dict[Due_Day, Nb_of_Cards] = dict()
+            given_up_to_due_day = number_of_remaining_cards
+            for due_day in range(interval, 0, -1):  # type: Due_Day
+                if due_day == 1:
+                    given_up_to_previous_due_day = 0
+                else:
+                    given_up_to_previous_due_day = min(max(best_given_by_due_day[Due_Day(due_day - 1)],
+                                                           given_up_to_due_day - 1), given_up_to_due_day)
+                number_of_cards_by_due_day[due_day] = Nb_of_Cards(
+                    floor_average + given_up_to_due_day - given_up_to_previous_due_day)
+                given_up_to_due_day = given_up_to_previous_due_day
+            return number_of_cards_by_due_day
+
+        # --- Actual Beginning of the Core Algorithm --- #
+
+        for interval in intervals_to_balance:
+            new_cards_by_due_day = self.assign_cards_sorted_by_original_due_day(
+                interval, get_number_of_cards_to_reach_by_due_day())
+            self.set_cards_target_of_interval_balanced_in_one_pass(interval, new_cards_by_due_day)
+            yield interval
+
+    # Core function of the Algorithm number 4 (by global daily load) for rescheduling cards
+    # Balances the total number of cards due each day, all intervals summed, while each card stays between 1 and its
+    # interval : the cards of intervals <= k must all be due in the first k days, so the number of cards of each day is
+    # given by the smallest concave function above the points (k, number of cards of intervals <= k). Its slopes (the
+    # numbers of cards by day) are as even as possible : both the highest daily load and its variance are minimal
+    # Then the cards are placed by increasing interval on the free due day closest to their original due day, which is
+    # always possible (the first k days have enough places for the cards of intervals <= k). O(n log n + max interval)
+    def reschedule_cards_algorithm_4_by_global_daily_load(self) -> Iterator[Interval]:
+
+        # --- Internal Methods of the Core Algorithm --- #
+
+        # Upper concave hull of the points (k, cumulative_numbers_of_cards[k]), then integer values rounded up on it
+        def get_number_of_cards_to_reach_by_due_day(cumulative_numbers_of_cards: List[int]) -> List[int]:
+            hull: List[int] = [0]
+            for due_day in range(1, len(cumulative_numbers_of_cards)):
+                while len(hull) >= 2:
+                    first, middle = hull[-2], hull[-1]
+                    # "middle" is under the segment from "first" to "due_day" : not on the hull
+                    if (cumulative_numbers_of_cards[middle] - cumulative_numbers_of_cards[first]) * (due_day - first) \
+                            <= (cumulative_numbers_of_cards[due_day] - cumulative_numbers_of_cards[first]) \
+                            * (middle - first):
+                        hull.pop()
+                    else:
+                        break
+                hull.append(due_day)
+            number_of_cards_by_due_day: List[int] = [0] * len(cumulative_numbers_of_cards)
+            for start, end in zip(hull, hull[1:]):
+                start_number = cumulative_numbers_of_cards[start]
+                increase = cumulative_numbers_of_cards[end] - start_number
+                previous_number = start_number
+                for due_day in range1(start + 1, end):
+                    number = start_number - (-increase * (due_day - start) // (end - start))
+                    number_of_cards_by_due_day[due_day] = number - previous_number
+                    previous_number = number
+            return number_of_cards_by_due_day
+
+        # --- Actual Beginning of the Core Algorithm --- #
+
+        max_interval = RescheduleDeck.get_maximum_interval(self.sequence_of_intervals)
+        cumulative_numbers_of_cards: List[int] = [0] * (max_interval + 1)
+        for interval in self.sequence_of_intervals:
+            cumulative_numbers_of_cards[interval] = len(self.cards_by_interval[interval])
+        for due_day in range1(1, max_interval):
+            cumulative_numbers_of_cards[due_day] += cumulative_numbers_of_cards[due_day - 1]
+        free_day_finder = FreeDayFinder(get_number_of_cards_to_reach_by_due_day(cumulative_numbers_of_cards))
+
+        for interval in sorted(self.intervals_to_balance):
+            new_cards_by_due_day: Dict[Due_Day, DueDayBucket] = self.init_dict_of_buckets(range1(1, interval))
+            for card in self.get_cards_sorted_by_original_due_day(interval):
+                original_due_day = self.due_day_original_by_card[card.id]
+                new_due_day = Due_Day(free_day_finder.find_free_due_day_closest_to(original_due_day, interval))
+                free_day_finder.take_place(new_due_day)
+                new_cards_by_due_day[new_due_day].add(card, original_due_day)
+                self.set_due_day_target_of_card(card.id, new_due_day)
+            self.set_cards_target_of_interval_balanced_in_one_pass(interval, new_cards_by_due_day)
+            yield interval
+
+    # Core function of the Algorithm number 5 (by estimated review time) for rescheduling cards
+    # For each interval, the cards sorted by original due day are laid end to end by their estimated review time, then
+    # this total time is cut into "interval" due days of equal time : each card goes to the due day containing the
+    # middle of its own time. So the review time of each due day is the average within about one card, and the cards
+    # keep their order (small amount of rescheduling). Single pass : O(n log n) because of the sort
+    def reschedule_cards_algorithm_5_by_estimated_review_time(self, intervals_to_balance: Sequence[Interval]) \
+            -> Iterator[Interval]:
+        for interval in intervals_to_balance:
+            cards_of_interval: List[CardRecord] = self.get_cards_sorted_by_original_due_day(interval)
+            review_times: List[float] = [self.get_estimated_review_time(card) for card in cards_of_interval]
+            average_review_time_by_due_day = sum(review_times) / interval
+            # The due days only increase along the sorted cards : the number of cards of each due day is enough
+            number_of_cards_by_due_day: List[Nb_of_Cards] = [Nb_of_Cards(0)] * (interval + 1)
+            review_time_before_card = 0.0
+            for review_time in review_times:
+                middle_of_card = review_time_before_card + review_time / 2
+                number_of_cards_by_due_day[min(int(middle_of_card / average_review_time_by_due_day) + 1, interval)] += 1
+                review_time_before_card += review_time
+            new_cards_by_due_day = self.assign_cards_sorted_by_original_due_day(
+                interval, number_of_cards_by_due_day, cards_of_interval)
+            self.set_cards_target_of_interval_balanced_in_one_pass(interval, new_cards_by_due_day)
+            yield interval
+
+    # Each interval is balanced independently (with the same algorithm as the serial run) by a pool of workers, which
+    # only receive plain arrays of card ids and due days, then their results are merged into "cards_target"
+    def reschedule_cards_in_parallel_by_interval(self) -> Iterator[Interval]:
+        work_units: List[IntervalWorkUnit] = [
+            new_work_unit_of_interval(interval, self.cards_by_interval[interval], self.day_of_today,
+                                      self.is_reschedule_past_overdue_cards, self.balancing_modes)
+            for interval in self.intervals_to_balance]
+        # The biggest work units are started first, so that the workers finish at about the same time
+        work_units.sort(key=lambda work_unit: len(work_unit.card_ids), reverse=True)
+        with new_executor_for_parallel_balancing(self.balancing_modes.parallel_balancing_mode) as executor:
+            for result in executor.map(balance_work_unit_of_interval, work_units):
+                self.apply_result_of_interval(result)
+                self.instrumentation.count_moves_of_worker(result.number_of_moves, result.number_of_move_calls)
+                yield result.interval
+
+    # Rebuilds "cards_target" (and the differences) of a single interval from the final due days of its cards
+    def apply_result_of_interval(self, result: IntervalResult) -> None:
+        interval: Interval = result.interval
+        cards_by_id: Dict[CardId, CardRecord] = {card.id: card for card in self.cards_by_interval[interval]}
+        self.cards_target[interval] = self.init_dict_of_buckets(range1(1, interval))
+        for card_id, due_day in zip(result.card_ids, result.due_days):
+            card: CardRecord = cards_by_id[card_id]
+            self.cards_target[interval][due_day].add(card, self.due_day_original_by_card[card.id])
+            self.set_due_day_target_of_card(card.id, due_day)
+        for due_day in range1(1, interval):  # type: Due_Day
+            self.update_difference_to_average_target(interval, due_day)
+        self.number_of_iterations_of_main_algorithm[interval] = result.number_of_iterations
+
+    # Final due day of every card of a single interval (once balanced), in a form which can be applied again later
+    def get_result_of_interval(self, interval: Interval) -> IntervalResult:
+        card_ids: "array[int]" = array("q")
+        due_days: "array[int]" = array("q")
+        for due_day in range1(1, interval):  # type: Due_Day
+            for card in self.cards_target[interval][due_day]:
+                card_ids.append(card.id)
+                due_days.append(due_day)
+        # (no step for an interval whose result was reused)
+        step: Optional[PhaseMeasure] = self.instrumentation.steps_of_main_algorithm.get(interval)
+        return IntervalResult(interval, self.number_of_iterations_of_main_algorithm[interval], card_ids, due_days,
+                              step.number_of_moves if step is not None else 0,
+                              step.number_of_move_calls if step is not None else 0)
+
+    # Reuses the results of intervals balanced by a previous run on the same cards with the same parameters : as each
+    # interval is balanced independently, those intervals are not balanced again by the algorithm
+    # Note: with the global daily load, the result of an interval depends on the others : nothing can be reused
+    # Note: a band only partly in the range of intervals may have other cards than in the previous run (even as many) :
+    # its result is only reused for the very same cards
+    def reuse_results_of_intervals(self, results: Sequence[IntervalResult]) -> None:
+        if self.balancing_modes.use_algorithm_4_by_global_daily_load:
+            return
+        for result in results:
+            if result.interval in self.intervals_to_balance \
+                    and set(result.card_ids) == {card.id for card in self.cards_by_interval[result.interval]}:
+                self.apply_result_of_interval(result)
+                self.intervals_to_balance.remove(result.interval)
+
+    # Move Card Algorithm which selects and moves cards from original to target day while minimizing the amount of rescheduling
+    def move_cards_from_original_to_target_day(self, interval: Interval, amount: Nb_of_Cards,
+                                               original_day: Due_Day, target_day: Due_Day):
+
+        # --- Internal Methods of the Move Card Algorithm --- #
+
+        def show_error_message_of_move_algorithm_and_exits() -> None:
+            text = "Error, not enough cards to move in move_cards : "
+            text += f"\n interval: {interval}, amount: {amount}"
+            text += f", original_day: {original_day}, target_day: {target_day}"
+            showInfo(text)
+            self.show_both_original_and_target_difference()
+            exit(1)
+
+        # --- Actual Beginning of the Move Card Algorithm --- #
+
+        cards_for_original_day: DueDayBucket = self.cards_target[interval][original_day]
+        cards_for_target_day: DueDayBucket = self.cards_target[interval][target_day]
+
+        # We want to reschedule cards so that the difference between their original_due_day and their target_due_day
+        # is minimized, so that we limit at the maximum the dispersion of cards due to rescheduling
+        cards_to_move: List[CardRecord] = cards_for_original_day.pop_cards_closest_to_target_day(target_day, amount)
+        for card in cards_to_move:
+            cards_for_target_day.add(card, self.due_day_original_by_card[card.id])
+            self.set_due_day_target_of_card(card.id, target_day)
+        self.instrumentation.count_move(len(cards_to_move))
+
+        if len(cards_to_move) != amount:
+            show_error_message_of_move_algorithm_and_exits()
+
+        # Only the two due days whose cards were moved have a new difference
+        self.update_difference_to_average_target(interval, original_day)
+        self.update_difference_to_average_target(interval, target_day)
+
+    # Same as "move_cards_from_original_to_target_day" for the first phase of the two-phase balancing : only the
+    # numbers of cards (and the differences) of both due days change, the cards stay in "cards_target"
+    def move_number_of_cards_from_original_to_target_day(self, interval: Interval, amount: Nb_of_Cards,
+                                                         original_day: Due_Day, target_day: Due_Day) -> None:
+        numbers_of_cards: List[Nb_of_Cards] = self.number_of_cards_target[interval]
+        if numbers_of_cards[original_day] < amount:
+            text = "Error, not enough cards to move in move_number_of_cards : "
+            text += f"\n interval: {interval}, amount: {amount}"
+            text += f", original_day: {original_day}, target_day: {target_day}"
+            showInfo(text)
+            self.show_both_original_and_target_difference()
+            exit(1)
+        self.set_number_of_cards_target(interval, original_day, Nb_of_Cards(numbers_of_cards[original_day] - amount))
+        self.set_number_of_cards_target(interval, target_day, Nb_of_Cards(numbers_of_cards[target_day] + amount))
+        self.instrumentation.count_move(amount)
+
+    # --- "Result" Functions of ReorderDeck Class --- #
+
+    # Determines the cards which need to be rescheduled : only the cards moved by the algorithm are looked at
+    def determine_cards_with_only_different_new_due_day(self) -> Dict[CardId, Due_Day_With_Origin]:
+        cards_with_only_different_new_due_day: Dict[CardId, Due_Day_With_Origin] = dict()
+        for card_id, due_day in self.due_day_target_by_moved_card.items():
+            cards_with_only_different_new_due_day[card_id] = Due_Day_With_Origin(due_day + self.day_of_today)
+        return cards_with_only_different_new_due_day
+
+    # Sum over the rescheduled cards of the number of days between their original and new due days
+    def get_total_displacement(self) -> int:
+        total_displacement = 0
+        for card_id, new_due in self.cards_with_only_different_new_due_day.items():
+            total_displacement += abs(new_due - self.day_of_today - self.due_day_original_by_card[card_id])
+        return total_displacement
+
+    # Total number of cards due each day, all intervals summed (= daily load of the deck in the range of intervals)
+    def get_total_number_of_cards_by_due_day(self, number_of_cards: Dict[Interval, List[Nb_of_Cards]]) \
+            -> Dict[Due_Day, Nb_of_Cards]:
+        total_number_of_cards_by_due_day: Dict[Due_Day, Nb_of_Cards] = dict()
+        for interval in self.sequence_of_intervals:
+            for due_day in range1(1, interval):  # type: Due_Day
+                total_number_of_cards_by_due_day[due_day] = Nb_of_Cards(
+                    total_number_of_cards_by_due_day.get(due_day, 0) + number_of_cards[interval][due_day])
+        return total_number_of_cards_by_due_day
+
+    # --- Print Functions of ReorderDeck Class (they all return strings) --- #
+    # TODO: refactor (and maybe comment) them a bit
+
+    @staticmethod
+    def print_vars_obj(object) -> str:
+        return f"{object.__class__} : {str(vars(object))}"
+
+    @staticmethod
+    def print_card_record(card: CardRecord) -> str:
+        return f"{card.__class__} : {str({column: getattr(card, column) for column in CardRecord.__slots__})}"
+
+    def print_cards_by_interval(self) -> str:
+        text = "Nb of Cards for each interval"
+        for interval in self.sequence_of_intervals:
+            text += f"\n Nb of Cards for interval {interval} = "
+            text += f"{str(len(self.cards_by_interval[interval]))}"
+        return text
+
+    def print_cards_by_interval_by_due_day_original(self) -> str:
+        return self.print_cards_by_interval_by_due_day(self.number_of_cards_original)
+
+    def print_cards_by_interval_by_due_day_target(self) -> str:
+        return self.print_cards_by_interval_by_due_day(self.number_of_cards_target)
+
+    def print_cards_by_interval_by_due_day(self, number_of_cards: Dict[Interval, List[Nb_of_Cards]]) -> str:
+        text = "Nb of Cards for each interval and each due day"
+        for interval in self.sequence_of_intervals:
+            text += f"\n\n Nb of Cards for each due day in interval = {interval} "
+            text += f", (average = {self.average_number_of_cards_by_interval[interval]}) :"
+            for due_day in range1(1, interval):  # type: Due_Day
+                text += f"\n Nb of Cards for interval = {interval} and due day = {due_day} : "
+                text += f"{str(number_of_cards[interval][due_day])}"
+        return text
+
+    def print_difference_original(self) -> str:
+        return self.print_difference(self.number_of_cards_original,
+                                     self.difference_to_average_original)
+
+    def print_difference_target(self) -> str:
+        return self.print_difference(self.number_of_cards_target,
+                                     self.difference_to_average_target)
+
+    def print_difference(self, number_of_cards: Dict[Interval, List[Nb_of_Cards]],
+                         differences: Dict[Interval, Dict[Due_Day, Difference]]) -> str:
+        text = "Computed difference of cards between current and average by interval and due_day"
+        for interval in self.sequence_of_intervals:
+            text += f"\n\n For interval = {interval}"
+            text += f", total_number = {len(self.cards_by_interval[interval])}"
+            text += f", average cards by day = {self.average_number_of_cards_by_interval[interval]} :"
+            # TODO: add average difference by day
+            for due_day in range1(1, interval):  # type: Due_Day
+                text += f"\n For interval '{interval}' and due_day '{due_day}'"
+                text += f", nb_of_cards = {number_of_cards[interval][due_day]}"
+                text += f", difference = {differences[interval][due_day]:2f}"
+        return text
+
+    # Single pass over the moved cards (with their relative due days), the other statistics are simple counters
+    def get_statistics(self) -> ReschedulingStatistics:
+        # A card of a band can move by up to its own interval (more than the band)
+        max_interval = RescheduleDeck.get_maximum_interval(self.intervals_in_range)
+        number_of_cards_by_absolute_difference: List[Nb_of_Cards] = [Nb_of_Cards(0)] * (max_interval + 1)
+        total_amount_of_rescheduling = 0
+        total_amount_of_push_forward = 0
+        for card_id, new_due_day in self.due_day_target_by_moved_card.items():
+            algebraic_difference = new_due_day - self.due_day_original_by_card[card_id]
+            absolute_difference = abs(algebraic_difference)
+            number_of_cards_by_absolute_difference[absolute_difference] += 1
+            total_amount_of_rescheduling += absolute_difference
+            total_amount_of_push_forward += algebraic_difference
+        # (no due day at all for an empty range of intervals)
+        highest_daily_load_original = max(
+            self.get_total_number_of_cards_by_due_day(self.number_of_cards_original).values(), default=0)
+        highest_daily_load_target = max(
+            self.get_total_number_of_cards_by_due_day(self.number_of_cards_target).values(), default=0)
+        highest_daily_review_time_original: Optional[float] = None
+        highest_daily_review_time_target: Optional[float] = None
+        if self.review_time_by_card is not None:
+            highest_daily_review_time_original, highest_daily_review_time_target = \
+                self.get_highest_daily_review_time_original_and_target()
+        return ReschedulingStatistics(
+            day_of_today=self.day_of_today,
+            number_of_cards_overdue=self.number_of_cards_overdue_only_for_reviews_queue_2,
+            number_of_cards_over_scheduled=self.number_of_cards_over_scheduled,
+            number_of_cards_in_range=Nb_of_Cards(len(self.cards)),
+            number_of_cards_to_reschedule=Nb_of_Cards(len(self.due_day_target_by_moved_card)),
+            total_amount_of_rescheduling=total_amount_of_rescheduling,
+            total_amount_of_push_forward=total_amount_of_push_forward,
+            number_of_cards_by_absolute_difference=number_of_cards_by_absolute_difference,
+            highest_daily_load_original=highest_daily_load_original,
+            highest_daily_load_target=highest_daily_load_target,
+            number_of_iterations_by_interval={interval: self.number_of_iterations_of_main_algorithm[interval]
+                                              for interval in self.sequence_of_intervals},
+            highest_daily_review_time_original=highest_daily_review_time_original,
+            highest_daily_review_time_target=highest_daily_review_time_target,
+        )
+
+    # Highest total estimated review time of a due day (all intervals summed), before and after the rescheduling
+    # Before, the cards are on their due day of the beginning (overdue on due day 1, over-scheduled on the last one)
+    def get_highest_daily_review_time_original_and_target(self) -> Tuple[float, float]:
+        max_interval = RescheduleDeck.get_maximum_interval(self.sequence_of_intervals)
+        review_time_by_due_day_original: List[float] = [0.0] * (max_interval + 1)
+        review_time_by_due_day_target: List[float] = [0.0] * (max_interval + 1)
+        for card in self.cards:
+            review_time = self.get_estimated_review_time(card)
+            due_day_original = self.due_day_original_by_card[card.id]
+            review_time_by_due_day_original[min(max(due_day_original, 1), get_band_of_interval(card.ivl))] \
+                += review_time
+            review_time_by_due_day_target[self.due_day_target_by_moved_card.get(card.id, due_day_original)] \
+                += review_time
+        return max(review_time_by_due_day_original), max(review_time_by_due_day_target)
+
+    def print_distribution_of_cards_rescheduled(self) -> str:
+        return self.get_statistics().print_statistics()
+
+    def show_both_original_and_target_cards_by_interval_by_due_day(self):
+        showInfo(self.print_cards_by_interval_by_due_day_original())
+        showInfo(self.print_cards_by_interval_by_due_day_target())
+
+    def show_both_original_and_target_difference(self):
+        showInfo(self.print_difference_original())
+        showInfo(self.print_difference_target())
+
+    # Only the columns of the card are known here (the card can be found in the browser with "cid:<id>")
+    @staticmethod
+    def show_card_and_note_info(card: CardRecord):
+        showInfo(RescheduleDeck.print_card_record(card))
+
+    @staticmethod
+    def show_deck_info(deck: DeckDict):
+        showInfo(f"Deck = {deck} ")
+
+
+# --- END of ReorderDeck Class --- #
+
+
+# --- BEGINNING of Batch Rescheduling --- #
+
+
+# Rescheduling of several decks at once : each deck is balanced independently (by a pool of workers if the parallel
+# mode is on), and only the new due days of the cards are sent back, so that they can be written at once
+
+class DeckWorkUnit(NamedTuple):
+    deck_name: str
+    deck: DeckDict
+    cards: CardColumns
+    sequence_of_intervals: Sequence[int]
+    is_reschedule_overdue_cards: bool
+    balancing_modes: BalancingModes
+
+
+class DeckResult(NamedTuple):
+    deck_name: str
+    number_of_cards_in_range: int
+    cards_with_new_due_day: Dict[CardId, Due_Day_With_Origin]
+    total_displacement: int
+
+
+def balance_work_unit_of_deck(work_unit: DeckWorkUnit) -> DeckResult:
+    reschedule_deck = RescheduleDeck(work_unit.deck, work_unit.cards, work_unit.sequence_of_intervals,
+                                     work_unit.is_reschedule_overdue_cards, balancing_modes=work_unit.balancing_modes)
+    reschedule_deck.run()
+    return DeckResult(work_unit.deck_name, len(reschedule_deck.cards),
+                      reschedule_deck.cards_with_only_different_new_due_day, reschedule_deck.get_total_displacement())
+
+
+# Yields the result of each deck once balanced (in the order of the work units)
+def balance_decks(work_units: Sequence[DeckWorkUnit]) -> Iterator[DeckResult]:
+    if PARALLEL_BALANCING_MODE is not None and len(work_units) > 1:
+        # The decks are already balanced in parallel : the intervals of each deck are not (no pool in the workers)
+        work_units = [
+            work_unit._replace(balancing_modes=work_unit.balancing_modes._replace(parallel_balancing_mode=None))
+            for work_unit in work_units]
+        with new_executor_for_parallel_balancing(PARALLEL_BALANCING_MODE) as executor:
+            yield from executor.map(balance_work_unit_of_deck, work_units)
+    else:
+        for work_unit in work_units:
+            yield balance_work_unit_of_deck(work_unit)
+
+
+def print_summary_of_batch(results: Sequence[DeckResult]) -> str:
+    text = f"Batch rescheduling of {len(results)} decks :"
+    for result in results:
+        text += f"\n {result.deck_name} : {result.number_of_cards_in_range} cards in the range"
+        text += f", {len(result.cards_with_new_due_day)} to reschedule"
+        text += f", total displacement = {result.total_displacement} days"
+    text += f"\nTotal : {sum(result.number_of_cards_in_range for result in results)} cards in the range"
+    text += f", {sum(len(result.cards_with_new_due_day) for result in results)} to reschedule"
+    text += f", total displacement = {sum(result.total_displacement for result in results)} days"
+    return text
+
+
+# --- END of Batch Rescheduling --- #
+
+
+# --- BEGINNING of Incremental Rebalancing --- #
+
+
+# Places only the cards modified since the last run (e.g. just reviewed) into the histogram of the other cards of the
+# deck, which is supposed to be balanced already : a card stays on its due day if it is one of the least loaded days of
+# its interval, else it goes to the least loaded day closest to it (so each interval stays balanced within one card)
+# "histogram_rows" = (interval, due, number of cards) of the cards which did not change, as aggregated by the database
+# The overdue cards are left as they are. O(changed cards * log(interval) + sum of the intervals with changed cards)
+def rebalance_changed_cards(histogram_rows: Sequence[Tuple[int, int, int]], changed_cards: Sequence[CardRecord],
+                            sequence_of_intervals: Sequence[int], day_of_today: Due_Day_With_Origin) \
+        -> Dict[CardId, Due_Day_With_Origin]:
+    set_of_intervals = frozenset(sequence_of_intervals)
+    number_of_cards_by_interval: Dict[Interval, List[int]] = dict()
+    for card_interval, due, number_of_cards in histogram_rows:
+        due_day = due - day_of_today
+        if card_interval in set_of_intervals and due_day > 0:
+            # Same as RescheduleDeck : the over-scheduled cards count on the last due day of the band of their interval
+            interval = get_band_of_interval(card_interval)
+            number_of_cards_by_interval.setdefault(interval, [0] * (interval + 1))[min(due_day, interval)] \
+                += number_of_cards
+
+    cards_with_new_due_day: Dict[CardId, Due_Day_With_Origin] = dict()
+    cards_to_place = sorted(((get_band_of_interval(card.ivl), card) for card in changed_cards
+                             if card.ivl in set_of_intervals and card.due - day_of_today > 0),
+                            key=lambda band_and_card: (band_and_card[0], band_and_card[1].due))
+    for interval, bands_and_cards in itertools.groupby(cards_to_place, key=lambda band_and_card: band_and_card[0]):
+        numbers_of_cards = number_of_cards_by_interval.setdefault(interval, [0] * (interval + 1))
+        count_tree = DueDayCountTree(numbers_of_cards[1:])
+        for _, card in bands_and_cards:
+            original_due_day = Due_Day(card.due - day_of_today)
+            due_day = Due_Day(min(original_due_day, interval))
+            lowest_due_day = count_tree.find_extremum_closest_to_given_due_day(highest=False, given_due_day=due_day)
+            if numbers_of_cards[due_day] > numbers_of_cards[lowest_due_day]:
+                due_day = lowest_due_day
+            numbers_of_cards[due_day] += 1
+            count_tree.update(due_day, numbers_of_cards[due_day])
+            if due_day != original_due_day:
+                cards_with_new_due_day[card.id] = Due_Day_With_Origin(due_day + day_of_today)
+    return cards_with_new_due_day
+
+
+# "state" = for each deck id, the range of intervals of its last rescheduling and the "watermark" = highest modification
+# time of its cards already placed (the cards modified later are the changed ones). The watermarks are moved once the
+# changed cards are placed, even without any change, so that the same cards are not looked at again. A watermark never
+# goes back (e.g. if the most recently modified card was deleted), so that no card is placed twice
+def advance_watermarks(state: Dict[str, Dict[str, int]], max_modification_time_by_deck_id: Dict[str, int]) -> None:
+    for deck_id, entry in state.items():
+        entry["watermark"] = max(entry["watermark"], max_modification_time_by_deck_id[deck_id])
+
+
+# --- END of Incremental Rebalancing --- #
+
+
+# --- BEGINNING of PersistentResultCache Class --- #
+
+
+# Result of a run which can be shown (and applied) again without running the algorithm
+class CachedRescheduling(NamedTuple):
+    statistics: ReschedulingStatistics
+    cards_with_new_due_day: Dict[CardId, Due_Day_With_Origin]
+
+
+# Results of the previous runs saved on disk (one JSON file by fingerprint, in the folder given, e.g. in the user_files
+# of the add-on), so that they survive Anki restarts. The least recently used entries (= oldest modification time of
+# their file, which is updated when an entry is read) are removed once there are too many of them, or too big ones
+# A file which cannot be read is only a missing entry : the cache never prevents the algorithm from running
+class PersistentResultCache:
+    folder: str
+    max_number_of_entries: int
+    max_size_in_bytes: int
+
+    def __init__(self, folder: str, max_number_of_entries: int, max_size_in_bytes: int) -> None:
+        self.folder = folder
+        self.max_number_of_entries = max_number_of_entries
+        self.max_size_in_bytes = max_size_in_bytes
+
+    def get_path_of_entry(self, fingerprint: str) -> str:
+        return os.path.join(self.folder, f"{fingerprint}.json")
+
+    def get(self, fingerprint: str) -> Optional[CachedRescheduling]:
+        path = self.get_path_of_entry(fingerprint)
+        try:
+            with open(path) as file:
+                entry: Dict[str, Any] = json.load(file)
+            cached_rescheduling = CachedRescheduling(
+                ReschedulingStatistics.from_dict(entry["statistics"]),
+                dict(zip(entry["card_ids"], entry["new_dues"])))
+            os.utime(path)
+            return cached_rescheduling
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            self.remove(path)
+            return None
+
+    # The file is written next to its final path then renamed, so that an entry is never partially written
+    def put(self, fingerprint: str, cached_rescheduling: CachedRescheduling) -> None:
+        entry = {
+            "statistics": cached_rescheduling.statistics.to_dict(),
+            "card_ids": list(cached_rescheduling.cards_with_new_due_day.keys()),
+            "new_dues": list(cached_rescheduling.cards_with_new_due_day.values()),
+        }
+        path = self.get_path_of_entry(fingerprint)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(f"{path}.tmp", "w") as file:
+                json.dump(entry, file, separators=(",", ":"))
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            return
+        self.evict_least_recently_used_entries()
+
+    def evict_least_recently_used_entries(self) -> None:
+        entries: List[Tuple[float, int, str]] = list()
+        for name in os.listdir(self.folder):
+            if name.endswith(".json"):
+                path = os.path.join(self.folder, name)
+                status = os.stat(path)
+                entries.append((status.st_mtime, status.st_size, path))
+        entries.sort(reverse=True)
+        total_size_in_bytes = 0
+        for number_of_entries, (_, size_in_bytes, path) in enumerate(entries, start=1):
+            total_size_in_bytes += size_in_bytes
+            # The most recent entry is always kept
+            if number_of_entries > 1 and (number_of_entries > self.max_number_of_entries
+                                          or total_size_in_bytes > self.max_size_in_bytes):
+                self.remove(path)
+
+    @staticmethod
+    def remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Everything the result depends on : the cards of the deck (their number and their last modification), the day, the
+# parameters and the algorithm
+def new_fingerprint_of_rescheduling(deck_id: int, day_of_today: Due_Day_With_Origin, min_interval: int,
+                                    max_interval: int, is_reschedule_overdue_cards: bool, max_modification_time: int,
+                                    number_of_cards: int, is_balanced_by_review_time: bool = False) -> str:
+    key = [VERSION_OF_RESULT_CACHE, get_name_of_algorithm(), deck_id, day_of_today, min_interval, max_interval,
+           is_reschedule_overdue_cards, max_modification_time, number_of_cards]
+    # (the keys of the previous runs, balanced by number of cards, stay the same)
+    if is_balanced_by_review_time:
+        key.append("by estimated review time")
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+
+# (the parallel mode and the NumPy engine give the same result as the serial run)
+def get_name_of_algorithm() -> str:
+    if USE_ALGORITHM_4_BY_GLOBAL_DAILY_LOAD:
+        return "algorithm 4 by global daily load"
+    if USE_ALGORITHM_3_BY_EXACT_QUOTAS:
+        return "algorithm 3 by exact quotas"
+    if USE_ALGORITHM_1_BY_HIGHEST_DIFFERENCE:
+        return "algorithm 1 by highest difference"
+    return "algorithm 2 by left to right"
+
+
+# --- END of PersistentResultCache Class --- #
+
+
+# --- BEGINNING of UndoJournal Class --- #
+
+
+# Cards written to the database by a single run, with their due before and after the run
+# run_id = time of the run in milliseconds (same unit as the ids of the revlog, to find the reviews made since)
+class JournaledRun(NamedTuple):
+    run_id: int
+    description: str
+    number_of_cards: int
+    card_ids: "array[int]"
+    old_dues: "array[int]"
+    new_dues: "array[int]"
+
+
+# Append-only binary file of the runs : for each run, a header of 3 integers (run id, number of cards, length of the
+# description), the description in UTF-8, then the arrays of the card ids, the old dues and the new dues (8 bytes by
+# integer, in the byte order of the machine). A run of 100k cards takes 2.4 MB
+# Once there are too many runs, the file is rewritten with only the most recent ones
+# A run partly written at the end of the file (e.g. Anki closed during the write) is ignored, and cut by the next append
+class UndoJournal:
+    path: str
+    max_number_of_runs: int
+
+    def __init__(self, path: str, max_number_of_runs: int = MAX_NUMBER_OF_RUNS_IN_UNDO_JOURNAL) -> None:
+        self.path = path
+        self.max_number_of_runs = max_number_of_runs
+
+    def append(self, run: JournaledRun) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        end_of_complete_runs = 0
+        for _, end_of_complete_runs in self.iterate_runs_with_their_end(is_cards_read=False):
+            pass
+        with open(self.path, "ab") as file:
+            file.truncate(end_of_complete_runs)
+            UndoJournal.write_run(file, run)
+        if self.get_number_of_runs() > self.max_number_of_runs:
+            self.keep_only_most_recent_runs()
+
+    @staticmethod
+    def write_run(file, run: JournaledRun) -> None:
+        description = run.description.encode()
+        array("q", [run.run_id, run.number_of_cards, len(description)]).tofile(file)
+        file.write(description)
+        for column in (run.card_ids, run.old_dues, run.new_dues):
+            array("q", column).tofile(file)
+
+    # Runs from the oldest to the most recent. Without the cards, only the headers are read (the arrays are skipped)
+    def iterate_runs(self, is_cards_read: bool = True) -> Iterator[JournaledRun]:
+        for run, _ in self.iterate_runs_with_their_end(is_cards_read):
+            yield run
+
+    # Same as iterate_runs, with the position in the file of the end of each run
+    def iterate_runs_with_their_end(self, is_cards_read: bool) -> Iterator[Tuple[JournaledRun, int]]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as file:
+            size_of_file = os.fstat(file.fileno()).st_size
+            while True:
+                header = array("q")
+                try:
+                    header.fromfile(file, 3)
+                except EOFError:
+                    return
+                run_id, number_of_cards, length_of_description = header
+                description = file.read(length_of_description)
+                end_of_run = file.tell() + 3 * number_of_cards * header.itemsize
+                # Truncated description or arrays : same as a truncated header
+                if len(description) < length_of_description or end_of_run > size_of_file:
+                    return
+                columns: List["array[int]"] = list()
+                if is_cards_read:
+                    for _ in range(3):
+                        column = array("q")
+                        column.fromfile(file, number_of_cards)
+                        columns.append(column)
+                else:
+                    file.seek(3 * number_of_cards * header.itemsize, os.SEEK_CUR)
+                    columns = [array("q"), array("q"), array("q")]
+                yield JournaledRun(run_id, description.decode(), number_of_cards, *columns), end_of_run
+
+    def get_number_of_runs(self) -> int:
+        return sum(1 for _ in self.iterate_runs(is_cards_read=False))
+
+    def get_run(self, run_id: int) -> Optional[JournaledRun]:
+        for run in self.iterate_runs():
+            if run.run_id == run_id:
+                return run
+        return None
+
+    # The new file is written next to the journal then renamed, so that the journal is never partially written
+    def keep_only_most_recent_runs(self) -> None:
+        runs_to_keep = list(self.iterate_runs())[-self.max_number_of_runs:]
+        with open(f"{self.path}.tmp", "wb") as file:
+            for run in runs_to_keep:
+                UndoJournal.write_run(file, run)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+# --- END of UndoJournal Class --- #
+
+
+# --- GLOBAL FUNCTIONS ---#
+
+
+def range1(start, end):
+    return range(start, end + 1)
+
+
+# First interval of each band of intervals (the intervals up to MAX_INTERVAL_BALANCED_ALONE are bands of their own)
+# The bands are about RELATIVE_WIDTH_OF_BANDS of their first interval wide : about 50 bands from 300 to 3650 days
+def get_first_intervals_of_bands() -> List[Interval]:
+    first_intervals_of_bands: List[Interval] = [Interval(interval)
+                                                for interval in range1(1, MAX_INTERVAL_BALANCED_ALONE)]
+    while first_intervals_of_bands[-1] < MAX_POSSIBLE_VALUE_IN_RANGE:
+        last_interval = first_intervals_of_bands[-1]
+        first_intervals_of_bands.append(Interval(last_interval + max(1, int(last_interval * RELATIVE_WIDTH_OF_BANDS))))
+    return first_intervals_of_bands
+
+
+FIRST_INTERVALS_OF_BANDS: List[Interval] = get_first_intervals_of_bands()
+
+
+# The cards of a band are all balanced on the due days 1 to the first interval of the band (so each card stays within
+# its own interval, and is at most RELATIVE_WIDTH_OF_BANDS of its interval earlier than a balance by interval)
+# The band is used everywhere as the "interval" of the card by RescheduleDeck
+def get_band_of_interval(interval: int) -> Interval:
+    if interval <= MAX_INTERVAL_BALANCED_ALONE:
+        return Interval(interval)
+    return FIRST_INTERVALS_OF_BANDS[bisect_right(FIRST_INTERVALS_OF_BANDS, interval) - 1]
+
+
+# Sorted bands of the given intervals (= the "intervals" balanced by RescheduleDeck)
+def get_bands_of_intervals(sequence_of_intervals: Sequence[int]) -> List[Interval]:
+    return sorted({get_band_of_interval(interval) for interval in sequence_of_intervals})
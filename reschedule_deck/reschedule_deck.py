@@ -1,16 +1,28 @@
+import json
+import os
+import time
+from abc import abstractmethod
+from array import array
+from concurrent.futures import Future
+from fnmatch import fnmatchcase
+from statistics import median
 from typing import (
-    List, Dict, Sequence, Union, NewType, Any, )
+    List, Dict, Optional, Sequence, Tuple, NamedTuple, Callable, Any, )
 
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import QDialog, QComboBox, QCheckBox, QGridLayout, QFrame, QSizePolicy, QLabel, QDialogButtonBox, \
-    QSpinBox
-from anki.cards import Card
-from anki.cards import CardId
-from anki.consts import CardQueue, CardType
+    QSpinBox, QProgressBar, QPushButton, QFileDialog, QLineEdit, QInputDialog, QWidget
 from anki.decks import DeckId, DeckDict
-from aqt import mw
-from aqt.utils import showInfo
+from anki.utils import ids2str, intTime
+from aqt import gui_hooks, mw
+from aqt.utils import showInfo, tooltip
+
+from .reschedule_core import (
+    CardColumns, CardId, CardRecord, RescheduleDeck, IntervalResult, Interval, Instrumentation, DeckWorkUnit,
+    DeckResult, ReschedulingStatistics, CachedRescheduling, PersistentResultCache, JournaledRun, UndoJournal,
+    MAX_POSSIBLE_VALUE_IN_RANGE, advance_watermarks, balance_decks, get_balancing_modes, get_bands_of_intervals,
+    new_fingerprint_of_rescheduling, print_summary_of_batch, range1, rebalance_changed_cards, set_message_handler, )
 
 # --- EXTERNAL VARIABLES ---#
 # NAME_OF_DECK_TO_RESCHEDULE = "JP - Kanji 2k RTK::JP - Kanji - Subdeck 2"
@@ -20,880 +32,144 @@ DEFAULT_MIN_VALUE_IN_RANGE = 1
 DEFAULT_MAX_VALUE_IN_RANGE = 29
 DEFAULT_DRY_RUN = True
 DEFAULT_RESCHEDULE_OVERDUE_CARDS = False
-
-# --- INTERNAL VARIABLES ---#
-# Custom Classes
-IntFloat = Union[int, float]
-Average = NewType("IntFloat", IntFloat)
-Difference = NewType("Difference", IntFloat)
-Interval = NewType("Interval", int)
-Due_Day = NewType("Due_Day", int)
-Due_Day_With_Origin = NewType("Due_Day_With_Origin", int)
-Nb_of_Cards = NewType("Nb_of_Cards", int)
-Diff_in_Due_Day = NewType("Diff_in_Due_Day", int)
-Iteration = NewType("NewType", int)
-
-# ??
-MINIMUM_DUE_ATTRIBUTE_OF_CARD_WHEN_DUE_IS_TIMESTAMP_OR_RANDOM_ID = 1_000_000_000
-MAX_POSSIBLE_VALUE_IN_RANGE = 300
-
-# Stuff to simplify Testing
-USE_ALGORITHM_1_BY_HIGHEST_DIFFERENCE = True
-SHOW_EVERY_ITERATION = False
-MULTIPLIER_FOR_MAX_NB_OF_ITERATION = 1
-
-# Fictive Deck to test the performance of the algorithm
-# TODO: test "interval + 1" for "over-scheduled cards"
-USE_FICTIVE_DECK = False
-FICTIVE_INTERVAL = 21
-FICTIVE_DUE_DAY = 1
-FICTIVE_NUMBER_OF_CARDS = 500
-
-
-# --- BEGINNING of ReorderDeck Class --- #
-
-
-# This class only contain the logic of the rescheduling.
-# It does NOT modify cards (only adds new fields for simplicity, but even that could be avoided) !
-# NO DATABASE ACCESS !
+DEFAULT_BALANCE_BY_REVIEW_TIME = False
+DEFAULT_SHOW_PERFORMANCE_DETAILS = False
+DEFAULT_PATTERN_OF_DECKS_IN_BATCH = "*"
+NAME_OF_UNDO_CHECKPOINT = "Reschedule Deck"
+# The preview is computed once the parameters have not changed for this delay
+DELAY_BEFORE_PREVIEW_IN_MILLISECONDS = 400
+# Results of the previous runs kept on disk, in the user_files folder of the add-on (kept when the add-on is updated)
+NAME_OF_RESULT_CACHE_FOLDER = "result_cache"
+MAX_NUMBER_OF_ENTRIES_IN_RESULT_CACHE = 20
+MAX_SIZE_OF_RESULT_CACHE_IN_BYTES = 50_000_000
+# Old and new dues of the rescheduled cards, to undo a rescheduling (also in the user_files folder)
+NAME_OF_UNDO_JOURNAL_FILE = "undo_journal.bin"
+NAME_OF_UNDO_ACTION = "Undo a Deck Rescheduling"
+# Opt-in : when the profile is opened and after each sync, the review cards modified since the last rescheduling of a
+# deck (e.g. reviewed) are placed into its balanced due days. Only the decks already rescheduled (with the range of
+# intervals of their last rescheduling) are concerned
+IS_AUTO_REBALANCING_ENABLED = False
+NAME_OF_AUTO_REBALANCING_STATE_FILE = "auto_rebalancing.json"
+# When balancing by estimated review time : only the answers of the reviews of the last days are used (recent answer
+# times, and a bounded number of rows for the query, which must stay fast on big collections)
+NUMBER_OF_DAYS_OF_ANSWER_TIMES = 365
+
+
+# Parameters of the dialog which change the result of the rescheduling
+class ReschedulingParameters(NamedTuple):
+    deck_name: str
+    min_interval: int
+    max_interval: int
+    is_reschedule_overdue_cards: bool
+    is_balanced_by_review_time: bool
 
 
-class RescheduleDeck:
-    # --- "External" Variables (passed by arguments or by global variables) (not be modified once initialized) --- #
+# Cards of a deck as loaded from the database (compact columns). Kept while the dialog is open (it is modal : the deck
+# cannot be reviewed meanwhile), and forgotten once the deck is actually rescheduled
+class DeckSnapshot(NamedTuple):
     deck: DeckDict
-    cards: List[Card]
-    sequence_of_intervals: Sequence[Interval]
-    is_reschedule_past_overdue_cards: bool
-    max_due: int
-
-    # --- Internal Variables needed for the algorithm (not modified once initialized) --- #
-    number_of_cards_over_scheduled: Nb_of_Cards = 0
-    number_of_cards_overdue_only_for_reviews_queue_2: Nb_of_Cards = 0
-    number_of_cards_overdue_only_for_learning_queue_1: Nb_of_Cards = 0
-    number_of_cards_overdue_only_for_learning_queue_3: Nb_of_Cards = 0
-    number_of_cards_overdue_only_for_buried_queue_minus_3: Nb_of_Cards = 0
-    day_of_today: Due_Day_With_Origin
-    cards_by_interval: Dict[Interval, List[Card]]
-    due_day_original_by_card: Dict[Card, Due_Day] = dict()
-    average_number_of_cards_by_interval: Dict[Interval, Average]
-    # The following two "original" variables save the state at the beginning
-    cards_original: Dict[Interval, Dict[Due_Day, List[Card]]]
-    difference_to_average_original: Dict[Interval, Dict[Due_Day, Difference]]
-
-    # --- Internal Variables modified by the algorithm after their first initialization--- #
-    number_of_iterations_of_main_algorithm: Dict[Interval, int] = dict()
-    cards_target: Dict[Interval, Dict[Due_Day, List[Card]]]
-    difference_to_average_target: Dict[Interval, Dict[Due_Day, Difference]]
-
-    # --- Internal Variables used after the algorithm as a result (not modified once initialized) --- #
-    cards_with_only_different_new_due_day: Dict[Card, Due_Day_With_Origin]
-
-    def __init__(self, deck: DeckDict, cards: Sequence[Card],
-                 sequence_of_intervals: Sequence[int],
-                 is_reschedule_overdue_cards: bool) -> None:
-
-        # Initialization of "External" Variables (passed by arguments or by global variables)
-        self.deck = deck
-        self.day_of_today = RescheduleDeck.retrieve_date_of_today(deck)
-        if not USE_FICTIVE_DECK:
-            self.cards = list(cards)
-            self.sequence_of_intervals = [Interval(x) for x in sequence_of_intervals]
-        else:
-            self.cards = self.new_fictive_list_of_cards()
-            self.sequence_of_intervals = [Interval(FICTIVE_INTERVAL)]
-        self.is_reschedule_past_overdue_cards = is_reschedule_overdue_cards
-        self.max_due = MINIMUM_DUE_ATTRIBUTE_OF_CARD_WHEN_DUE_IS_TIMESTAMP_OR_RANDOM_ID
-
-        # Preparation of Internal Variables for later use by the rescheduling algorithm
-        self.exclude_irrelevant_cards_and_modify_others()
-        self.cards_by_interval = self.get_cards_by_interval()
-        self.cards_original, self.due_day_original_by_card = self.get_cards_by_due_day_and_original_due_day()
-        self.cards_target, self.due_day_original_by_card = self.get_cards_by_due_day_and_original_due_day()
-        self.average_number_of_cards_by_interval = self.get_average_number_by_due_day()
-        self.get_difference_between_current_and_average_due_day()
-        self.difference_to_average_original = self.get_difference_between_current_and_average_due_day()
-        self.difference_to_average_target = self.get_difference_between_current_and_average_due_day()
-
-        # Algorithm
-        if USE_ALGORITHM_1_BY_HIGHEST_DIFFERENCE:
-            self.reschedule_cards_algorithm_1_by_highest_difference()
-        else:
-            self.reschedule_cards_algorithm_2_by_left_to_right()
-
-        # After algorithm
-        self.cards_with_only_different_new_due_day = self.determine_cards_with_only_different_new_due_day()
-
-        # self.print_cards_by_interval()
-        # self.print_cards_by_interval_by_due_day()
-        # self.print_average()
-        # self.print_difference()
-        # self.print_distribution_of_cards_rescheduled()
+    cards: CardColumns
+    # Only loaded (once) when balancing by estimated review time
+    review_time_by_card: Optional[Dict[CardId, float]] = None
 
-    # --- Initialization Functions of ReorderDeck Class --- #
 
-    @staticmethod
-    def get_maximum_interval(sequence_of_intervals: Sequence[Interval]) -> Interval:
-        max_interval = sequence_of_intervals[0]
-        for interval in sequence_of_intervals:
-            if interval >= max_interval:
-                max_interval = interval
-        return max_interval
-
-    @staticmethod
-    def retrieve_date_of_today(deck) -> Due_Day_With_Origin:
-        return deck.get("timeToday")[0]
-
-    @staticmethod
-    def get_interval(card: Card) -> int:
-        return card.ivl
-
-    @staticmethod
-    def get_queue(card: Card) -> CardQueue:
-        return card.queue
-
-    @staticmethod
-    def get_type(card: Card) -> CardType:
-        return card.type
-
-    def get_due_day(self, card: Card) -> Due_Day:
-        return Due_Day(card.due - self.day_of_today)
-
-    @staticmethod
-    def is_user_buried(card) -> bool:
-        return RescheduleDeck.get_queue(card) == -3
-
-    @staticmethod
-    def is_suspended(card: Card) -> bool:
-        return RescheduleDeck.get_queue(card) == -1
-
-    @staticmethod
-    def is_new(card: Card) -> bool:
-        return RescheduleDeck.get_type(card) == 0
-
-    @staticmethod
-    def is_learning_for_first_time(card: Card) -> bool:
-        return RescheduleDeck.get_type(card) == 1
-
-    @staticmethod
-    def is_review(card: Card) -> bool:
-        return RescheduleDeck.get_type(card) == 2
+# Horizontal separation line
+class QHSeparationLine(QFrame):
+    def __init__(self):
+        super().__init__()
+        self.setMinimumWidth(1)
+        self.setFixedHeight(20)
+        self.setFrameShape(QFrame.HLine)
+        self.setFrameShadow(QFrame.Sunken)
+        self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Minimum)
 
-    @staticmethod
-    def is_really_review(card: Card) -> bool:
-        return RescheduleDeck.get_type(card) == 2 and RescheduleDeck.get_queue(card) == 2
 
-    @staticmethod
-    def is_relearning(card: Card) -> bool:
-        return RescheduleDeck.get_type(card) == 3
+# --- BEGINNING of DialogWithBackgroundRescheduling Class --- #
 
-    def is_card_overdue(self, card: Card) -> bool:
-        card_queue = self.get_queue(card)
-        card_due_day = self.get_due_day(card)
-        return (card_queue == 2 and card_due_day <= 0) or card_queue in (-3, 1)
 
-    @staticmethod
-    def init_dict_of_cards(range_of_integer_keys: Sequence[int]) -> Dict[Any, List[Card]]:
-        dict_of_cards: Dict[Any, List[Card]] = dict()
-        for interval in range_of_integer_keys:
-            dict_of_cards[interval]: List[Card] = list()
-        return dict_of_cards
+# Base of the dialogs : loading the cards and balancing them can take a while on big decks, so the rescheduling runs
+# in a background thread (Anki stays responsive) with a progress bar and a stop button, while the database is only
+# modified by the main thread once the background thread is finished
+class DialogWithBackgroundRescheduling(QDialog):
+    # Set by the main thread, read by the background thread between two steps (intervals or decks)
+    is_running: bool = False
+    is_stop_requested: bool = False
 
-    @staticmethod
-    def init_dict_of_dict_of_cards(range_of_first_integer_keys: Sequence[Interval],
-                                   ) -> Dict[Interval, Dict[Due_Day, List[Card]]]:
-        dict_of_dict_of_cards: Dict[Interval, Dict[Due_Day, List[Card]]] = dict()
-        for interval in range_of_first_integer_keys:  # type: Interval
-            dict_of_dict_of_cards[interval] = RescheduleDeck.init_dict_of_cards(range1(1, interval))
-        return dict_of_dict_of_cards
-
-    def new_fictive_list_of_cards(self) -> List[Card]:
-        fictive_interval = FICTIVE_INTERVAL
-        fictive_due_day = FICTIVE_DUE_DAY
-        fictive_number_of_cards = FICTIVE_NUMBER_OF_CARDS
-        cards: List[Card] = list()
-        for _ in range1(1, fictive_number_of_cards):
-            new_card = Card(mw.col)
-            new_card.ivl = fictive_interval
-            new_card.due = self.day_of_today + fictive_due_day
-            new_card.queue = 2
-            new_card.type = 2
-            cards.append(new_card)
-        return cards
-
-    # queue = integer
-    # -- -3=user buried(In scheduler 2),
-    # -- -2=sched buried (In scheduler 2),
-    # -- -2=buried(In scheduler 1),
-    # -- -1=suspended,
-    # -- 0=new, 1=learning, 2=review
-    # -- 3=in learning, next rev in at least a day after the previous review
-    # -- 4=preview
-
-    # type = integer
-    # -- 0 = new,
-    # -- 1 = learning,
-    # -- 2 = review,
-    # -- 3 = relearning
-
-    # TODO: look at the way the browser retrieves the due day, in case something was missed (which is most probable)
-    def exclude_irrelevant_cards_and_modify_others(self) -> None:
-        cards_to_remove: List[Card] = list()
-        for card in self.cards:
-            # If card not in the desired intervals, we don't keep it
-            # (This includes cards considered as new because they don't have an interval yet)
-            card_interval: int = RescheduleDeck.get_interval(card)
-            card_due_day: int = self.get_due_day(card)
-            card_queue: int = RescheduleDeck.get_queue(card)
-            card_type: int = RescheduleDeck.get_type(card)
-
-            try:
-                # Make assertions on the state of the card for the algorithm to be able to work
-                # = (checking Anki's consistency first)
-                # Note : the state of cards in Anki seems to be a bit inconsistent (card with type "review" but queue "learn" for example)
-                if card_queue == -3:
-                    assert card_due_day > self.max_due or card_due_day <= 0
-                    pass
-                if card_queue == -2:
-                    showInfo("Card with queue = -2 : scheduler buried")
-                    assert False
-                    # assert card_due_day > 0
-                    # assert card_due_day <= card_interval
-                if card_queue == 0:
-                    assert card_type == 0
-                if card_queue == 1:
-                    assert card_type in (1, 3)
-                    # bug with following commented assertion ???
-                    # assert card_type == 1 and card_due_day > self.max_due
-                if card_queue == 2:
-                    assert card_type == 2
-                    assert card_due_day >= -self.day_of_today
-                    assert card_due_day < self.max_due
-                if card_queue == 3:
-                    assert card_type in (1, 3)
-                    assert card_due_day < self.max_due
-                if card_queue == 4:
-                    # ??
-                    pass
-            except AssertionError as error:
-                showInfo(f"Unexpected {error=}")
-                self.show_card_and_note_info(card)
-                raise
-
-            # Note: There seems to be cards still in learning status but which are neither type 1 nor 3
-            # if self.is_suspended(card) or self.is_new(card) or self.is_learning_for_first_time(card) or self.is_relearning(card):
-            if not self.is_really_review(card):
-                cards_to_remove.append(card)
-                continue
-
-            if self.is_really_review(card):
-                if card_interval not in self.sequence_of_intervals:
-                    cards_to_remove.append(card)
-                    continue
-
-            # Counting different type of overdue cards
-            if self.is_review(card) and card_due_day <= 0:
-                self.number_of_cards_overdue_only_for_reviews_queue_2 += 1
-
-            if self.is_user_buried(card):
-                self.number_of_cards_overdue_only_for_buried_queue_minus_3 += 1
-
-            if card_queue == 1:
-                self.number_of_cards_overdue_only_for_learning_queue_1 += 1
-
-            if card_queue == 3 and card_due_day <= 0:
-                self.number_of_cards_overdue_only_for_learning_queue_3 += 1
-
-            if not self.is_reschedule_past_overdue_cards:
-                if self.is_card_overdue(card):
-                    cards_to_remove.append(card)
-
-        new_card_list: List[Card] = [card for card in self.cards if card not in cards_to_remove]
-        self.cards = list(new_card_list)
-
-    def get_cards_by_interval(self) -> Dict[Interval, List[Card]]:
-        cards_by_interval: Dict[Interval, List[Card]] = self.init_dict_of_cards(self.sequence_of_intervals)
-        for card in self.cards:
-            card_interval = RescheduleDeck.get_interval(card)
-            try:
-                cards_by_interval[Interval(card_interval)].append(card)
-            except KeyError:
-                text = f"Trying to add a card with the wrong interval = {card_interval}"
-                text += f" into the desired sequence of intervals = {self.sequence_of_intervals}"
-                text += f"\n => Problem in the excluding of relevant cards at initialization"
-                showInfo(text)
-                self.show_card_and_note_info(card)
-                raise
-        return cards_by_interval
-
-    # TODO: if possible, split this method in two, one for updating and saving original_due_day, another for the sort
-    def get_cards_by_due_day_and_original_due_day(self) -> (Dict[Interval, Dict[Due_Day, List[Card]]],
-                                                            Dict[Card, Due_Day]):
-        cards_all_sorted: Dict[Interval, Dict[Due_Day, List[Card]]] = self.init_dict_of_dict_of_cards(
-            self.sequence_of_intervals)
-        due_day_original: Dict[Card, Due_Day] = dict()
-        number_of_cards_over_scheduled: Nb_of_Cards = Nb_of_Cards(0)
-        for interval in self.sequence_of_intervals:
-            for card in self.cards_by_interval[interval]:
-
-                # If we don't define due_day before the try-except, the IDE whines
-                due_day: Due_Day = Due_Day(0)
-                try:
-                    due_day: Due_Day = self.get_due_day(card)
-
-                    # If card is past overdue, we set its original due_day to today and reschedule it to tomorrow
-                    if self.is_card_overdue(card):
-                        due_day_original[card] = Due_Day(0)
-                        cards_all_sorted[interval][Due_Day(1)].append(card)
-
-                    # If card is over-scheduled, we set its original due_day to "interval" and reschedule it to "interval" days
-                    elif due_day > interval:
-                        due_day_original[card] = Due_Day(interval + 1)
-                        cards_all_sorted[interval][Due_Day(interval)].append(card)
-                        # TODO: save those cards somewhere and show them
-                        number_of_cards_over_scheduled += 1
-
-                    else:
-                        due_day_original[card] = due_day
-                        cards_all_sorted[interval][due_day].append(card)
-
-                except KeyError:
-                    showInfo(f"interval = {interval}, due_day = {due_day}, today = {self.day_of_today}")
-                    self.show_card_and_note_info(card)
-                    self.cards.remove(card)
-                    raise
-
-        return (cards_all_sorted, due_day_original)
-
-    # --- "Algorithm" Functions of ReorderDeck Class --- #
-
-    def get_average_number_by_due_day(self) -> Dict[Interval, Average]:
-        average_by_interval: Dict[Interval, Average] = dict()
-        for interval in self.sequence_of_intervals:
-            total_cards: Nb_of_Cards = Nb_of_Cards(0)
-            cards_by_due_day: Dict[Due_Day, List[Card]] = self.cards_original[interval]
-            for due_day in range1(1, interval):  # type: Due_Day
-                total_cards += len(cards_by_due_day[due_day])
-            if total_cards % interval == 0:
-                average_by_interval[interval] = total_cards // interval
-            else:
-                average_by_interval[interval] = round(total_cards / interval, 2)
-        return average_by_interval
+    def __init__(self, parent, format_of_progress: str):
+        # QDialog is not an ABC (its metaclass is the one of PyQt) : a dialog missing an abstract method fails here
+        if getattr(type(self)._get_widgets_disabled_while_running, "__isabstractmethod__", False):
+            raise TypeError(f"{type(self).__name__} does not define _get_widgets_disabled_while_running")
+        super(DialogWithBackgroundRescheduling, self).__init__(parent)
+        # Only shown while the rescheduling runs in the background
+        self._progress_bar = QProgressBar()
+        self._progress_bar.setFormat(format_of_progress)
+        self._progress_bar.hide()
+        self._button_stop = QPushButton("Stop")
+        self._button_stop.clicked.connect(self._stop_algorithm)
+        self._button_stop.hide()
 
     @staticmethod
-    def is_average_between_0_excluded_and_point_5_excluded(average_: Average) -> bool:
-        return not RescheduleDeck.is_integer(average_) and RescheduleDeck.is_between_0_included_and_point_5_excluded(
-            average_)
-
-    @staticmethod
-    def is_integer(average_: Average) -> bool:
-        return isinstance(average_, int)
-
-    @staticmethod
-    def is_between_0_included_and_point_5_excluded(average_: Average) -> bool:
-        return int(average_) == round(average_)
-
-    @staticmethod
-    def is_between_point5_included_and_one_excluded(average_: Average) -> bool:
-        return int(average_) != round(average_)
-
-    # TODO: make it so that we only recalculate for a given interval
-    # TODO: redo comment
-    def get_difference_between_current_and_average_due_day(self) -> Dict[Interval, Dict[Due_Day, Difference]]:
-        differences_all: Dict[Interval, Dict[Due_Day, Difference]] = dict()
-        for interval in self.sequence_of_intervals:
-            differences_all[interval]: Dict[Due_Day, Difference] = dict()
-            cards_by_due_day: Dict[Due_Day, List[Card]] = self.cards_target[interval]
-            average: Average = self.average_number_of_cards_by_interval[interval]
-
-            for due_day in range1(1, interval):  # type: Due_Day
-                difference = len(cards_by_due_day[due_day]) - average
-                differences_all[interval][due_day] = Difference(difference)
-
-        return differences_all
-
-    # TODO: Make the 2nd Algorithm work
-    # Core function of the Algorithm number 2 (by sides) for rescheduling cards
-    def reschedule_cards_algorithm_2_by_left_to_right(self):
-        for interval in self.sequence_of_intervals:
-            difference_of_cards_by_due_day: Dict[Due_Day, Difference] = self.difference_to_average_target[
-                interval]
-            average: Average = self.average_number_of_cards_by_interval[interval]
-            is_average_floor = round(average) == int(average)
-            # If is_average_floor true, then break condition is difference = 0 or 1
-            # Else break condition is difference = -1 or 0
-            for due_day in range1(1, interval - 1):  # type: Due_Day
-                difference = difference_of_cards_by_due_day[due_day][1]
-
-                # We fine-tune "difference" so that we don't move cards with a difference closer to average than 1
-                if (difference > 0 and is_average_floor):
-                    difference -= 1
-                if (difference < 0 and not is_average_floor):
-                    difference += 1
-
-                if (difference > 0):
-                    # In this case, we only need to move cards from the current to the next due_day
-                    self.move_cards_from_original_to_target_day(interval, amount=difference,
-                                                                original_day=due_day,
-                                                                target_day=Due_Day(due_day + 1))
-                elif difference < 0:
-                    # In this case, we need to move cards from the superior due_days to the current due_day until enough have been moved
-                    difference = abs(difference)
-                    number_of_moved_cards = 0
-                    next_due_day = Due_Day(due_day + 1)
-                    while next_due_day < interval:
-                        next_difference = abs(difference_of_cards_by_due_day[due_day][1])
-                        next_number_of_moved_cards = number_of_moved_cards + next_difference
-                        if (next_number_of_moved_cards >= difference):
-                            number_of_cards_to_move = difference - number_of_moved_cards
-                            self.move_cards_from_original_to_target_day(interval,
-                                                                        amount=number_of_cards_to_move,
-                                                                        original_day=next_due_day,
-                                                                        target_day=due_day)
-                            break
-                        else:
-                            self.move_cards_from_original_to_target_day(interval, amount=next_difference,
-                                                                        original_day=next_due_day,
-                                                                        target_day=due_day)
-                            number_of_moved_cards = next_number_of_moved_cards
-                            next_due_day += 1
-                    if (next_due_day == interval):
-                        text = f"Error, we can't find enough cards in the following due_days to move to "
-                        text += f" the current due day {due_day} in interval {interval}"
-                        showInfo(text)
-                        self.show_both_original_and_target_cards_by_interval_by_due_day()
-                        raise
-
-    # Core function of the Algorithm number 1 (by highest difference) for rescheduling cards
-    def reschedule_cards_algorithm_1_by_highest_difference(self):
-
-        # --- Internal Methods of the Core Algorithm --- #
-
-        # Static
-        def get_max_iterations_from_interval_value(interval_: Interval):
-            max_iterations = interval_ * interval_ * interval_
-            max_iterations *= MULTIPLIER_FOR_MAX_NB_OF_ITERATION
-            max_iterations = round(max_iterations)
-            return max_iterations
-
-        def find_highest_positive_difference() -> (Due_Day, Difference):
-            return find_highest_positive_diff_closest_to_given_due_day(positive=True)
-
-        def find_highest_negative_difference() -> (Due_Day, Difference):
-            return find_highest_positive_diff_closest_to_given_due_day(positive=False)
-
-        # Needs to use "difference_to_average_target" which is modified at each iteration of the main algorithm
-        def find_highest_positive_diff_closest_to_given_due_day(positive: bool,
-                                                                minimum_due_day: Due_Day = 0) -> (Due_Day, Difference):
-            difference_of_cards: Dict[Due_Day, Difference] = self.difference_to_average_target[interval]
-            max_due_day_: Due_Day = Due_Day(1)
-            highest_difference: Difference = difference_of_cards[max_due_day_]
-            closest_distance = abs(max_due_day_ - minimum_due_day)
-            for current_due_day in range1(2, interval):  # type: Due_Day
-                current_difference: Difference = difference_of_cards[current_due_day]
-                current_distance: Diff_in_Due_Day = Diff_in_Due_Day(abs(current_due_day - minimum_due_day))
-                condition_for_highest: bool = (positive and current_difference > highest_difference) or \
-                                              (not positive and current_difference < highest_difference)
-                condition_for_closest: bool = (current_difference == highest_difference and
-                                               current_distance < closest_distance)
-                if condition_for_highest or condition_for_closest:
-                    max_due_day_ = current_due_day
-                    highest_difference = current_difference
-                    closest_distance = current_distance
-            try:
-                assert max_due_day_ != minimum_due_day
-                return (max_due_day_, highest_difference)
-            except AssertionError:
-                text = f"Error in find_highest_positive_diff_closest_to_given_due_day"
-                text += f", found minimum_due_day = {minimum_due_day} and max_due_day_ = {max_due_day_}"
-                text += f" in interval {interval}"
-                showInfo(text)
-                self.show_both_original_and_target_difference()
-                raise
-
-        # Determine if moving from max_due_day to minimum_due_day is moving towards increasing due_days
-        def is_to_move_towards_increasing_due_day(max_due_day_, min_due_day_) -> bool:
-            assert max_due_day_ != min_due_day_
-            if max_due_day_ < min_due_day_:
-                return True
-            else:
-                return False
-
-        # If only one card needs to be moved, we need to move it towards the highest negative difference
-        # First we need to find one of the highest negative difference (without rounding),
-        # then find the highest positive difference (without rounding) closest to it,
-        # then move the highest positive difference towards highest the negative one.
-        def move_one_card_from_highest_closest_positive_diff_towards_highest_negative_diff(min_due_day_: Due_Day):
-            new_max_due_day: Due_Day = find_highest_positive_diff_closest_to_given_due_day(
-                positive=True, minimum_due_day=min_due_day_)[0]
-            assert min_due_day_ != new_max_due_day
-
-            if is_to_move_towards_increasing_due_day(new_max_due_day, min_due_day_):
-                self.move_cards_from_original_to_target_day(interval, Nb_of_Cards(1),
-                                                            original_day=new_max_due_day,
-                                                            target_day=Due_Day(new_max_due_day + 1))
-            else:
-                self.move_cards_from_original_to_target_day(interval, Nb_of_Cards(1),
-                                                            original_day=new_max_due_day,
-                                                            target_day=Due_Day(new_max_due_day - 1))
-
-        # TODO: add comment
-        def move_several_cards_from_highest_diff_towards_neighbors(amount: Nb_of_Cards, original_due_day: Due_Day):
-
-            assert original_due_day >= 1
-            assert original_due_day <= interval
-            assert amount > 0
-
-            if amount == 1:
-                showInfo(f"Trying to move only 1 card : we shouldn't use the current method + {__name__}")
-                self.show_both_original_and_target_difference()
-                exit(1)
-
-            if original_due_day == 1:
-                self.move_cards_from_original_to_target_day(interval, amount,
-                                                            original_day=Due_Day(1), target_day=Due_Day(2))
-            elif original_due_day == interval:
-                self.move_cards_from_original_to_target_day(interval, amount,
-                                                            original_day=Due_Day(interval),
-                                                            target_day=Due_Day(interval - 1))
-            else:
-                absolute_half_of_amount = Nb_of_Cards(int(amount / 2))
-                self.move_cards_from_original_to_target_day(interval, absolute_half_of_amount,
-                                                            original_day=original_due_day,
-                                                            target_day=Due_Day(original_due_day - 1))
-                self.move_cards_from_original_to_target_day(interval, absolute_half_of_amount,
-                                                            original_day=original_due_day,
-                                                            target_day=Due_Day(original_due_day + 1))
-
-        def show_error_message_for_too_many_iterations_in_main_algorithm_and_exits():
-            text = "Problem in main algorithm : limit of expected maximum iterations broken through"
-            for interval_2 in self.sequence_of_intervals:
-                text += f"\n Number of iterations for interval {interval_2} : "
-                text += f"{self.number_of_iterations_of_main_algorithm[interval_2]}"
-            showInfo(text)
-            self.show_both_original_and_target_difference()
-            exit(1)
-
-        # --- Core Algorithm --- #
-        # For each interval, reschedule cards so that there is the same number of cards on each possible due_date
-        # Works by some sort of dichotomy when moving several cards, or use specific logic when moving a single card
-        # TODO: check that no method called by this core algorithm loops over all the intervals !!!
-        def choose_and_move_cards_for_given_interval() -> int:
-            iteration = 0
-            while iteration < max_iteration_for_current_interval:
-                # Debug Feature
-                if SHOW_EVERY_ITERATION:
-                    showInfo(self.print_difference_target())
-                # Retrieve max positive and negative differences
-                (max_due_day, max_difference) = find_highest_positive_difference()
-                (min_due_day, min_difference) = find_highest_negative_difference()
-                # Determine if we need to stop the main algorithm (= rescheduling finished)
-                if max_difference < 1 and min_difference > -1:
-                    break
-                # Determine if we move only 1 card or more
-                if max_difference < 2:
-                    move_one_card_from_highest_closest_positive_diff_towards_highest_negative_diff(min_due_day)
-                else:
-                    move_several_cards_from_highest_diff_towards_neighbors(Nb_of_Cards(int(max_difference)),
-                                                                           original_due_day=max_due_day)
-                # After moving cards, we need to recalculate the new difference, and increase the number of iterations
-                self.difference_to_average_target = self.get_difference_between_current_and_average_due_day()
-                iteration += 1
-            return iteration
-
-        # --- Actual Beginning of the Core Algorithm --- #
-
-        # TODO: Find a better way to initialize "self.number_of_iterations_of_main_algorithm"
-        # Initialization of nb_of_iterations
-        for interval in self.sequence_of_intervals:
-            self.number_of_iterations_of_main_algorithm[interval] = 0
-
-        for interval in self.sequence_of_intervals:
-            max_iteration_for_current_interval = get_max_iterations_from_interval_value(interval)
-            # Call to the Core Algorithm
-            nb_of_iterations = choose_and_move_cards_for_given_interval()
-            self.number_of_iterations_of_main_algorithm[interval] = nb_of_iterations
-            if nb_of_iterations == max_iteration_for_current_interval:
-                show_error_message_for_too_many_iterations_in_main_algorithm_and_exits()
-
-    # Move Card Algorithm which selects and moves cards from original to target day while minimizing the amount of rescheduling
-    def move_cards_from_original_to_target_day(self, interval: Interval, amount: Nb_of_Cards,
-                                               original_day: Due_Day, target_day: Due_Day):
-
-        # --- Internal Methods of the Move Card Algorithm --- #
-
-        def get_max_iterations_for_move_card_algorithm() -> Diff_in_Due_Day:
-            # Note : + 1 in case card is "over_scheduled" (due_day > interval => original_due_day = interval + 1)
-            if (self.is_reschedule_past_overdue_cards):
-                return Diff_in_Due_Day(interval + 2)
-            else:
-                return Diff_in_Due_Day(interval + 1)
-
-        # Find the cards which were originally the closest to first_original_due_day
-        def get_cards_by_diff_between_target_and_first_original_due_day() -> Dict[Diff_in_Due_Day, List[Card]]:
-            cards_by_diff_: Dict[Diff_in_Due_Day, List[Card]] = RescheduleDeck.init_dict_of_cards(
-                range1(0, interval + 1))
-            for card in cards_for_original_day:
-                diff = Diff_in_Due_Day(abs(target_day - self.due_day_original_by_card[card]))
-                cards_by_diff_[diff].append(card)
-            return cards_by_diff_
-
-        # Select cards to move if there are more candidates than needed
-        # Note: Potential second algorithm for this selection
-        def select_cards_to_move(cards_to_move: List[Card], amount_of_cards_to_move: int) -> List[Card]:
-            if amount_of_cards_to_move < len(cards_to_move):
-                # Note: We could add a secondary mechanism for choosing cards instead of just truncating
-                return cards_to_move[:amount_of_cards_to_move]
-            else:
-                return cards_to_move
-
-        # Select and move cards from original_day to target_day
-        def move_given_nb_of_cards_among_list(cards_to_move: List[Card], nb_of_cards_to_move: int):
-            cards_to_move_selected: List[Card] = select_cards_to_move(cards_to_move, nb_of_cards_to_move)
-            for card in cards_to_move_selected:
-                cards_for_original_day.remove(card)
-                cards_for_target_day.append(card)
-
-        def show_error_message_of_move_algorithm_and_exits() -> None:
-            text = "Error, too many iterations in move_cards : "
-            text += f"\n interval: {interval}, amount: {amount}"
-            text += f", original_day: {original_day}, target_day: {target_day}"
-            showInfo(text)
-            self.show_both_original_and_target_difference()
-            exit(1)
-
-        # --- Actual Beginning of the Move Card Algorithm --- #
-
-        # Class attributes used in all the different methods of the current method
-        cards_for_original_day: List[Card] = self.cards_target[interval][original_day]
-        cards_for_target_day: List[Card] = self.cards_target[interval][target_day]
-        # Variables used only in current method
-        cards_by_diff: Dict[Diff_in_Due_Day, List[Card]] = get_cards_by_diff_between_target_and_first_original_due_day()
-        number_of_moved_cards = 0
-        current_diff_in_due_day: Diff_in_Due_Day = Diff_in_Due_Day(0)
-        max_iterations: Diff_in_Due_Day = get_max_iterations_for_move_card_algorithm()
-
-        # TODO : Extract this while loop into a method
-        # First algorithm of selection
-        # We want to reschedule cards so that the difference between their original_due_day and their target_due_day
-        # is minimized, so that we limit at the maximum the dispersion of cards due to rescheduling
-        while number_of_moved_cards != amount and current_diff_in_due_day < max_iterations:
-            next_cards_to_move = cards_by_diff[current_diff_in_due_day]
-            next_max_number_of_moved_cards = number_of_moved_cards + len(next_cards_to_move)
-
-            if next_max_number_of_moved_cards >= amount:
-                number_of_cards_to_move = Nb_of_Cards(amount - number_of_moved_cards)
-                move_given_nb_of_cards_among_list(next_cards_to_move, number_of_cards_to_move)
-                break
-            else:
-                number_of_cards_to_move = Nb_of_Cards(len(next_cards_to_move))
-                move_given_nb_of_cards_among_list(next_cards_to_move, number_of_cards_to_move)
-                number_of_moved_cards = next_max_number_of_moved_cards
-            current_diff_in_due_day += 1
-
-        if current_diff_in_due_day == max_iterations:
-            show_error_message_of_move_algorithm_and_exits()
-
-    # --- "Result" Functions of ReorderDeck Class --- #
-
-    # Determines the cards which need to be rescheduled by comparing their original and latest due_day
-    def determine_cards_with_only_different_new_due_day(self):
-
-        # Determines the new due_day from the attribute "cards_by_interval_by_due_day" modified by the algorithm
-        # Note: this method is inside another one because we want to avoid adding a new class attribute (arguable)
-        def determine_new_due_day_for_all_cards() -> Dict[Card, Due_Day]:
-            new_due_day_by_card: Dict[Card, Due_Day] = dict()
-            for interval in self.sequence_of_intervals:
-                for due_day in range1(1, interval):  # type: Due_Day
-                    for card_ in self.cards_target[interval][due_day]:
-                        new_due_day_by_card[card_] = due_day
-            return new_due_day_by_card
-
-        cards_with_new_due_day: Dict[Card, Due_Day] = determine_new_due_day_for_all_cards()
-        cards_with_only_different_new_due_day: Dict[Card, Due_Day_With_Origin] = dict()
-        for card in self.cards:
-            if self.due_day_original_by_card[card] != cards_with_new_due_day[card]:
-                cards_with_only_different_new_due_day[card] = Due_Day_With_Origin(
-                    cards_with_new_due_day[card] + self.day_of_today)
-        return cards_with_only_different_new_due_day
-
-    # --- Print Functions of ReorderDeck Class (they all return strings) --- #
-    # TODO: refactor (and maybe comment) them a bit
+    def _spinbox(value, tooltip):
+        spinbox = QSpinBox()
+        spinbox.setRange(1, MAX_POSSIBLE_VALUE_IN_RANGE)
+        spinbox.setValue(value)
+        spinbox.setSingleStep(1)
+        spinbox.setToolTip(tooltip)
+        return spinbox
 
     @staticmethod
-    def print_vars_obj(object) -> str:
-        return f"{object.__class__} : {str(vars(object))}"
-
-    def print_cards_by_interval(self) -> str:
-        text = "Nb of Cards for each interval"
-        for interval in self.sequence_of_intervals:
-            text += f"\n Nb of Cards for interval {interval} = "
-            text += f"{str(len(self.cards_by_interval[interval]))}"
-        return text
-
-    def print_cards_by_interval_by_due_day_original(self) -> str:
-        return self.print_cards_by_interval_by_due_day(self.cards_original)
-
-    def print_cards_by_interval_by_due_day_target(self) -> str:
-        return self.print_cards_by_interval_by_due_day(self.cards_original)
-
-    def print_cards_by_interval_by_due_day(self, cards: Dict[Interval, Dict[Due_Day, List]]) -> str:
-        text = "Nb of Cards for each interval and each due day"
-        for interval in self.sequence_of_intervals:
-            text += f"\n\n Nb of Cards for each due day in interval = {interval} "
-            text += f", (average = {self.average_number_of_cards_by_interval[interval]}) :"
-            for due_day in range1(1, interval):  # type: Due_Day
-                text += f"\n Nb of Cards for interval = {interval} and due day = {due_day} : "
-                text += f"{str(len(cards[interval][due_day]))}"
-        return text
+    def _label(text):
+        label = QLabel(text)
+        # label.setFixedWidth(70)
+        return label
 
-    def print_difference_original(self) -> str:
-        return self.print_difference(self.cards_original,
-                                     self.difference_to_average_original)
-
-    def print_difference_target(self) -> str:
-        return self.print_difference(self.cards_target,
-                                     self.difference_to_average_target)
-
-    def print_difference(self, cards: Dict[Interval, Dict[Due_Day, List[Card]]],
-                         differences: Dict[Interval, Dict[Due_Day, Difference]]) -> str:
-        text = "Computed difference of cards between current and average by interval and due_day"
-        for interval in self.sequence_of_intervals:
-            text += f"\n\n For interval = {interval}"
-            text += f", total_number = {len(self.cards_by_interval[interval])}"
-            text += f", average cards by day = {self.average_number_of_cards_by_interval[interval]} :"
-            # TODO: add average difference by day
-            for due_day in range1(1, interval):  # type: Due_Day
-                text += f"\n For interval '{interval}' and due_day '{due_day}'"
-                text += f", nb_of_cards = {len(cards[interval][due_day])}"
-                text += f", difference = {differences[interval][due_day]:2f}"
-        return text
+    # Widgets of the parameters (and OK button), which cannot be modified during an actual run
+    @abstractmethod
+    def _get_widgets_disabled_while_running(self) -> List[QWidget]:
+        ...
 
-    # TODO: REFACTOR
-    # TODO: DIFFERENTIATE TEXT IF RESCHEDULING PAST OVERDUE CARDS OR NOT
-    # Access to self.cards_with_only_different_new_due_day, self.due_day_original_by_card, self.max_interval,
-    # self.day_of_today, self.cards
-    def print_distribution_of_cards_rescheduled(self) -> str:
-
-        if len(self.cards_with_only_different_new_due_day) == 0:
-            return "Your deck doesn't need to be rescheduled. \n"
-
-        max_interval = RescheduleDeck.get_maximum_interval(self.sequence_of_intervals)
-        range_for_absolute_difference = range1(0, max_interval)
-        range_for_algebraic_difference = range1(-max_interval, max_interval)
-
-        cards_to_reschedule_by_absolute_diff: Dict[Diff_in_Due_Day, List[Card]] = RescheduleDeck. \
-            init_dict_of_cards(range_for_absolute_difference)
-
-        cards_to_reschedule_by_algebraic_diff: Dict[Diff_in_Due_Day, List[Card]] = RescheduleDeck. \
-            init_dict_of_cards(range_for_algebraic_difference)
-        for card in self.cards_with_only_different_new_due_day:
-            original_due_day: Due_Day = self.due_day_original_by_card[card]
-            new_due_day: Due_Day = Due_Day(self.cards_with_only_different_new_due_day[card] - self.day_of_today)
-            absolute_difference = abs(new_due_day - original_due_day)
-            algebraic_difference = (new_due_day - original_due_day)
-            assert absolute_difference > 0
-            cards_to_reschedule_by_absolute_diff[Diff_in_Due_Day(absolute_difference)].append(card)
-            cards_to_reschedule_by_algebraic_diff[Diff_in_Due_Day(algebraic_difference)].append(card)
-
-        total_amount_of_rescheduling: Nb_of_Cards = Nb_of_Cards(0)
-        for diff_in_due_day_ in range_for_absolute_difference:  # type: Diff_in_Due_Day
-            total_amount_of_rescheduling += diff_in_due_day_ * len(
-                cards_to_reschedule_by_absolute_diff[diff_in_due_day_])
-        average_amount_of_rescheduling = total_amount_of_rescheduling / len(self.cards_with_only_different_new_due_day)
-        average_amount_of_rescheduling = round(average_amount_of_rescheduling * 100) / 100
-        percentage_of_card_rescheduled = round(
-            len(self.cards_with_only_different_new_due_day) / len(self.cards) * 100 * 100) / 100
-
-        total_amount_of_push_forward: Nb_of_Cards = Nb_of_Cards(0)
-        for diff_in_due_day__ in range_for_algebraic_difference:  # type: Diff_in_Due_Day
-            total_amount_of_push_forward += diff_in_due_day__ * len(
-                cards_to_reschedule_by_algebraic_diff[diff_in_due_day__])
-        average_amount_of_push_forward = total_amount_of_push_forward / len(self.cards_with_only_different_new_due_day)
-        average_amount_of_push_forward = round(average_amount_of_push_forward * 100) / 100
-        average_amount_of_all_push_forward = total_amount_of_push_forward / len(self.cards)
-        average_amount_of_all_push_forward = round(average_amount_of_all_push_forward * 100) / 100
-
-        # self.show_deck_info(self.deck)
-        # parent_decks: List[DeckDict] = mw.col.decks.parents_by_name(self.deck["name"])
-        # text_for_deck_parents = f"\n Parents decks for current deck  = "
-        # text_for_deck_parents += f"{[deck['name'] for deck in parent_decks]}"
-        # showInfo(text_for_deck_parents)
-
-        text = "Distribution of cards to reschedule : "
-        text += f"\n Today's date for current deck = {self.retrieve_date_of_today(self.deck)}"
-        text += f"\n    Nb of cards overdue (in review status / queue = 2 and type = 2) = {self.number_of_cards_overdue_only_for_reviews_queue_2}"
-        # text += f"\n    Nb of cards overdue (in learning status with original_due < 1 day / queue = 1) = {self.number_of_cards_overdue_only_for_learning_queue_1}"
-        # text += f"\n    Nb of cards overdue (in learning status with original_due > 1 day / queue = 3) = {self.number_of_cards_overdue_only_for_learning_queue_3}"
-        # text += f"\n    Nb of cards overdue (in buried status / queue = - 3) = {self.number_of_cards_overdue_only_for_buried_queue_minus_3}"
-        text += f"\n    Nb of cards over-scheduled (in review status with due date > interval) = {self.number_of_cards_over_scheduled}"
-        text += f"\n Nb of cards in deck in review status and in the required interval range = {len(self.cards)}"
-        text += f"\n Nb of cards to reschedule = {len(self.cards_with_only_different_new_due_day)}"
-        text += f"\n    Percentage of cards to reschedule = {percentage_of_card_rescheduled}%"
-        text += f"\n    Average amount by which cards are rescheduled (absolute difference among rescheduled cards)"
-        text += f" = {average_amount_of_rescheduling} days"
-        text += f"\n    Average amount by which cards are pushed forward (algebraic difference among rescheduled cards)"
-        text += f" = {average_amount_of_push_forward} days"
-        text += f"\n    Average amount by which all cards are pushed forward (algebraic difference among all cards)"
-        text += f" = {average_amount_of_all_push_forward} days"
-        max_nb_of_lines_printed_for_cards_rescheduled = 5
-        for diff_in_due_day in range_for_absolute_difference:  # type: Diff_in_Due_Day
-            iteration = 1
-            if len(cards_to_reschedule_by_absolute_diff[diff_in_due_day]) > 0:
-                if iteration == max_nb_of_lines_printed_for_cards_rescheduled:
-                    text += f"\n       Amount of cards to reschedule by more than +- {diff_in_due_day} days : "
-                    nb_of_cards = 0
-                    for diff_in_due_day_2 in range1(diff_in_due_day, max_interval):  # type: Diff_in_Due_Day
-                        nb_of_cards += len(
-                            cards_to_reschedule_by_absolute_diff[diff_in_due_day_2])
-                    text += f"{nb_of_cards}"
-                    break
-                else:
-                    text += f"\n       Amount of cards to reschedule by +- {diff_in_due_day} days : "
-                    text += f"{len(cards_to_reschedule_by_absolute_diff[diff_in_due_day])}"
-                    iteration += 1
-        text += f"\n\n Iterations of main algorithm : "
-        total_iterations = 0
-        # TODO : Only keep the top 5 nbs of iterations
-        for interval in self.sequence_of_intervals:
-            total_iterations += self.number_of_iterations_of_main_algorithm[interval]
-            if self.number_of_iterations_of_main_algorithm[interval] > 10:
-                text += f"\n    For interval = {interval}, nb of iterations = "
-                text += f"{self.number_of_iterations_of_main_algorithm[interval]}"
-        text += f"\n Total number of iterations of main algorithm : {total_iterations}"
-
-        text += f"\n"
-        return text
+    # The parameters given to "task" must be copies, as they must not change while the algorithm runs
+    # "task" is executed in the background thread : NO access to the widgets (the progress is sent by _show_progress)
+    # and returns None if the user stopped the rescheduling. "on_done" is executed in the main thread once "task" is
+    # finished, with its future (whose result re-raises in the main thread the exception of the background thread)
+    def _run_in_background(self, task: Callable[[], Any], on_done: Callable[[Future], None], number_of_steps: int,
+                           is_widgets_disabled: bool = True) -> None:
+        self._set_running(True, is_widgets_disabled, number_of_steps)
 
-    def show_both_original_and_target_cards_by_interval_by_due_day(self):
-        showInfo(self.print_cards_by_interval_by_due_day_original())
-        showInfo(self.print_cards_by_interval_by_due_day_target())
+        def on_done_in_main_thread(future: Future) -> None:
+            self._set_running(False, is_widgets_disabled)
+            on_done(future)
 
-    def show_both_original_and_target_difference(self):
-        showInfo(self.print_difference_original())
-        showInfo(self.print_difference_target())
+        mw.taskman.run_in_background(task, on_done_in_main_thread)
 
-    @staticmethod
-    def show_card_and_note_info(card: Card):
-        showInfo(RescheduleDeck.print_vars_obj(card))
-        showInfo(RescheduleDeck.print_vars_obj(card.note()))
+    # Called by the background thread
+    def _show_progress(self, number_of_steps_done: int) -> None:
+        mw.taskman.run_on_main(lambda: self._progress_bar.setValue(number_of_steps_done))
 
-    @staticmethod
-    def show_deck_info(deck: DeckDict):
-        showInfo(f"Deck = {deck} ")
+    # The background thread stops after the step being done, without modifying any card
+    def _stop_algorithm(self):
+        if self.is_running:
+            self.is_stop_requested = True
 
+    # Closing the dialog also stops the rescheduling
+    def reject(self):
+        self._stop_algorithm()
+        super().reject()
 
-# --- END of ReorderDeck Class --- #
+    def _set_running(self, is_running: bool, is_widgets_disabled: bool, number_of_steps: int = 0) -> None:
+        self.is_running = is_running
+        self.is_stop_requested = False
+        if is_running:
+            self._progress_bar.setRange(0, number_of_steps)
+            self._progress_bar.setValue(0)
+        if is_widgets_disabled:
+            for widget in self._get_widgets_disabled_while_running():
+                widget.setEnabled(not is_running)
+        self._progress_bar.setVisible(is_running)
+        self._button_stop.setVisible(is_running)
 
 
-# Horizontal separation line
-class QHSeparationLine(QFrame):
-    def __init__(self):
-        super().__init__()
-        self.setMinimumWidth(1)
-        self.setFixedHeight(20)
-        self.setFrameShape(QFrame.HLine)
-        self.setFrameShadow(QFrame.Sunken)
-        self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Minimum)
+# --- END of DialogWithBackgroundRescheduling Class --- #
 
 
 # --- BEGINNING of DialogRescheduleDeck Class --- #
@@ -901,15 +177,31 @@ class QHSeparationLine(QFrame):
 
 # TODO: ADD comment
 # TODO: automatically resize and recenter window when printed text is modified
-class DialogRescheduleDeck(QDialog):
+class DialogRescheduleDeck(DialogWithBackgroundRescheduling):
     deck_name: str
     min_interval: int
     max_interval: int
     is_reschedule_overdue_cards: bool
+    is_balanced_by_review_time: bool
     is_dry_run: bool
+    # Only a running preview can be stopped by a new preview (never an actual run)
+    is_preview_running: bool = False
+    # Started by the main thread once the running rescheduling is finished
+    pending_action: Optional[Callable[[], None]] = None
+    # Caches of the previews (and of the actual runs) : the snapshots of the decks, and the results of the intervals
+    # already balanced for a deck (with or without the overdue cards, by number of cards or by review time), which do
+    # not need to be balanced again
+    snapshot_by_deck_name: Dict[str, DeckSnapshot]
+    results_of_intervals: Dict[Tuple[str, bool, bool], Dict[Interval, IntervalResult]]
+    last_previewed_parameters: Optional[ReschedulingParameters] = None
+    # Results of the previous runs (even before Anki was restarted), found by the fingerprint of the deck
+    result_cache: PersistentResultCache
+    # Displayed information of the last run (the performance details are only displayed if asked)
+    last_report: str = ""
+    last_instrumentation: Optional[Instrumentation] = None
 
     def __init__(self, parent=mw):
-        super(DialogRescheduleDeck, self).__init__(parent)
+        super(DialogRescheduleDeck, self).__init__(parent, "%v / %m intervals balanced")
 
         self.setWindowTitle("Reschedule Deck")
         self.setWindowFlags(Qt.Dialog | Qt.MSWindowsFixedSizeDialogHint)
@@ -933,10 +225,21 @@ class DialogRescheduleDeck(QDialog):
         self._box_is_reschedule_overdue_cards.setChecked(DEFAULT_RESCHEDULE_OVERDUE_CARDS)
         self._box_is_reschedule_overdue_cards.stateChanged.connect(self._changed)
 
+        self._box_is_balanced_by_review_time = QCheckBox()
+        self._box_is_balanced_by_review_time.setChecked(DEFAULT_BALANCE_BY_REVIEW_TIME)
+        self._box_is_balanced_by_review_time.setToolTip(
+            "Balances the estimated review time of each day (median answer time of each card) instead of the number"
+            " of cards")
+        self._box_is_balanced_by_review_time.stateChanged.connect(self._changed)
+
         self._box_is_dry_run = QCheckBox()
         self._box_is_dry_run.setChecked(DEFAULT_DRY_RUN)
         self._box_is_dry_run.stateChanged.connect(self._changed)
 
+        self._box_is_show_performance_details = QCheckBox()
+        self._box_is_show_performance_details.setChecked(DEFAULT_SHOW_PERFORMANCE_DETAILS)
+        self._box_is_show_performance_details.stateChanged.connect(self._show_rescheduling_information)
+
         self._label_parameters_summary = QLabel()
         self._label_parameters_summary.setWordWrap(True)
 
@@ -947,16 +250,31 @@ class DialogRescheduleDeck(QDialog):
                            ", this will only display a preview of the schedule performed. Disable dry-run to actually reschedule cards.</font>"
         self._label_warning_dry_run = QLabel(text_for_dry_run)
         self._label_warning_dry_run.setWordWrap(True)
-        text_for_actual_run = "\n<font color=red>dry-run disactivated : the deck will be rescheduled - THIS ACTION CANNOT BE UNDONE.</font>"
+        text_for_actual_run = "\n<font color=red>dry-run disactivated : the deck will be rescheduled" \
+                              f" - this can only be undone with Tools > {NAME_OF_UNDO_ACTION}" \
+                              " (for the cards not reviewed since).</font>"
         self._label_warning_actual_run = QLabel(text_for_actual_run)
         self._label_warning_actual_run.setWordWrap(True)
 
+        self.snapshot_by_deck_name = dict()
+        self.results_of_intervals = dict()
+        self.result_cache = PersistentResultCache(get_result_cache_folder(), MAX_NUMBER_OF_ENTRIES_IN_RESULT_CACHE,
+                                                  MAX_SIZE_OF_RESULT_CACHE_IN_BYTES)
+        self._timer_preview = QTimer(self)
+        self._timer_preview.setSingleShot(True)
+        self._timer_preview.setInterval(DELAY_BEFORE_PREVIEW_IN_MILLISECONDS)
+        self._timer_preview.timeout.connect(self._run_preview)
+
         # First initialization of internal variables (for use outside)
         self._changed()
 
-        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-        button_box.accepted.connect(self._run_algorithm)
-        button_box.rejected.connect(self.reject)
+        self._button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self._button_box.accepted.connect(self._run_algorithm)
+        self._button_box.rejected.connect(self.reject)
+        self._button_export_performance_details = QPushButton("Export performance details")
+        self._button_export_performance_details.clicked.connect(self._export_performance_details)
+        self._button_export_performance_details.setEnabled(False)
+        self._button_box.addButton(self._button_export_performance_details, QDialogButtonBox.ActionRole)
 
         layout = QGridLayout()
         layout.addWidget(self._label('Deck: '), 0, 0)
@@ -967,34 +285,25 @@ class DialogRescheduleDeck(QDialog):
         layout.addWidget(self._box_max_interval, 2, 1)
         layout.addWidget(self._label('Reschedule overdue cards: '), 3, 0)
         layout.addWidget(self._box_is_reschedule_overdue_cards, 3, 1)
-        layout.addWidget(self._label('Dry-run (do not actually reschedule): '), 4, 0)
-        layout.addWidget(self._box_is_dry_run, 4, 1)
-
-        layout.addWidget(QHSeparationLine(), 5, 0, 1, 2)
-        layout.addWidget(self._label_parameters_summary, 6, 0, 1, 2)
-        layout.addWidget(self._label_rescheduling_information, 7, 0, 1, 2)
-
-        layout.addWidget(self._label_warning_dry_run, 8, 0, 1, 2)
-        layout.addWidget(self._label_warning_actual_run, 8, 0, 1, 2)
-        layout.addWidget(QHSeparationLine(), 10, 0, 1, 2)
-        layout.addWidget(button_box, 11, 0, 1, 2)
+        layout.addWidget(self._label('Balance by estimated review time: '), 4, 0)
+        layout.addWidget(self._box_is_balanced_by_review_time, 4, 1)
+        layout.addWidget(self._label('Dry-run (do not actually reschedule): '), 5, 0)
+        layout.addWidget(self._box_is_dry_run, 5, 1)
+        layout.addWidget(self._label('Show performance details: '), 6, 0)
+        layout.addWidget(self._box_is_show_performance_details, 6, 1)
+
+        layout.addWidget(QHSeparationLine(), 7, 0, 1, 2)
+        layout.addWidget(self._label_parameters_summary, 8, 0, 1, 2)
+        layout.addWidget(self._label_rescheduling_information, 9, 0, 1, 2)
+
+        layout.addWidget(self._label_warning_dry_run, 10, 0, 1, 2)
+        layout.addWidget(self._label_warning_actual_run, 10, 0, 1, 2)
+        layout.addWidget(self._progress_bar, 11, 0)
+        layout.addWidget(self._button_stop, 11, 1)
+        layout.addWidget(QHSeparationLine(), 12, 0, 1, 2)
+        layout.addWidget(self._button_box, 13, 0, 1, 2)
         self.setLayout(layout)
 
-    @staticmethod
-    def _spinbox(value, tooltip):
-        spinbox = QSpinBox()
-        spinbox.setRange(1, MAX_POSSIBLE_VALUE_IN_RANGE)
-        spinbox.setValue(value)
-        spinbox.setSingleStep(1)
-        spinbox.setToolTip(tooltip)
-        return spinbox
-
-    @staticmethod
-    def _label(text):
-        label = QLabel(text)
-        # label.setFixedWidth(70)
-        return label
-
     def _changed(self):
         # If state changed, update internal variables
         self.deck_name = self._box_deck_chooser.currentText()
@@ -1002,6 +311,7 @@ class DialogRescheduleDeck(QDialog):
         self.max_interval = self._box_max_interval.value()
         self.is_dry_run = self._box_is_dry_run.isChecked()
         self.is_reschedule_overdue_cards = self._box_is_reschedule_overdue_cards.isChecked()
+        self.is_balanced_by_review_time = self._box_is_balanced_by_review_time.isChecked()
 
         # If state changed, update displayed text
         self._label_parameters_summary.setText(self._print_parameters())
@@ -1012,58 +322,561 @@ class DialogRescheduleDeck(QDialog):
             self._label_warning_dry_run.hide()
             self._label_warning_actual_run.show()
 
+        # The preview is only computed once the parameters stop changing (the timer is restarted at each change)
+        self._timer_preview.start()
+
+    def _get_parameters(self) -> ReschedulingParameters:
+        return ReschedulingParameters(self.deck_name, self.min_interval, self.max_interval,
+                                      self.is_reschedule_overdue_cards, self.is_balanced_by_review_time)
+
     def _print_parameters(self) -> str:
         text = f"Deck = {self.deck_name}"
         text += f"\nRange = {range1(self.min_interval, self.max_interval)}"
         text += f"\nIs dry-run = {self.is_dry_run}"
         text += f"\nIs reschedule overdue cards = {self.is_reschedule_overdue_cards}"
+        text += f"\nIs balanced by estimated review time = {self.is_balanced_by_review_time}"
         return text
 
     def _run_algorithm(self):
-        deck: DeckDict = get_deck(self.deck_name)
-        cards: List[Card] = get_cards(self.deck_name)
-        range_of_intervals = range1(self.min_interval, self.max_interval)
+        # No preview must start (and stop the actual run) once the user asked for the actual run
+        self._timer_preview.stop()
+        if self.is_running:
+            # A preview is running (the widgets are disabled during an actual run) : it is stopped first
+            self._stop_algorithm()
+            self.pending_action = self._run_algorithm
+            return
+        self._start_rescheduling(is_preview=False)
+
+    def _run_preview(self):
+        if (self.is_running and not self.is_preview_running) or self.pending_action == self._run_algorithm:
+            # An actual run is running or about to start (once the running preview is stopped) : it is never stopped
+            # or replaced by a preview
+            return
+        if self.is_running:
+            # The running preview is outdated : a new one is started once it is stopped
+            self._stop_algorithm()
+            self.pending_action = self._run_preview
+            return
+        if self._get_parameters() != self.last_previewed_parameters:
+            self._start_rescheduling(is_preview=True)
+
+    def _start_rescheduling(self, is_preview: bool) -> None:
+        if not is_preview:
+            self._timer_preview.stop()
+        parameters = self._get_parameters()
+        is_dry_run = is_preview or self.is_dry_run
+        # A deck which did not change since a previous run with the same parameters is not rescheduled again
+        instrumentation = Instrumentation()
+        with instrumentation.measure("result cache lookup"):
+            fingerprint = get_fingerprint_of_rescheduling(parameters)
+            cached_rescheduling: Optional[CachedRescheduling] = self.result_cache.get(fingerprint)
+        if cached_rescheduling is not None:
+            self._show_and_apply_plan(cached_rescheduling.statistics, cached_rescheduling.cards_with_new_due_day,
+                                      instrumentation, parameters, is_preview, is_dry_run)
+            return
+        # Only the background thread uses those copies of the caches
+        snapshot: Optional[DeckSnapshot] = self.snapshot_by_deck_name.get(parameters.deck_name)
+        known_results: List[IntervalResult] = list(self.results_of_intervals.get(
+            (parameters.deck_name, parameters.is_reschedule_overdue_cards, parameters.is_balanced_by_review_time),
+            dict()).values())
+
+        # The long intervals are balanced by bands : one step of the progress bar for each band
+        range_of_intervals = range1(parameters.min_interval, parameters.max_interval)
+        # During a preview, the parameters can be modified (the preview is simply restarted)
+        self.is_preview_running = is_preview
+        self._run_in_background(
+            lambda: self._reschedule_in_background(parameters, snapshot, known_results, instrumentation),
+            lambda future: self._on_rescheduling_done(future, parameters, fingerprint, is_preview, is_dry_run),
+            number_of_steps=len(get_bands_of_intervals(range_of_intervals)), is_widgets_disabled=not is_preview)
+
+    # The deck is only loaded if it has no snapshot yet, and the intervals with a known result are not balanced again
+    # Returns None if the user stopped the rescheduling, else also the results of the newly balanced intervals
+    def _reschedule_in_background(self, parameters: ReschedulingParameters, snapshot: Optional[DeckSnapshot],
+                                  known_results: List[IntervalResult], instrumentation: Instrumentation) \
+            -> Optional[Tuple[DeckSnapshot, RescheduleDeck, List[IntervalResult]]]:
+        if snapshot is None:
+            with instrumentation.measure("card loading") as phase:
+                snapshot = DeckSnapshot(get_deck(parameters.deck_name), get_card_records(parameters.deck_name))
+                phase.number_of_cards_touched = len(snapshot.cards)
+        if parameters.is_balanced_by_review_time and snapshot.review_time_by_card is None:
+            with instrumentation.measure("answer time loading") as phase:
+                snapshot = snapshot._replace(review_time_by_card=get_median_answer_time_by_card(parameters.deck_name))
+                phase.number_of_cards_touched = len(snapshot.review_time_by_card)
+        range_of_intervals = range1(parameters.min_interval, parameters.max_interval)
+        reorder_deck = RescheduleDeck(snapshot.deck, snapshot.cards, range_of_intervals,
+                                      parameters.is_reschedule_overdue_cards, instrumentation,
+                                      snapshot.review_time_by_card if parameters.is_balanced_by_review_time else None)
+        with instrumentation.measure("reuse of the intervals already balanced",
+                                     sum(len(result.card_ids) for result in known_results)):
+            reorder_deck.reuse_results_of_intervals(known_results)
+        nb_of_reused_intervals = len(reorder_deck.sequence_of_intervals) - len(reorder_deck.intervals_to_balance)
+        self._show_progress(nb_of_reused_intervals)
+        for nb_of_balanced_intervals, _ in enumerate(reorder_deck.iterate_rescheduling_by_interval(),
+                                                     start=nb_of_reused_intervals + 1):
+            if self.is_stop_requested:
+                return None
+            self._show_progress(nb_of_balanced_intervals)
+        new_results = [reorder_deck.get_result_of_interval(interval) for interval in reorder_deck.intervals_to_balance]
+        return snapshot, reorder_deck, new_results
+
+    def _on_rescheduling_done(self, future: Future, parameters: ReschedulingParameters, fingerprint: str,
+                              is_preview: bool, is_dry_run: bool) -> None:
+        self.is_preview_running = False
+        pending_action, self.pending_action = self.pending_action, None
+        try:
+            result: Optional[Tuple[DeckSnapshot, RescheduleDeck, List[IntervalResult]]] = future.result()
+            if result is None:
+                if not is_preview:
+                    self.last_report = "Rescheduling stopped : no card was modified"
+                    self.last_instrumentation = None
+                    self._show_rescheduling_information()
+                return
+            self._show_and_apply_rescheduling(*result, parameters, fingerprint, is_preview, is_dry_run)
+        finally:
+            if pending_action is not None:
+                pending_action()
+
+    def _show_and_apply_rescheduling(self, snapshot: DeckSnapshot, reorder_deck: RescheduleDeck,
+                                     new_results: List[IntervalResult], parameters: ReschedulingParameters,
+                                     fingerprint: str, is_preview: bool, is_dry_run: bool) -> None:
+        # Saves the snapshot and the results of the newly balanced intervals for the next previews
+        self.snapshot_by_deck_name[parameters.deck_name] = snapshot
+        results = self.results_of_intervals.setdefault(
+            (parameters.deck_name, parameters.is_reschedule_overdue_cards, parameters.is_balanced_by_review_time),
+            dict())
+        for result in new_results:
+            results[result.interval] = result
+        statistics = reorder_deck.get_statistics()
+        with reorder_deck.instrumentation.measure("result cache write"):
+            self.result_cache.put(fingerprint, CachedRescheduling(
+                statistics, reorder_deck.cards_with_only_different_new_due_day))
+        self._show_and_apply_plan(statistics, reorder_deck.cards_with_only_different_new_due_day,
+                                  reorder_deck.instrumentation, parameters, is_preview, is_dry_run)
+
+    # The plan comes either from a run of the algorithm or from the result cache
+    def _show_and_apply_plan(self, statistics: ReschedulingStatistics, cards_to_reschedule: Dict[CardId, int],
+                             instrumentation: Instrumentation, parameters: ReschedulingParameters, is_preview: bool,
+                             is_dry_run: bool) -> None:
+        if is_preview:
+            self.last_previewed_parameters = parameters
 
         # TODO: fine-tune how information is displayed
-        reorder_deck = RescheduleDeck(deck, cards, range_of_intervals, self.is_reschedule_overdue_cards)
-        self._label_rescheduling_information.setText(reorder_deck.print_distribution_of_cards_rescheduled())
-        if not self.is_dry_run:
+        self.last_report = statistics.print_statistics()
+        self.last_instrumentation = instrumentation
+        self._show_rescheduling_information()
+        if not is_dry_run:
             # TODO: Add a confirmation pop-up
             # Reschedule cards
-            reschedule_cards_in_database(reorder_deck.cards_with_only_different_new_due_day)
+            with instrumentation.measure("database write", len(cards_to_reschedule)):
+                nb_of_rescheduled_cards = reschedule_cards_in_database(cards_to_reschedule,
+                                                                       f"Deck '{parameters.deck_name}'")
+                if IS_AUTO_REBALANCING_ENABLED:
+                    remember_decks_for_auto_rebalancing([parameters.deck_name], parameters.min_interval,
+                                                        parameters.max_interval)
+            self._show_rescheduling_information()
+            mw.reset()
+            # The cards of the deck changed : the caches are outdated
+            self.snapshot_by_deck_name.clear()
+            self.results_of_intervals.clear()
+            # (the report of the actual run stays displayed until the parameters are modified)
+            self.last_previewed_parameters = parameters
             # Resets "dry-run" CheckBox to its default value
             self._box_is_dry_run.setChecked(DEFAULT_DRY_RUN)
             # Show a Success pop-up
-            showInfo(f"The cards in the deck ''{self.deck_name}'' have been successfully rescheduled")
-            # Restart reschedule to verify everything is okay and print "okay" message
-            reschedule_cards_in_database(reorder_deck.cards_with_only_different_new_due_day)
+            text = f"The cards in the deck ''{parameters.deck_name}'' have been successfully rescheduled"
+            text += f" ({nb_of_rescheduled_cards} cards modified)"
+            showInfo(text)
+
+    def _show_rescheduling_information(self) -> None:
+        text = self.last_report
+        if self._box_is_show_performance_details.isChecked() and self.last_instrumentation is not None:
+            text += "\n" + self.last_instrumentation.print_phases()
+        self._label_rescheduling_information.setText(text)
+        self._button_export_performance_details.setEnabled(self.last_instrumentation is not None)
+
+    def _export_performance_details(self) -> None:
+        if self.last_instrumentation is None:
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export performance details",
+                                                   "reschedule_deck_performance.json", "JSON (*.json)")
+        if file_name:
+            with open(file_name, "w") as file:
+                file.write(self.last_instrumentation.to_json())
+
+    def reject(self):
+        self._timer_preview.stop()
+        self.pending_action = None
+        super().reject()
+
+    def _get_widgets_disabled_while_running(self) -> List[QWidget]:
+        return [self._box_deck_chooser, self._box_min_interval, self._box_max_interval,
+                self._box_is_reschedule_overdue_cards, self._box_is_balanced_by_review_time, self._box_is_dry_run,
+                self._button_box.button(QDialogButtonBox.Ok)]
 
 
 # --- END of DialogRescheduleDeck Class --- #
 
 
-# --- GLOBAL FUNCTIONS ---#
+# --- BEGINNING of DialogRescheduleDecksInBatch Class --- #
 
 
-def range1(start, end):
-    return range(start, end + 1)
+# Reschedules at once all the decks matching a list of names or patterns : their review cards are loaded with a single
+# query, each deck is balanced independently (in parallel if PARALLEL_BALANCING_MODE is set), then all the new due days
+# are written with a single transaction
+class DialogRescheduleDecksInBatch(DialogWithBackgroundRescheduling):
+    deck_names: List[str]
+    min_interval: int
+    max_interval: int
+    is_reschedule_overdue_cards: bool
+    is_dry_run: bool
+
+    def __init__(self, parent=mw):
+        super(DialogRescheduleDecksInBatch, self).__init__(parent, "%v / %m decks balanced")
+
+        self.setWindowTitle("Reschedule Decks in Batch")
+        self.setWindowFlags(Qt.Dialog | Qt.MSWindowsFixedSizeDialogHint)
+
+        self._box_patterns = QLineEdit(DEFAULT_PATTERN_OF_DECKS_IN_BATCH)
+        self._box_patterns.setToolTip("Names of decks or patterns (with * and ?), separated by commas")
+        self._box_patterns.textChanged.connect(self._changed)
+
+        hint_text_for_min_interval = f"1 is the minimum possible value (can go up to {MAX_POSSIBLE_VALUE_IN_RANGE})"
+        self._box_min_interval = self._spinbox(DEFAULT_MIN_VALUE_IN_RANGE, hint_text_for_min_interval)
+        self._box_min_interval.valueChanged.connect(self._changed)
+
+        hint_text_for_max_interval = f"Default max value (can go up to {MAX_POSSIBLE_VALUE_IN_RANGE})"
+        self._box_max_interval = self._spinbox(DEFAULT_MAX_VALUE_IN_RANGE, hint_text_for_max_interval)
+        self._box_max_interval.valueChanged.connect(self._changed)
+
+        self._box_is_reschedule_overdue_cards = QCheckBox()
+        self._box_is_reschedule_overdue_cards.setChecked(DEFAULT_RESCHEDULE_OVERDUE_CARDS)
+        self._box_is_reschedule_overdue_cards.stateChanged.connect(self._changed)
+
+        self._box_is_dry_run = QCheckBox()
+        self._box_is_dry_run.setChecked(DEFAULT_DRY_RUN)
+        self._box_is_dry_run.stateChanged.connect(self._changed)
+
+        self._label_parameters_summary = QLabel()
+        self._label_parameters_summary.setWordWrap(True)
+
+        self._label_rescheduling_information = QLabel()
+        self._label_rescheduling_information.setWordWrap(True)
+
+        # First initialization of internal variables (for use outside)
+        self._changed()
 
+        self._button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self._button_box.accepted.connect(self._run_algorithm)
+        self._button_box.rejected.connect(self.reject)
 
-def get_cards(deckname: str) -> List[Card]:
+        layout = QGridLayout()
+        layout.addWidget(self._label('Decks: '), 0, 0)
+        layout.addWidget(self._box_patterns, 0, 1)
+        layout.addWidget(self._label('Minimum interval: '), 1, 0)
+        layout.addWidget(self._box_min_interval, 1, 1)
+        layout.addWidget(self._label('Maximum interval: '), 2, 0)
+        layout.addWidget(self._box_max_interval, 2, 1)
+        layout.addWidget(self._label('Reschedule overdue cards: '), 3, 0)
+        layout.addWidget(self._box_is_reschedule_overdue_cards, 3, 1)
+        layout.addWidget(self._label('Dry-run (do not actually reschedule): '), 4, 0)
+        layout.addWidget(self._box_is_dry_run, 4, 1)
+
+        layout.addWidget(QHSeparationLine(), 5, 0, 1, 2)
+        layout.addWidget(self._label_parameters_summary, 6, 0, 1, 2)
+        layout.addWidget(self._label_rescheduling_information, 7, 0, 1, 2)
+        layout.addWidget(self._progress_bar, 8, 0)
+        layout.addWidget(self._button_stop, 8, 1)
+        layout.addWidget(QHSeparationLine(), 9, 0, 1, 2)
+        layout.addWidget(self._button_box, 10, 0, 1, 2)
+        self.setLayout(layout)
+
+    def _changed(self):
+        self.deck_names = get_names_of_decks_matching(self._box_patterns.text())
+        self.min_interval = self._box_min_interval.value()
+        self.max_interval = self._box_max_interval.value()
+        self.is_dry_run = self._box_is_dry_run.isChecked()
+        self.is_reschedule_overdue_cards = self._box_is_reschedule_overdue_cards.isChecked()
+        self._label_parameters_summary.setText(self._print_parameters())
+
+    def _print_parameters(self) -> str:
+        text = f"Decks ({len(self.deck_names)}) = {', '.join(self.deck_names)}"
+        text += f"\nRange = {range1(self.min_interval, self.max_interval)}"
+        text += f"\nIs dry-run = {self.is_dry_run}"
+        text += f"\nIs reschedule overdue cards = {self.is_reschedule_overdue_cards}"
+        return text
+
+    def _run_algorithm(self):
+        if self.is_running or len(self.deck_names) == 0:
+            return
+        deck_names = list(self.deck_names)
+        range_of_intervals = range1(self.min_interval, self.max_interval)
+        is_reschedule_overdue_cards = self.is_reschedule_overdue_cards
+        is_dry_run = self.is_dry_run
+
+        self._run_in_background(
+            lambda: self._reschedule_in_background(deck_names, range_of_intervals, is_reschedule_overdue_cards),
+            lambda future: self._on_rescheduling_done(future, is_dry_run), number_of_steps=len(deck_names))
+
+    def _reschedule_in_background(self, deck_names: List[str], range_of_intervals: Sequence[int],
+                                  is_reschedule_overdue_cards: bool) -> Optional[List[DeckResult]]:
+        cards_by_deck_name: Dict[str, CardColumns] = get_review_card_records_of_decks(deck_names)
+        work_units: List[DeckWorkUnit] = [
+            DeckWorkUnit(deck_name, get_deck(deck_name), cards_by_deck_name[deck_name], list(range_of_intervals),
+                         is_reschedule_overdue_cards, get_balancing_modes())
+            for deck_name in deck_names]
+        results: List[DeckResult] = list()
+        for result in balance_decks(work_units):
+            if self.is_stop_requested:
+                return None
+            results.append(result)
+            self._show_progress(len(results))
+        return results
+
+    def _on_rescheduling_done(self, future: Future, is_dry_run: bool) -> None:
+        results: Optional[List[DeckResult]] = future.result()
+        if results is None:
+            self._label_rescheduling_information.setText("Rescheduling stopped : no card was modified")
+            return
+
+        self._label_rescheduling_information.setText(print_summary_of_batch(results))
+        if not is_dry_run:
+            # The cards of all the decks are written at once (= a single transaction and a single undo checkpoint)
+            cards_with_new_due_day: Dict[CardId, int] = dict()
+            for result in results:
+                cards_with_new_due_day.update(result.cards_with_new_due_day)
+            nb_of_rescheduled_cards = reschedule_cards_in_database(cards_with_new_due_day,
+                                                                   f"{len(results)} decks in batch")
+            if IS_AUTO_REBALANCING_ENABLED:
+                remember_decks_for_auto_rebalancing([result.deck_name for result in results], self.min_interval,
+                                                    self.max_interval)
+            mw.reset()
+            # Resets "dry-run" CheckBox to its default value
+            self._box_is_dry_run.setChecked(DEFAULT_DRY_RUN)
+            # Show a Success pop-up
+            text = f"{len(results)} decks have been successfully rescheduled"
+            text += f" ({nb_of_rescheduled_cards} cards modified)"
+            showInfo(text)
+
+    def _get_widgets_disabled_while_running(self) -> List[QWidget]:
+        return [self._box_patterns, self._box_min_interval, self._box_max_interval,
+                self._box_is_reschedule_overdue_cards, self._box_is_dry_run,
+                self._button_box.button(QDialogButtonBox.Ok)]
+
+
+# --- END of DialogRescheduleDecksInBatch Class --- #
+
+
+# --- GLOBAL FUNCTIONS ---#
+
+
+# Loads in a single query the columns needed by RescheduleDeck for all the cards of the deck and its children
+def get_card_records(deckname: str) -> CardColumns:
     deck_id: DeckId = mw.col.decks.id_for_name(deckname)
-    card_ids: List[CardId] = mw.col.decks.cids(deck_id, children=True)
-    return [mw.col.get_card(card_id) for card_id in card_ids]
+    deck_ids: List[DeckId] = mw.col.decks.deck_and_child_ids(deck_id)
+    rows = mw.col.db.all(f"select id, ivl, due, queue, type from cards where did in {ids2str(deck_ids)}")
+    return CardColumns(rows)
 
 
 def get_deck(deckname: str) -> DeckDict:
     return mw.col.decks.by_name(deckname)
 
 
-def reschedule_cards_in_database(cards_with_new_due_day: Dict[Card, int]) -> None:
-    for card in cards_with_new_due_day:
-        card.due = cards_with_new_due_day[card]
-        card.flush()
-    pass
+# A single aggregated query : any review, edit or (re)scheduling of a card updates its "mod", any deletion or addition
+# changes the number of cards
+def get_fingerprint_of_rescheduling(parameters: ReschedulingParameters) -> str:
+    deck = get_deck(parameters.deck_name)
+    deck_ids: List[DeckId] = mw.col.decks.deck_and_child_ids(deck["id"])
+    max_modification_time, number_of_cards = mw.col.db.first(
+        f"select max(mod), count() from cards where did in {ids2str(deck_ids)}")
+    return new_fingerprint_of_rescheduling(deck["id"], RescheduleDeck.retrieve_date_of_today(deck),
+                                           parameters.min_interval, parameters.max_interval,
+                                           parameters.is_reschedule_overdue_cards, max_modification_time or 0,
+                                           number_of_cards, parameters.is_balanced_by_review_time)
+
+
+# Median answer time (in seconds) of the review cards of the deck which were reviewed in the last days, with a single
+# aggregated query : the database groups the answer times by card (no query by card), and the medians are computed
+# from those groups (the median needs all the answer times of the card, which SQLite can't aggregate directly)
+def get_median_answer_time_by_card(deckname: str) -> Dict[CardId, float]:
+    deck_ids: List[DeckId] = mw.col.decks.deck_and_child_ids(mw.col.decks.id_for_name(deckname))
+    # The ids of the revlog are the timestamps of the answers (in milliseconds)
+    first_revlog_id = intTime(1000) - NUMBER_OF_DAYS_OF_ANSWER_TIMES * 86_400_000
+    rows = mw.col.db.all(f"select cid, group_concat(time) from revlog where id > {first_revlog_id} and type = 1"
+                         f" and time > 0 and cid in (select id from cards where did in {ids2str(deck_ids)}"
+                         f" and queue = 2 and type = 2) group by cid")
+    # The answer times are in milliseconds
+    return {CardId(card_id): median(map(int, answer_times_text.split(","))) / 1000
+            for card_id, answer_times_text in rows}
+
+
+# Kept by Anki when the add-on is updated
+def get_user_files_folder() -> str:
+    return os.path.join(mw.addonManager.addonsFolder(__name__), "user_files")
+
+
+def get_result_cache_folder() -> str:
+    return os.path.join(get_user_files_folder(), NAME_OF_RESULT_CACHE_FOLDER)
+
+
+# Names of the decks matching one of the comma-separated names or patterns (fnmatch syntax, case-insensitive)
+# A deck whose parent deck also matches is left out : its cards are already rescheduled with the parent deck
+def get_names_of_decks_matching(patterns_text: str) -> List[str]:
+    patterns = [pattern.strip().lower() for pattern in patterns_text.split(",") if pattern.strip() != ""]
+    matching_names = {deck_name for deck_name in mw.col.decks.allNames()
+                      if any(fnmatchcase(deck_name.lower(), pattern) for pattern in patterns)}
+
+    def has_matching_parent(deck_name: str) -> bool:
+        parts = deck_name.split("::")
+        return any("::".join(parts[:length]) in matching_names for length in range(1, len(parts)))
+
+    return sorted(deck_name for deck_name in matching_names if not has_matching_parent(deck_name))
+
+
+# Loads in a single query the review cards of several decks (and of their children), split by deck
+# (only the review cards can be rescheduled, see RescheduleDeck.iterate_relevant_cards)
+def get_review_card_records_of_decks(deck_names: Sequence[str]) -> Dict[str, CardColumns]:
+    deck_name_by_deck_id: Dict[DeckId, str] = dict()
+    for deck_name in deck_names:
+        for deck_id in mw.col.decks.deck_and_child_ids(mw.col.decks.id_for_name(deck_name)):
+            deck_name_by_deck_id[deck_id] = deck_name
+    rows = mw.col.db.all(f"select did, id, ivl, due, queue, type from cards"
+                         f" where did in {ids2str(deck_name_by_deck_id)} and queue = 2 and type = 2")
+    rows_by_deck_name: Dict[str, List[Sequence[int]]] = {deck_name: list() for deck_name in deck_names}
+    for row in rows:
+        rows_by_deck_name[deck_name_by_deck_id[row[0]]].append(row[1:])
+    return {deck_name: CardColumns(rows_of_deck) for deck_name, rows_of_deck in rows_by_deck_name.items()}
+
+
+# Writes all the new due days with a single batched update (= one transaction) after one undo checkpoint
+# The old and new dues are also appended to the undo journal (the checkpoint is lost when Anki is closed)
+# Returns the number of cards actually modified in the database
+def reschedule_cards_in_database(cards_with_new_due_day: Dict[CardId, int], description: str) -> int:
+    if len(cards_with_new_due_day) == 0:
+        return 0
+    mw.checkpoint(NAME_OF_UNDO_CHECKPOINT)
+    run_id = intTime(1000)
+    modification_time = intTime()
+    update_sequence_number = mw.col.usn()
+    old_due_by_card: Dict[CardId, int] = dict(mw.col.db.all(
+        f"select id, due from cards where id in {ids2str(cards_with_new_due_day)}"))
+    rows_to_update = [(new_due, modification_time, update_sequence_number, card_id)
+                      for card_id, new_due in cards_with_new_due_day.items()]
+    # "total_changes()" counts all the rows modified by the connection, so the difference is the number of updated rows
+    total_changes_before_update: int = mw.col.db.scalar("select total_changes()")
+    mw.col.db.executemany("update cards set due = ?, mod = ?, usn = ? where id = ?", rows_to_update)
+    nb_of_rescheduled_cards = mw.col.db.scalar("select total_changes()") - total_changes_before_update
+
+    card_ids = array("q", [card_id for card_id in cards_with_new_due_day if card_id in old_due_by_card])
+    get_undo_journal().append(JournaledRun(
+        run_id, description, len(card_ids), card_ids, array("q", [old_due_by_card[card_id] for card_id in card_ids]),
+        array("q", [cards_with_new_due_day[card_id] for card_id in card_ids])))
+    return nb_of_rescheduled_cards
+
+
+def get_undo_journal() -> UndoJournal:
+    return UndoJournal(os.path.join(get_user_files_folder(), NAME_OF_UNDO_JOURNAL_FILE))
+
+
+# Gives back their old due to the cards of a journaled run with a single batched update, except for the cards reviewed
+# (= with an entry in the revlog) or rescheduled since the run (their due is not the one written by the run anymore)
+# Returns the number of cards restored and the number of cards skipped
+def undo_journaled_run(run: JournaledRun) -> Tuple[int, int]:
+    current_due_by_card: Dict[CardId, int] = dict(mw.col.db.all(
+        f"select id, due from cards where id in {ids2str(run.card_ids)}"))
+    reviewed_card_ids = set(mw.col.db.list(
+        f"select distinct cid from revlog where id > {run.run_id} and cid in {ids2str(run.card_ids)}"))
+    cards_with_old_due: Dict[CardId, int] = {
+        CardId(card_id): old_due for card_id, old_due, new_due in zip(run.card_ids, run.old_dues, run.new_dues)
+        if current_due_by_card.get(card_id) == new_due and card_id not in reviewed_card_ids}
+    # The undo is journaled as well, so that it can be undone too
+    nb_of_restored_cards = reschedule_cards_in_database(cards_with_old_due, f"Undo of {run.description}")
+    return nb_of_restored_cards, run.number_of_cards - len(cards_with_old_due)
+
+
+# --- Automatic Rebalancing --- #
+
+
+# State saved in the user_files folder : for each deck id, the range of intervals of its last rescheduling and the
+# "watermark" = highest modification time of its cards once rescheduled (the cards modified later are to be placed)
+def get_auto_rebalancing_state_path() -> str:
+    return os.path.join(get_user_files_folder(), NAME_OF_AUTO_REBALANCING_STATE_FILE)
+
+
+def load_auto_rebalancing_state() -> Dict[str, Dict[str, int]]:
+    try:
+        with open(get_auto_rebalancing_state_path()) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return dict()
+
+
+def save_auto_rebalancing_state(state: Dict[str, Dict[str, int]]) -> None:
+    path = get_auto_rebalancing_state_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(state, file, indent=1)
+
+
+def get_max_modification_time_of_deck(deck_ids: Sequence[DeckId]) -> int:
+    return mw.col.db.scalar(f"select max(mod) from cards where did in {ids2str(deck_ids)}") or 0
+
+
+# Called once the cards of the decks are written by a manual rescheduling (only if the automatic rebalancing is enabled)
+def remember_decks_for_auto_rebalancing(deck_names: Sequence[str], min_interval: int, max_interval: int) -> None:
+    state = load_auto_rebalancing_state()
+    for deck_name in deck_names:
+        deck_id: DeckId = mw.col.decks.id_for_name(deck_name)
+        state[str(deck_id)] = {
+            "min_interval": min_interval,
+            "max_interval": max_interval,
+            "watermark": get_max_modification_time_of_deck(mw.col.decks.deck_and_child_ids(deck_id)),
+        }
+    save_auto_rebalancing_state(state)
+
+
+# Two queries by deck : the histogram of the unchanged review cards (aggregated by the database), and the changed ones
+def get_rebalancing_of_changed_cards(deck_id: DeckId, entry: Dict[str, int]) -> Dict[CardId, int]:
+    deck_ids: List[DeckId] = mw.col.decks.deck_and_child_ids(deck_id)
+    condition = f"did in {ids2str(deck_ids)} and queue = 2 and type = 2"
+    condition += f" and ivl between {entry['min_interval']} and {entry['max_interval']}"
+    histogram_rows = mw.col.db.all(
+        f"select ivl, due, count() from cards where {condition} and mod <= {entry['watermark']} group by ivl, due")
+    changed_cards = [CardRecord(*row) for row in mw.col.db.all(
+        f"select id, ivl, due, queue, type from cards where {condition} and mod > {entry['watermark']}")]
+    return rebalance_changed_cards(histogram_rows, changed_cards, range1(entry["min_interval"], entry["max_interval"]),
+                                   RescheduleDeck.retrieve_date_of_today(mw.col.decks.get(deck_id)))
+
+
+# Hooked to the opening of the profile and to the end of the syncs (if enabled) : the cards are placed in the
+# background, then written by the main thread with a single batched update (journaled, so it can be undone)
+def auto_rebalance_decks(*_) -> None:
+    state = load_auto_rebalancing_state()
+    if len(state) == 0:
+        return
+
+    # The decks deleted since their last rescheduling are forgotten
+    for deck_id in list(state):
+        if mw.col.decks.get(DeckId(int(deck_id)), default=False) is None:
+            del state[deck_id]
+
+    def rebalance_in_background() -> Dict[CardId, int]:
+        cards_with_new_due_day: Dict[CardId, int] = dict()
+        for deck_id, entry in state.items():
+            cards_with_new_due_day.update(get_rebalancing_of_changed_cards(DeckId(int(deck_id)), entry))
+        return cards_with_new_due_day
+
+    def on_done(future: Future) -> None:
+        cards_with_new_due_day: Dict[CardId, int] = future.result()
+        nb_of_rescheduled_cards = reschedule_cards_in_database(cards_with_new_due_day, "Automatic rebalancing")
+        advance_watermarks(state, {
+            deck_id: get_max_modification_time_of_deck(mw.col.decks.deck_and_child_ids(DeckId(int(deck_id))))
+            for deck_id in state})
+        save_auto_rebalancing_state(state)
+        if nb_of_rescheduled_cards > 0:
+            mw.reset()
+            tooltip(f"Automatic rebalancing : {nb_of_rescheduled_cards} cards rescheduled")
+
+    mw.taskman.run_in_background(rebalance_in_background, on_done)
 
 
 def main_function() -> None:
@@ -1071,9 +884,51 @@ def main_function() -> None:
     reschedule_dialog.exec()
 
 
+def main_function_in_batch() -> None:
+    reschedule_dialog = DialogRescheduleDecksInBatch()
+    reschedule_dialog.exec()
+
+
+# The user chooses a run among the journaled ones (the most recent first)
+def main_function_to_undo_rescheduling() -> None:
+    undo_journal = get_undo_journal()
+    runs: List[JournaledRun] = list(undo_journal.iterate_runs(is_cards_read=False))[::-1]
+    if len(runs) == 0:
+        showInfo("No rescheduling to undo")
+        return
+    items = [f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run.run_id / 1000))} - {run.description}"
+             f" ({run.number_of_cards} cards)" for run in runs]
+    item, is_accepted = QInputDialog.getItem(mw, NAME_OF_UNDO_ACTION, "Rescheduling to undo :", items, 0, False)
+    if not is_accepted:
+        return
+    nb_of_restored_cards, nb_of_skipped_cards = undo_journaled_run(
+        undo_journal.get_run(runs[items.index(item)].run_id))
+    mw.reset()
+    text = f"{nb_of_restored_cards} cards have been given back their previous due day"
+    text += f"\n{nb_of_skipped_cards} cards were left as they are (reviewed or rescheduled since)"
+    showInfo(text)
+
+
+# The messages of the rescheduling logic may come from the background thread, while a pop-up can only be shown by the
+# main thread
+def show_message_in_main_thread(text: str) -> None:
+    mw.taskman.run_on_main(lambda: showInfo(text))
+
+
+set_message_handler(show_message_in_main_thread)
+
 action = QtWidgets.QAction("Reorder Deck", mw)
 action.triggered.connect(main_function)
 mw.form.menuTools.addAction(action)
+action_in_batch = QtWidgets.QAction("Reorder Decks in Batch", mw)
+action_in_batch.triggered.connect(main_function_in_batch)
+mw.form.menuTools.addAction(action_in_batch)
+action_to_undo = QtWidgets.QAction(NAME_OF_UNDO_ACTION, mw)
+action_to_undo.triggered.connect(main_function_to_undo_rescheduling)
+mw.form.menuTools.addAction(action_to_undo)
+if IS_AUTO_REBALANCING_ENABLED:
+    gui_hooks.profile_did_open.append(auto_rebalance_decks)
+    gui_hooks.sync_did_finish.append(auto_rebalance_decks)
 # TODO: Necessary ? Look at AddonManager.configAction()
 # TODO: Understand (and refactor the addons.py file)
 mw.addonManager.setConfigAction(__name__, main_function)
@@ -0,0 +1,570 @@
+import itertools
+import os
+import random
+import sys
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median, pvariance
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import pytest
+
+from reschedule_deck import reschedule_core
+from reschedule_deck.reschedule_core import (
+    CachedRescheduling, CardId, CardQueue, CardRecord, CardType, DueDayCountTree, JournaledRun, PersistentResultCache,
+    RescheduleDeck, UndoJournal, advance_watermarks, new_executor_for_parallel_balancing,
+    new_fingerprint_of_rescheduling, range1, rebalance_changed_cards, )
+
+DAY_OF_TODAY = 1000
+NUMBER_OF_RANDOM_DECKS = 200
+
+
+# --- Helpers --- #
+
+
+# Review cards of a single interval, with due days relative to today (<= 0 = overdue, > interval = over-scheduled)
+def new_cards(interval: int, due_days: Sequence[int]) -> List[CardRecord]:
+    return [CardRecord(CardId(card_id), interval, DAY_OF_TODAY + due_day, CardQueue(2), CardType(2))
+            for card_id, due_day in enumerate(due_days, start=1)]
+
+
+def new_random_due_days(rng: random.Random, interval: int) -> List[int]:
+    return [rng.randint(-2, interval + 2) for _ in range(rng.randint(0, 4 * interval))]
+
+
+def run_reschedule_deck(cards: Sequence[CardRecord], intervals: Sequence[int]) -> RescheduleDeck:
+    reschedule_deck = RescheduleDeck({"timeToday": [DAY_OF_TODAY, 0]}, cards, intervals, True)
+    reschedule_deck.run()
+    return reschedule_deck
+
+
+# Same clamping as the algorithm : overdue cards come from due day 0, over-scheduled ones from due day interval + 1
+def get_original_due_days(interval: int, due_days: Sequence[int]) -> List[int]:
+    return sorted(min(max(due_day, 0), interval + 1) for due_day in due_days)
+
+
+# Tries all the possible quotas (floor of the average on each due day, plus one on "remainder" due days) : the cards
+# sorted by original due day are matched in order, which is the best assignment for given quotas
+def get_brute_force_displacement(interval: int, due_days: Sequence[int]) -> int:
+    original_due_days = get_original_due_days(interval, due_days)
+    floor_average, remainder = divmod(len(original_due_days), interval)
+    best_displacement = None
+    for due_days_with_one_more in itertools.combinations(range(1, interval + 1), remainder):
+        new_due_days = [due_day for due_day in range(1, interval + 1)
+                        for _ in range(floor_average + (due_day in due_days_with_one_more))]
+        displacement = sum(abs(original - new) for original, new in zip(original_due_days, new_due_days))
+        if best_displacement is None or displacement < best_displacement:
+            best_displacement = displacement
+    return best_displacement
+
+
+def assert_is_balanced(reschedule_deck: RescheduleDeck) -> None:
+    for interval in reschedule_deck.sequence_of_intervals:
+        for due_day, difference in reschedule_deck.difference_to_average_target[interval].items():
+            assert -1 < difference < 1, (interval, due_day, difference)
+
+
+# --- Algorithm 3 (by exact quotas) --- #
+
+
+@pytest.mark.parametrize("seed", range(NUMBER_OF_RANDOM_DECKS))
+def test_algorithm_3_gives_the_quotas_of_the_brute_force(monkeypatch, seed):
+    monkeypatch.setattr(reschedule_core, "USE_ALGORITHM_3_BY_EXACT_QUOTAS", True)
+    rng = random.Random(seed)
+    interval = rng.randint(1, 9)
+    due_days = new_random_due_days(rng, interval)
+
+    reschedule_deck = run_reschedule_deck(new_cards(interval, due_days), [interval])
+
+    assert_is_balanced(reschedule_deck)
+    assert reschedule_deck.get_total_displacement() == get_brute_force_displacement(interval, due_days)
+
+
+@pytest.mark.parametrize("seed", range(NUMBER_OF_RANDOM_DECKS))
+def test_algorithm_3_never_reschedules_more_than_algorithm_1(monkeypatch, seed):
+    rng = random.Random(seed)
+    intervals = list(range(1, rng.randint(1, 15) + 1))
+    cards: List[CardRecord] = list()
+    for interval in intervals:
+        cards += new_cards(interval, new_random_due_days(rng, interval))
+    for card_id, card in enumerate(cards, start=1):
+        card.id = CardId(card_id)
+
+    displacement_by_algorithm = dict()
+    for is_algorithm_3 in (False, True):
+        monkeypatch.setattr(reschedule_core, "USE_ALGORITHM_3_BY_EXACT_QUOTAS", is_algorithm_3)
+        reschedule_deck = run_reschedule_deck(cards, intervals)
+        assert_is_balanced(reschedule_deck)
+        displacement_by_algorithm[is_algorithm_3] = reschedule_deck.get_total_displacement()
+
+    assert displacement_by_algorithm[True] <= displacement_by_algorithm[False]
+
+
+# --- DueDayCountTree --- #
+
+
+# Reference of find_extremum_closest_to_given_due_day : earliest due day among the closest ones
+def find_extremum_closest_by_linear_scan(numbers_of_cards: Sequence[int], highest: bool, given_due_day: int) -> int:
+    extremum = max(numbers_of_cards) if highest else min(numbers_of_cards)
+    due_days = [due_day for due_day, number_of_cards in enumerate(numbers_of_cards, start=1)
+                if number_of_cards == extremum]
+    return min(due_days, key=lambda due_day: (abs(due_day - given_due_day), due_day))
+
+
+def is_reaching(number_of_cards: int, value: int, highest: bool) -> bool:
+    return number_of_cards >= value if highest else number_of_cards <= value
+
+
+@pytest.mark.parametrize("seed", range(NUMBER_OF_RANDOM_DECKS))
+def test_count_tree_finds_the_same_due_days_as_a_linear_scan(seed):
+    rng = random.Random(seed)
+    number_of_due_days = rng.randint(1, 40)
+    numbers_of_cards = [rng.randint(0, 6) for _ in range(number_of_due_days)]
+    count_tree = DueDayCountTree(numbers_of_cards)
+
+    for _ in range(50):
+        due_day = rng.randint(1, number_of_due_days)
+        numbers_of_cards[due_day - 1] = rng.randint(0, 6)
+        count_tree.update(due_day, numbers_of_cards[due_day - 1])
+
+        highest = rng.random() < 0.5
+        given_due_day = rng.randint(0, number_of_due_days)
+        assert count_tree.find_extremum_closest_to_given_due_day(highest, given_due_day) \
+            == find_extremum_closest_by_linear_scan(numbers_of_cards, highest, given_due_day)
+
+        value = rng.randint(0, 6)
+        start = rng.randint(1, number_of_due_days)
+        first_due_days = [due_day for due_day in range(start, number_of_due_days + 1)
+                          if is_reaching(numbers_of_cards[due_day - 1], value, highest)]
+        assert count_tree.find_first_due_day_reaching(value, highest, start) == (first_due_days or [0])[0]
+        last_due_days = [due_day for due_day in range(1, start + 1)
+                         if is_reaching(numbers_of_cards[due_day - 1], value, highest)]
+        assert count_tree.find_last_due_day_reaching(value, highest, start) == (last_due_days or [0])[-1]
+
+
+# --- Statistics --- #
+
+
+@pytest.mark.parametrize("mode", ["USE_ALGORITHM_1_BY_HIGHEST_DIFFERENCE", "USE_ALGORITHM_3_BY_EXACT_QUOTAS",
+                                  "USE_ALGORITHM_4_BY_GLOBAL_DAILY_LOAD"])
+def test_statistics_of_an_empty_range_of_intervals_are_zero(monkeypatch, mode):
+    monkeypatch.setattr(reschedule_core, mode, True)
+    cards = new_cards(10, [1, 1, 1, 2])
+
+    reschedule_deck = run_reschedule_deck(cards, range(11, 10))
+    statistics = reschedule_deck.get_statistics()
+
+    assert statistics.number_of_cards_in_range == 0
+    assert statistics.number_of_cards_to_reschedule == 0
+    assert statistics.highest_daily_load_original == statistics.highest_daily_load_target == 0
+    assert statistics.print_statistics() == "Your deck doesn't need to be rescheduled. \n"
+
+
+# --- UndoJournal --- #
+
+
+def new_journaled_run(run_id: int, number_of_cards: int) -> JournaledRun:
+    card_ids = array("q", range(1, number_of_cards + 1))
+    return JournaledRun(run_id, f"Run {run_id}", number_of_cards, card_ids, array("q", [5] * number_of_cards),
+                        array("q", [6] * number_of_cards))
+
+
+@pytest.mark.parametrize("number_of_bytes_cut", [1, 8, 8 * 3 * 10, 8 * 3 * 10 + len("Run 2")])
+def test_undo_journal_ignores_a_truncated_run(tmp_path, number_of_bytes_cut):
+    path = str(tmp_path / "undo_journal.bin")
+    undo_journal = UndoJournal(path)
+    undo_journal.append(new_journaled_run(1, 10))
+    undo_journal.append(new_journaled_run(2, 10))
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - number_of_bytes_cut)
+
+    assert [run.run_id for run in undo_journal.iterate_runs()] == [1]
+    assert [run.run_id for run in undo_journal.iterate_runs(is_cards_read=False)] == [1]
+
+    # The partial run is cut by the next append
+    undo_journal.append(new_journaled_run(3, 10))
+    assert [run.run_id for run in undo_journal.iterate_runs()] == [1, 3]
+    assert undo_journal.get_run(3) == new_journaled_run(3, 10)
+
+
+# --- Reuse of the results --- #
+
+
+# Intervals 306 and 313 are in the same band : as many cards in both ranges, but not the same ones
+def test_result_of_a_band_is_not_reused_for_other_cards():
+    cards = new_cards(306, [1, 2, 3]) + new_cards(313, [1, 2, 3])
+    for card_id, card in enumerate(cards, start=1):
+        card.id = CardId(card_id)
+    previous_reschedule_deck = run_reschedule_deck(cards, range(310, 315))
+    known_results = [previous_reschedule_deck.get_result_of_interval(interval)
+                     for interval in previous_reschedule_deck.sequence_of_intervals]
+
+    reschedule_deck = RescheduleDeck({"timeToday": [DAY_OF_TODAY, 0]}, cards, range(301, 309), True)
+    reschedule_deck.reuse_results_of_intervals(known_results)
+    reschedule_deck.run()
+
+    assert reschedule_deck.intervals_to_balance == reschedule_deck.sequence_of_intervals
+    assert set(reschedule_deck.cards_with_only_different_new_due_day) <= {1, 2, 3}
+
+
+# --- Parallel Balancing --- #
+
+
+# In a frozen build (e.g. packaged Anki), sys.executable is not a Python interpreter : no worker process is spawned
+def test_process_mode_uses_threads_in_a_frozen_build(monkeypatch):
+    monkeypatch.setattr(sys, "frozen", True, raising=False)
+    with new_executor_for_parallel_balancing("process") as executor:
+        assert isinstance(executor, ThreadPoolExecutor)
+
+
+# The moves done by the workers are counted as if the intervals were balanced by the caller
+def test_parallel_mode_counts_the_moves_of_the_workers(monkeypatch):
+    rng = random.Random(0)
+    intervals = list(range(1, 16))
+    cards = [card for interval in intervals for card in new_cards(interval, new_random_due_days(rng, interval))]
+    for card_id, card in enumerate(cards, start=1):
+        card.id = CardId(card_id)
+
+    measures_by_mode = dict()
+    for parallel_balancing_mode in (None, "thread"):
+        monkeypatch.setattr(reschedule_core, "PARALLEL_BALANCING_MODE", parallel_balancing_mode)
+        reschedule_deck = run_reschedule_deck(cards, intervals)
+        measures_by_mode[parallel_balancing_mode] = [
+            (step.number_of_moves, step.number_of_move_calls)
+            for _, step in sorted(reschedule_deck.instrumentation.steps_of_main_algorithm.items())]
+
+    assert sum(number_of_moves for number_of_moves, _ in measures_by_mode[None]) > 0
+    assert measures_by_mode["thread"] == measures_by_mode[None]
+
+
+# --- Algorithm 5 (by estimated review time) --- #
+
+
+def run_reschedule_deck_by_review_time(cards: Sequence[CardRecord], intervals: Sequence[int],
+                                       review_time_by_card: Dict[CardId, float]) -> RescheduleDeck:
+    reschedule_deck = RescheduleDeck({"timeToday": [DAY_OF_TODAY, 0]}, cards, intervals, True,
+                                     review_time_by_card=review_time_by_card)
+    reschedule_deck.run()
+    return reschedule_deck
+
+
+# The cards without a known review time get the median of their interval : the result of an interval is the same
+# whatever the other intervals in the range, so that it can be reused by another range
+def test_result_of_an_interval_by_review_time_does_not_depend_on_the_range():
+    rng = random.Random(0)
+    cards = new_cards(10, [rng.randint(1, 10) for _ in range(100)]) \
+        + new_cards(20, [rng.randint(1, 20) for _ in range(60)])
+    for card_id, card in enumerate(cards, start=1):
+        card.id = CardId(card_id)
+    # The cards of interval 20 take much longer than the (more numerous) ones of interval 10, and half of them have no
+    # known time
+    review_time_by_card = {card.id: (2.0 if card.ivl == 10 else 30.0) + rng.random() for card in cards
+                           if card.ivl == 10 or card.id % 2 == 0}
+
+    reschedule_deck_of_one_interval = run_reschedule_deck_by_review_time(cards, [20], review_time_by_card)
+    reschedule_deck_of_both_intervals = run_reschedule_deck_by_review_time(cards, [10, 20], review_time_by_card)
+
+    assert reschedule_deck_of_one_interval.get_result_of_interval(20)[:4] \
+        == reschedule_deck_of_both_intervals.get_result_of_interval(20)[:4]
+
+
+# --- Incremental Rebalancing --- #
+
+
+# Cards of a balanced deck (placed before the watermark), then some of them reviewed (modified after the watermark) and
+# all due on the same day of their interval
+def test_rebalancing_places_only_the_changed_cards_on_the_least_loaded_days():
+    rng = random.Random(0)
+    intervals = list(range(5, 9))
+    watermark, modification_time_of_reviews, modification_time_of_rebalancing = 100, 200, 300
+    # [id, ivl, due, mod] : same number of cards on each due day of each interval
+    rows = [[0, interval, DAY_OF_TODAY + due_day, watermark] for interval in intervals
+            for due_day in range1(1, interval) for _ in range(3)]
+    for card_id, row in enumerate(rows, start=1):
+        row[0] = card_id
+    for row in rng.sample(rows, 20):
+        row[2], row[3] = DAY_OF_TODAY + row[1], modification_time_of_reviews
+    state = {"1": {"min_interval": intervals[0], "max_interval": intervals[-1], "watermark": watermark}}
+
+    def get_histogram_and_changed_cards() -> Tuple[List[Tuple[int, int, int]], List[CardRecord]]:
+        number_by_interval_and_due = Counter((ivl, due) for _, ivl, due, mod in rows if mod <= state["1"]["watermark"])
+        changed_cards = [CardRecord(CardId(card_id), ivl, due, CardQueue(2), CardType(2))
+                         for card_id, ivl, due, mod in rows if mod > state["1"]["watermark"]]
+        return [(ivl, due, number) for (ivl, due), number in number_by_interval_and_due.items()], changed_cards
+
+    histogram_rows, changed_cards = get_histogram_and_changed_cards()
+    cards_with_new_due_day = rebalance_changed_cards(histogram_rows, changed_cards, intervals, DAY_OF_TODAY)
+
+    assert len(changed_cards) == 20
+    assert set(cards_with_new_due_day) <= {card.id for card in changed_cards}
+    # The changed cards are placed one by one (by interval, then by due day) on a least loaded day of their interval,
+    # the closest one to their due day
+    numbers_of_cards = {interval: Counter({due_day: 0 for due_day in range1(1, interval)}) for interval in intervals}
+    for ivl, due, number in histogram_rows:
+        numbers_of_cards[ivl][due - DAY_OF_TODAY] += number
+    for card in sorted(changed_cards, key=lambda card_: (card_.ivl, card_.due)):
+        due_day = cards_with_new_due_day.get(card.id, card.due) - DAY_OF_TODAY
+        lowest_number = min(numbers_of_cards[card.ivl].values())
+        closest_distance = min(abs(due_day_ - (card.due - DAY_OF_TODAY))
+                               for due_day_, number in numbers_of_cards[card.ivl].items() if number == lowest_number)
+        assert 1 <= due_day <= card.ivl
+        assert numbers_of_cards[card.ivl][due_day] == lowest_number
+        assert abs(due_day - (card.due - DAY_OF_TODAY)) == closest_distance
+        numbers_of_cards[card.ivl][due_day] += 1
+    for interval in intervals:
+        assert max(numbers_of_cards[interval].values()) - min(numbers_of_cards[interval].values()) <= 1
+
+    # Writing the cards modifies them : the watermark moves past them, so they are not placed again
+    for row in rows:
+        if row[0] in cards_with_new_due_day:
+            row[2], row[3] = cards_with_new_due_day[row[0]], modification_time_of_rebalancing
+    advance_watermarks(state, {"1": max(mod for _, _, _, mod in rows)})
+    assert state["1"]["watermark"] == modification_time_of_rebalancing
+    assert get_histogram_and_changed_cards()[1] == []
+    # (and never goes back, e.g. once the most recently modified card is deleted)
+    advance_watermarks(state, {"1": watermark})
+    assert state["1"]["watermark"] == modification_time_of_rebalancing
+
+
+def get_review_time_by_due_day(reschedule_deck: RescheduleDeck, interval: int,
+                               get_review_time: Callable[[CardRecord], float]) -> Dict[int, float]:
+    review_time_by_due_day = {due_day: 0.0 for due_day in range1(1, interval)}
+    for card in reschedule_deck.cards_by_interval[interval]:
+        due_day = reschedule_deck.due_day_target_by_moved_card.get(card.id,
+                                                                    reschedule_deck.due_day_original_by_card[card.id])
+        assert 1 <= due_day <= interval
+        review_time_by_due_day[due_day] += get_review_time(card)
+    return review_time_by_due_day
+
+
+# Each due day gets the average review time of its interval within one card, and the cards without a known review
+# time get the median of the known ones of their interval
+@pytest.mark.parametrize("seed", range(NUMBER_OF_RANDOM_DECKS))
+def test_algorithm_5_gives_each_due_day_the_average_review_time(seed):
+    rng = random.Random(seed)
+    intervals = list(range(1, rng.randint(1, 15) + 1))
+    cards: List[CardRecord] = list()
+    for interval in intervals:
+        cards += new_cards(interval, new_random_due_days(rng, interval))
+    for card_id, card in enumerate(cards, start=1):
+        card.id = CardId(card_id)
+    review_time_by_card = {card.id: rng.uniform(1, 30) for card in cards if rng.random() < 0.8}
+
+    reschedule_deck = run_reschedule_deck_by_review_time(cards, intervals, review_time_by_card)
+
+    for interval in intervals:
+        cards_of_interval = reschedule_deck.cards_by_interval[interval]
+        known_review_times = [review_time_by_card[card.id] for card in cards_of_interval
+                              if card.id in review_time_by_card]
+        default_review_time = median(known_review_times) if len(known_review_times) > 0 \
+            else reschedule_core.DEFAULT_ESTIMATED_REVIEW_TIME_IN_SECONDS
+        review_times = [review_time_by_card.get(card.id, default_review_time) for card in cards_of_interval]
+        assert [reschedule_deck.get_estimated_review_time(card) for card in cards_of_interval] == review_times
+        if len(review_times) > 0:
+            average_review_time = sum(review_times) / interval
+            for review_time in get_review_time_by_due_day(reschedule_deck, interval,
+                                                          reschedule_deck.get_estimated_review_time).values():
+                assert abs(review_time - average_review_time) <= max(review_times) + 1e-9
+
+
+# Same number of cards on each due day, but the slow cards are all due on the first two days : algorithm 1 leaves them
+# there, algorithm 5 spreads their review time
+def test_algorithm_5_gives_flatter_review_times_than_algorithm_1():
+    interval = 10
+    cards = new_cards(interval, [due_day for due_day in range1(1, interval) for _ in range(5)])
+    # 30 s for the slow cards, 1 s for the fast ones (and the median of 1 s for the fast ones without a known time)
+    review_time_by_card = {card.id: 30.0 if card.due - DAY_OF_TODAY <= 2 else 1.0 for card in cards
+                           if card.id % 4 != 0 or card.due - DAY_OF_TODAY <= 2}
+
+    reschedule_deck_by_review_time = run_reschedule_deck_by_review_time(cards, [interval], review_time_by_card)
+    assert reschedule_deck_by_review_time.default_review_time_by_interval == {interval: 1.0}
+    review_times_by_algorithm = dict()
+    for is_algorithm_5, reschedule_deck in ((False, run_reschedule_deck(cards, [interval])),
+                                            (True, reschedule_deck_by_review_time)):
+        review_times_by_algorithm[is_algorithm_5] = list(get_review_time_by_due_day(
+            reschedule_deck, interval, reschedule_deck_by_review_time.get_estimated_review_time).values())
+
+    assert max(review_times_by_algorithm[False]) == 150.0
+    assert max(review_times_by_algorithm[True]) < max(review_times_by_algorithm[False])
+    assert pvariance(review_times_by_algorithm[True]) < pvariance(review_times_by_algorithm[False])
+
+
+# --- Algorithm 4 (by global daily load) --- #
+
+
+# The cards of intervals <= k must all be due in the first k days : one of those days has at least the ceiling of their
+# average, so the highest daily load can't be lower than the highest of those ceilings (the bound of the concave hull)
+def get_lower_bound_of_highest_daily_load(cards: Sequence[CardRecord], intervals: Sequence[int]) -> int:
+    number_of_cards_up_to_interval = 0
+    lower_bound = 0
+    for interval in sorted(intervals):
+        number_of_cards_up_to_interval += sum(card.ivl == interval for card in cards)
+        lower_bound = max(lower_bound, -(-number_of_cards_up_to_interval // interval))
+    return lower_bound
+
+
+@pytest.mark.parametrize("seed", range(NUMBER_OF_RANDOM_DECKS))
+def test_algorithm_4_reaches_the_lower_bound_of_the_highest_daily_load(monkeypatch, seed):
+    monkeypatch.setattr(reschedule_core, "USE_ALGORITHM_4_BY_GLOBAL_DAILY_LOAD", True)
+    rng = random.Random(seed)
+    intervals = sorted(rng.sample(range(1, 16), rng.randint(1, 6)))
+    cards: List[CardRecord] = list()
+    for interval in intervals:
+        cards += new_cards(interval, new_random_due_days(rng, interval))
+    for card_id, card in enumerate(cards, start=1):
+        card.id = CardId(card_id)
+
+    reschedule_deck = run_reschedule_deck(cards, intervals)
+
+    number_of_cards_by_due_day = Counter()
+    for card in cards:
+        due_day = reschedule_deck.due_day_target_by_moved_card.get(card.id,
+                                                                    reschedule_deck.due_day_original_by_card[card.id])
+        assert 1 <= due_day <= card.ivl
+        number_of_cards_by_due_day[due_day] += 1
+    highest_daily_load = max(number_of_cards_by_due_day.values(), default=0)
+    assert highest_daily_load == get_lower_bound_of_highest_daily_load(cards, intervals)
+    assert reschedule_deck.get_statistics().highest_daily_load_target == highest_daily_load
+
+
+# Small deck checked by hand : 2 cards of interval 1 (due today), 1 card of interval 2 and 6 cards of interval 3 (all
+# on the last day). The 9 cards can share the 3 days (the 2 cards of interval 1 on the first one) : the peak is 3, on
+# every day
+def test_algorithm_4_on_a_deck_checked_by_hand(monkeypatch):
+    monkeypatch.setattr(reschedule_core, "USE_ALGORITHM_4_BY_GLOBAL_DAILY_LOAD", True)
+    cards = new_cards(1, [1, 1]) + new_cards(2, [2]) + new_cards(3, [3] * 6)
+    for card_id, card in enumerate(cards, start=1):
+        card.id = CardId(card_id)
+
+    reschedule_deck = run_reschedule_deck(cards, [1, 2, 3])
+
+    assert reschedule_deck.get_total_number_of_cards_by_due_day(reschedule_deck.number_of_cards_target) \
+        == {1: 3, 2: 3, 3: 3}
+    assert reschedule_deck.get_statistics().highest_daily_load_target == 3
+
+
+# --- PersistentResultCache --- #
+
+
+def new_cached_rescheduling(seed: int) -> CachedRescheduling:
+    rng = random.Random(seed)
+    reschedule_deck = run_reschedule_deck(new_cards(10, new_random_due_days(rng, 10)), [10])
+    return CachedRescheduling(reschedule_deck.get_statistics(), reschedule_deck.cards_with_only_different_new_due_day)
+
+
+def new_result_cache(tmp_path, max_number_of_entries: int = 10) -> PersistentResultCache:
+    return PersistentResultCache(str(tmp_path / "result_cache"), max_number_of_entries, 10_000_000)
+
+
+def test_result_cache_gives_back_the_entry_of_a_fingerprint(tmp_path):
+    result_cache = new_result_cache(tmp_path)
+    cached_rescheduling = new_cached_rescheduling(0)
+    assert result_cache.get("a") is None
+
+    result_cache.put("a", cached_rescheduling)
+
+    assert result_cache.get("a") == cached_rescheduling
+    assert result_cache.get("b") is None
+
+
+# The entry read last is the most recently used one, whatever the order in which the entries were written
+def test_result_cache_evicts_the_least_recently_used_entries(tmp_path):
+    result_cache = new_result_cache(tmp_path, max_number_of_entries=2)
+    for modification_time, fingerprint in enumerate(["a", "b"], start=1):
+        result_cache.put(fingerprint, new_cached_rescheduling(0))
+        os.utime(result_cache.get_path_of_entry(fingerprint), (modification_time, modification_time))
+    assert result_cache.get("a") is not None
+
+    result_cache.put("c", new_cached_rescheduling(1))
+
+    assert sorted(os.listdir(result_cache.folder)) == ["a.json", "c.json"]
+    assert result_cache.get("b") is None
+    assert result_cache.get("c") == new_cached_rescheduling(1)
+
+
+@pytest.mark.parametrize("content", [b"", b"{\"statistics\": {", b"\xff\xfe not JSON", b"[]", b"{}",
+                                     b"{\"statistics\": {}, \"card_ids\": [], \"new_dues\": []}"])
+def test_result_cache_treats_an_unreadable_entry_as_missing(tmp_path, content):
+    result_cache = new_result_cache(tmp_path)
+    result_cache.put("a", new_cached_rescheduling(0))
+    with open(result_cache.get_path_of_entry("a"), "wb") as file:
+        file.write(content)
+
+    assert result_cache.get("a") is None
+    assert not os.path.exists(result_cache.get_path_of_entry("a"))
+    result_cache.put("a", new_cached_rescheduling(0))
+    assert result_cache.get("a") == new_cached_rescheduling(0)
+
+
+FINGERPRINT_ARGUMENTS = dict(deck_id=1, day_of_today=DAY_OF_TODAY, min_interval=1, max_interval=29,
+                             is_reschedule_overdue_cards=False, max_modification_time=1_700_000_000,
+                             number_of_cards=500, is_balanced_by_review_time=False)
+
+
+# Any review, edit, addition or deletion of a card changes its fingerprint, as well as any parameter or the algorithm
+@pytest.mark.parametrize("name, value", [("deck_id", 2), ("day_of_today", DAY_OF_TODAY + 1), ("min_interval", 2),
+                                         ("max_interval", 30), ("is_reschedule_overdue_cards", True),
+                                         ("max_modification_time", 1_700_000_001), ("number_of_cards", 499),
+                                         ("is_balanced_by_review_time", True), ("algorithm", None)])
+def test_result_cache_misses_once_the_fingerprint_changes(tmp_path, monkeypatch, name, value):
+    result_cache = new_result_cache(tmp_path)
+    fingerprint = new_fingerprint_of_rescheduling(**FINGERPRINT_ARGUMENTS)
+    result_cache.put(fingerprint, new_cached_rescheduling(0))
+    assert result_cache.get(new_fingerprint_of_rescheduling(**FINGERPRINT_ARGUMENTS)) is not None
+
+    if name == "algorithm":
+        monkeypatch.setattr(reschedule_core, "USE_ALGORITHM_3_BY_EXACT_QUOTAS", True)
+        new_fingerprint = new_fingerprint_of_rescheduling(**FINGERPRINT_ARGUMENTS)
+    else:
+        new_fingerprint = new_fingerprint_of_rescheduling(**{**FINGERPRINT_ARGUMENTS, name: value})
+
+    assert new_fingerprint != fingerprint
+    assert result_cache.get(new_fingerprint) is None
+
+
+# --- NumpyDueDayHistogram --- #
+
+
+def get_card_ids_by_interval_and_due_day(reschedule_deck: RescheduleDeck) -> Dict[int, Dict[int, List[int]]]:
+    return {interval: {due_day: [card.id for card in bucket] for due_day, bucket in buckets.items()}
+            for interval, buckets in reschedule_deck.cards_target.items()}
+
+
+# Same histogram and same plan with or without NumPy, including bands of long intervals and (if they are rescheduled)
+# overdue cards
+@pytest.mark.parametrize("seed", range(NUMBER_OF_RANDOM_DECKS))
+def test_numpy_engine_gives_the_same_plan_as_the_pure_python_path(monkeypatch, seed):
+    pytest.importorskip("numpy")
+    rng = random.Random(seed)
+    intervals = sorted(rng.sample(range(1, 16), rng.randint(1, 8)))
+    if rng.random() < 0.3:
+        # (intervals 318 and 320 are in the same band)
+        intervals += [318, 320, 335]
+    cards: List[CardRecord] = list()
+    for interval in rng.sample(intervals, min(len(intervals), 10)):
+        cards += new_cards(interval, new_random_due_days(rng, min(interval, 20)))
+    for card_id, card in enumerate(cards, start=1):
+        card.id = CardId(card_id)
+    is_reschedule_overdue_cards = rng.random() < 0.5
+
+    reschedule_deck_by_engine = dict()
+    for is_numpy_engine in (False, True):
+        monkeypatch.setattr(reschedule_core, "USE_NUMPY_ENGINE_IF_AVAILABLE", is_numpy_engine)
+        reschedule_deck = RescheduleDeck({"timeToday": [DAY_OF_TODAY, 0]}, cards, intervals,
+                                         is_reschedule_overdue_cards)
+        assert reschedule_deck.is_numpy_engine_used() == is_numpy_engine
+        reschedule_deck_by_engine[is_numpy_engine] = reschedule_deck
+    python_deck, numpy_deck = reschedule_deck_by_engine[False], reschedule_deck_by_engine[True]
+
+    assert numpy_deck.number_of_cards_original == python_deck.number_of_cards_original
+    assert numpy_deck.average_number_of_cards_by_interval == python_deck.average_number_of_cards_by_interval
+    assert numpy_deck.difference_to_average_original == python_deck.difference_to_average_original
+    assert numpy_deck.due_day_original_by_card == python_deck.due_day_original_by_card
+    assert get_card_ids_by_interval_and_due_day(numpy_deck) == get_card_ids_by_interval_and_due_day(python_deck)
+
+    python_deck.run()
+    numpy_deck.run()
+
+    assert numpy_deck.number_of_cards_target == python_deck.number_of_cards_target
+    assert numpy_deck.cards_with_only_different_new_due_day == python_deck.cards_with_only_different_new_due_day